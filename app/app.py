@@ -1,13 +1,46 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.routes import models, predictions
+from app.routes import admin, comps, jobs, models, predictions
+from app.services.admission import AdmissionMiddleware, admission_controller
+from app.services.audit_log import audit_log
+from app.services.comps_index import get_comps_index
+from app.services.drift import drift_monitor
+from app.services.model_server import model_server
+from app.services.shadow import shadow_scorer
+from app.services.thread_budget import thread_budget
 from app.utils.logger import configure_logging
 
 # Configure logging
 configure_logging()
 
+# Keep BLAS/OpenMP pools inside this worker's share of the CPU budget
+thread_budget.apply_to_process(thread_budget.api_threads)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Each worker loads the latest models in the background and follows new registrations
+    model_server.start()
+    shadow_scorer.start()
+    audit_log.start()
+    drift_monitor.start()
+    admission_controller.start()
+    get_comps_index()
+    yield
+    admission_controller.stop()
+    drift_monitor.stop()
+    audit_log.stop()
+    shadow_scorer.stop()
+    model_server.stop()
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# Per-client rate limits and per-worker load shedding, applied before any request parsing
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
 
 # Include routers
 app.include_router(models.router, prefix="/models", tags=["Models"])
-app.include_router(predictions.router, prefix="/predictions", tags=["Predictions"])
\ No newline at end of file
+app.include_router(predictions.router, prefix="/predictions", tags=["Predictions"])
+app.include_router(comps.router, prefix="/comps", tags=["Comps"])
+app.include_router(jobs.router, prefix="/jobs", tags=["Jobs"])
+app.include_router(admin.router, prefix="/admin", tags=["Admin"])
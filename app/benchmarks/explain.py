@@ -0,0 +1,86 @@
+"""Benchmark per-prediction explanations against plain predictions, and check their consistency.
+
+For every batch size, times predict() and explain_model() on the same rows and checks that
+bias + sum of contributions equals the model's prediction for every row.
+Run from the repository root, e.g.:
+
+    python -m app.benchmarks.explain --model app/new_model/compact_model.pkl --batch-sizes 1 10 100 1000
+"""
+import argparse
+import json
+import pickle
+import time
+
+import numpy as np
+
+from app.benchmarks.thread_split import BASE_DIR, load_rows
+from app.services.explain import explain_model, prepare_explainer
+from app.services.thread_budget import ThreadBudget
+
+
+def time_calls(function, batches) -> np.ndarray:
+    latencies = []
+    for batch in batches:
+        start = time.perf_counter()
+        function(batch)
+        latencies.append(time.perf_counter() - start)
+    return np.asarray(latencies)
+
+
+def check_consistency(model, rows, tolerance: float):
+    """
+    Contributions must add up to the prediction: bias + sum(contributions) == predict(rows).
+    """
+    prediction = model.predict(rows)
+    bias, contributions = explain_model(model, rows)
+    assert contributions.shape == rows.shape, f"Contributions have shape {contributions.shape}, expected {rows.shape}"
+    error = np.abs(bias + contributions.sum(axis=1) - prediction)
+    assert np.all(error <= tolerance * np.maximum(np.abs(prediction), 1.0)), (
+        f"Contributions do not sum to the prediction (max error {error.max():.6g})"
+    )
+    return float(error.max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=str(BASE_DIR / "new_model" / "compact_model.pkl"))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--repeats", type=int, default=20, help="Timed calls per batch size")
+    parser.add_argument("--tolerance", type=float, default=1e-6, help="Relative tolerance of the sum check")
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    with open(args.model, "rb") as model_file:
+        model = pickle.load(model_file)
+    budget = ThreadBudget.from_env()
+    budget.apply_to_process()
+    budget.apply_to_model(model)
+    rows = load_rows(list(model.feature_names_in_))
+
+    # Flatten a full forest now rather than in the background on the first explanation
+    prepare_explainer(model)
+    max_error = check_consistency(model, rows.iloc[:5000], args.tolerance)
+    print(f"Consistency check passed on {min(len(rows), 5000)} rows (max absolute error {max_error:.3g})")
+
+    rng = np.random.default_rng(0)
+    results = []
+    print(f"{'batch':>8} {'predict ms':>12} {'explain ms':>12} {'ratio':>7} {'explain rows/s':>15}")
+    for batch_size in args.batch_sizes:
+        starts = rng.integers(0, len(rows) - batch_size, size=args.repeats)
+        batches = [rows.iloc[start:start + batch_size] for start in starts]
+        explain_model(model, batches[0])  # warm up
+
+        predict_ms = np.median(time_calls(model.predict, batches)) * 1000
+        explain_ms = np.median(time_calls(lambda batch: explain_model(model, batch), batches)) * 1000
+        results.append({"batch_size": batch_size, "predict_ms": float(predict_ms), "explain_ms": float(explain_ms),
+                        "explain_rows_per_second": batch_size / explain_ms * 1000})
+        print(f"{batch_size:>8} {predict_ms:>12.2f} {explain_ms:>12.2f} {explain_ms / predict_ms:>7.2f} "
+              f"{batch_size / explain_ms * 1000:>15.0f}")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"model": args.model, "max_sum_error": max_error, "results": results}, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""Inference micro-benchmark suite: load time, peak RSS and predict latency per model artifact.
+
+`run` benchmarks every model artifact (by default the ones written by create_model.py,
+create_new_model.py and compact_model.py, plus optionally a fresh fit of each model type of
+create_new_model.py) in its own process. Each artifact is timed at every batch size on two
+code paths: "raw", the model's predict() on assembled features, and "route", the prediction
+route's demographics join and feature assembly followed by predict(). Results go to a JSON
+file, and `compare` flags the regressions of one run against a baseline run, counting an artifact
+that failed in the candidate run and a baseline result missing from it as regressions too.
+Run from the repository root, e.g.:
+
+    python -m app.benchmarks.inference_suite run --output before.json
+    python -m app.benchmarks.inference_suite run --model-types KNR RandomForest GradientBoosting XGBoost --output after.json
+    python -m app.benchmarks.inference_suite compare before.json after.json --threshold 0.15
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import pickle
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from queue import Empty
+
+import numpy as np
+import pandas as pd
+
+from app.benchmarks.thread_split import BASE_DIR, DEMOGRAPHICS_PATH, SALES_PATH
+from app.services.thread_budget import ThreadBudget
+from app.utils.helpers import assemble_features
+
+DEFAULT_ARTIFACTS = [
+    BASE_DIR / "model" / "model.pkl",
+    BASE_DIR / "new_model" / "new_model.pkl",
+    BASE_DIR / "new_model" / "compact_model.pkl",
+]
+DEFAULT_BATCH_SIZES = [1, 8, 64, 1000, 100000]
+# Listing fields accepted by the prediction routes (sales columns other than the id, date and price)
+LISTING_COLUMNS = [
+    "bedrooms", "bathrooms", "sqft_living", "sqft_lot", "floors", "waterfront", "view", "condition", "grade",
+    "sqft_above", "sqft_basement", "yr_built", "yr_renovated", "zipcode", "lat", "long", "sqft_living15", "sqft_lot15",
+]
+# Lower is better for every compared metric
+ARTIFACT_METRICS = ["load_s", "model_rss_mb", "peak_rss_mb"]
+BATCH_METRICS = ["p50_ms", "p95_ms"]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb() -> float:
+    """Current resident set size, falling back to the peak where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def load_listings(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Listings as the routes receive them, sampled with replacement from the sales data up to `rows` rows."""
+    sales = pd.read_csv(SALES_PATH, usecols=LISTING_COLUMNS, dtype={"zipcode": str})
+    rng = np.random.default_rng(seed)
+    return sales.iloc[rng.integers(0, len(sales), size=rows)].reset_index(drop=True)
+
+
+def model_features(artifact_path: str, model) -> list:
+    """The features the artifact was trained with: model_features.json next to it, else the model's own names."""
+    features_path = os.path.join(os.path.dirname(artifact_path), "model_features.json")
+    if os.path.exists(features_path):
+        with open(features_path) as features_file:
+            return json.load(features_file)
+    return list(model.feature_names_in_)
+
+
+def describe_model(model) -> dict:
+    estimator = model.steps[-1][1] if hasattr(model, "steps") else model
+    module = type(estimator).__module__
+    if type(estimator).__name__ == "CompactForest":
+        engine = "compact"
+    elif module.startswith("xgboost"):
+        engine = "xgboost"
+    else:
+        engine = module.split(".")[0]
+    return {"model_type": type(estimator).__name__, "engine": engine}
+
+
+def time_predictions(predict, batch_size: int, pool_rows: int, repeats: int, max_seconds: float, rng) -> dict:
+    """
+    Call predict(start, stop) on varying row ranges until `repeats` calls or `max_seconds` (at least 3 calls).
+    """
+    predict(0, batch_size)  # warm up
+    latencies = []
+    deadline = time.perf_counter() + max_seconds
+    while len(latencies) < repeats and (len(latencies) < 3 or time.perf_counter() < deadline):
+        start = int(rng.integers(0, pool_rows - batch_size + 1))
+        t0 = time.perf_counter()
+        predict(start, start + batch_size)
+        latencies.append(time.perf_counter() - t0)
+    latencies = np.asarray(latencies)
+    return {
+        "calls": len(latencies),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "mean_ms": float(latencies.mean() * 1000),
+        "rows_per_second": float(batch_size / latencies.mean()),
+    }
+
+
+def benchmark_artifact(name: str, artifact_path: str, batch_sizes: list, repeats: int, max_seconds: float) -> dict:
+    """Benchmark one artifact; runs in a fresh process so load time and RSS are not skewed by earlier models."""
+    budget = ThreadBudget.from_env()
+    budget.apply_to_process()
+    listings = load_listings(max(batch_sizes))
+    rss_before_load = current_rss_mb()
+
+    start = time.perf_counter()
+    with open(artifact_path, "rb") as model_file:
+        model = pickle.load(model_file)
+    load_s = time.perf_counter() - start
+    budget.apply_to_model(model)
+    result = {
+        "name": name,
+        "artifact": artifact_path,
+        "artifact_bytes": os.path.getsize(artifact_path),
+        **describe_model(model),
+        "threads": budget.threads_per_worker,
+        "load_s": load_s,
+        "model_rss_mb": current_rss_mb() - rss_before_load,
+        "batches": [],
+    }
+
+    features = model_features(artifact_path, model)
+    assembled = assemble_features(listings, features)
+    rng = np.random.default_rng(0)
+    code_paths = {
+        "raw": lambda start, stop: model.predict(assembled.iloc[start:stop]),
+        "route": lambda start, stop: model.predict(assemble_features(listings.iloc[start:stop], features)),
+    }
+    for batch_size in batch_sizes:
+        for code_path, predict in code_paths.items():
+            timings = time_predictions(predict, batch_size, len(listings), repeats, max_seconds, rng)
+            result["batches"].append({"batch_size": batch_size, "path": code_path, **timings,
+                                      "peak_rss_mb": peak_rss_mb()})
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def _benchmark_in_child(args, results):
+    try:
+        results.put(benchmark_artifact(*args))
+    except Exception as e:
+        results.put({"name": args[0], "artifact": args[1], "error": f"{type(e).__name__}: {e}"})
+
+
+def wait_for_result(process, results, name: str, artifact_path: str, timeout: float) -> dict:
+    """
+    The child's result, or an error entry when it dies without one (e.g. OOM-killed) or exceeds the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return results.get(timeout=1.0)
+        except Empty:
+            pass
+        if not process.is_alive():
+            # A result put just before exiting may still be on its way through the pipe
+            try:
+                return results.get(timeout=1.0)
+            except Empty:
+                code = process.exitcode
+                reason = f"killed by signal {-code}" if code < 0 else f"exited with code {code}"
+                return {"name": name, "artifact": artifact_path, "error": f"Benchmark process {reason} without a result"}
+        if time.monotonic() > deadline:
+            process.terminate()
+            return {"name": name, "artifact": artifact_path, "error": f"Benchmark timed out after {timeout:.0f}s"}
+
+
+def train_model_types(model_types: list, directory: str) -> list:
+    """Fit each model type the way create_new_model.py does and save it as an artifact; returns (name, path) pairs."""
+    from sklearn import pipeline, preprocessing
+    from app.create_new_model import ALL_FEATURES, load_data, make_model
+
+    x, y = load_data(SALES_PATH, ALL_FEATURES, demographics_path=DEMOGRAPHICS_PATH)
+    artifacts = []
+    for model_type in model_types:
+        model_dir = os.path.join(directory, model_type)
+        os.makedirs(model_dir)
+        model = pipeline.make_pipeline(preprocessing.RobustScaler(), make_model(model_type)).fit(x, y)
+        with open(os.path.join(model_dir, "model.pkl"), "wb") as model_file:
+            pickle.dump(model, model_file)
+        with open(os.path.join(model_dir, "model_features.json"), "w") as features_file:
+            json.dump(list(x.columns), features_file)
+        artifacts.append((f"trained:{model_type}", os.path.join(model_dir, "model.pkl")))
+    return artifacts
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(result: dict):
+    if "error" in result:
+        print(f"{result['name']}: failed ({result['error']})")
+        return
+    print(f"{result['name']} [{result['model_type']}, {result['engine']}]: load {result['load_s']:.3f}s, "
+          f"model {result['model_rss_mb']:.1f} MB, peak RSS {result['peak_rss_mb']:.1f} MB")
+    print(f"{'batch':>8} {'path':>6} {'calls':>6} {'p50 ms':>10} {'p95 ms':>10} {'rows/s':>12} {'peak MB':>9}")
+    for batch in result["batches"]:
+        print(f"{batch['batch_size']:>8} {batch['path']:>6} {batch['calls']:>6} {batch['p50_ms']:>10.2f} "
+              f"{batch['p95_ms']:>10.2f} {batch['rows_per_second']:>12.0f} {batch['peak_rss_mb']:>9.1f}")
+
+
+def run(args):
+    artifacts = []
+    for path in args.artifacts or DEFAULT_ARTIFACTS:
+        if os.path.exists(path):
+            artifacts.append((os.path.relpath(path), str(path)))
+        else:
+            print(f"Skipping missing artifact {path}")
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory() as trained_dir:
+        if args.model_types:
+            artifacts += train_model_types(args.model_types, trained_dir)
+        for name, path in artifacts:
+            queue = ctx.Queue()
+            process = ctx.Process(target=_benchmark_in_child,
+                                  args=((name, path, args.batch_sizes, args.repeats, args.max_seconds), queue))
+            process.start()
+            result = wait_for_result(process, queue, name, path, args.timeout)
+            process.join()
+            print_result(result)
+            results.append(result)
+
+    report = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "batch_sizes": args.batch_sizes,
+        "results": results,
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"Results written to {args.output}")
+
+
+def flatten(report: dict) -> dict:
+    """Compared metrics keyed by (artifact name, code path, batch size); artifact-level metrics use path and batch None."""
+    metrics = {}
+    for result in report["results"]:
+        if "error" in result:
+            continue
+        metrics[(result["name"], None, None)] = {metric: result[metric] for metric in ARTIFACT_METRICS}
+        for batch in result["batches"]:
+            metrics[(result["name"], batch["path"], batch["batch_size"])] = {
+                metric: batch[metric] for metric in BATCH_METRICS
+            }
+    return metrics
+
+
+def compare(args) -> int:
+    """Print the changes of a candidate run against a baseline run; returns 1 when anything regressed or failed."""
+    with open(args.baseline) as baseline_file, open(args.candidate) as candidate_file:
+        baseline_report, candidate_report = json.load(baseline_file), json.load(candidate_file)
+    baseline, candidate = flatten(baseline_report), flatten(candidate_report)
+
+    # Changes below the noise floor (timer resolution, allocator jitter) are never flagged
+    noise_floor = {"load_s": args.min_delta_ms / 1000, "model_rss_mb": args.min_delta_mb,
+                   "peak_rss_mb": args.min_delta_mb, "p50_ms": args.min_delta_ms, "p95_ms": args.min_delta_ms}
+    regressions = 0
+    print(f"{'artifact':<40} {'path':>6} {'batch':>7} {'metric':>13} {'baseline':>11} {'candidate':>11} {'change':>8}")
+    for key in sorted(baseline.keys() & candidate.keys(), key=lambda key: (key[0], key[1] or "", key[2] or 0)):
+        name, code_path, batch_size = key
+        for metric, before in baseline[key].items():
+            after = candidate[key][metric]
+            change = (after - before) / before if before > 0 else 0.0
+            if abs(after - before) < noise_floor[metric] or abs(change) < args.threshold:
+                continue
+            flag = "REGRESSION" if change > 0 else "improved"
+            regressions += change > 0
+            print(f"{name:<40} {code_path or '-':>6} {batch_size or '-':>7} {metric:>13} {before:>11.3f} "
+                  f"{after:>11.3f} {change:>+8.1%}  {flag}")
+    # An artifact that crashed, timed out or was killed in the candidate run is a regression, not a gap
+    failed = {}
+    for result in candidate_report["results"]:
+        if "error" in result:
+            failed[result["name"]] = result["error"]
+            regressions += 1
+            print(f"{result['name']:<40} failed in the candidate run: {result['error']}  REGRESSION")
+    for key in sorted(baseline.keys() - candidate.keys(), key=str):
+        if key[0] not in failed:
+            regressions += 1
+            print(f"Missing from the candidate run: {key}  REGRESSION")
+
+    print(f"{regressions} regression(s) above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Benchmark model artifacts and write the results as JSON")
+    run_parser.add_argument("--artifacts", nargs="+", default=None, help="Pickled models (default: the repository's)")
+    run_parser.add_argument("--model-types", nargs="+", default=[],
+                            help="Also fit and benchmark these create_new_model.py model types")
+    run_parser.add_argument("--batch-sizes", type=int, nargs="+", default=DEFAULT_BATCH_SIZES)
+    run_parser.add_argument("--repeats", type=int, default=50, help="Timed calls per batch size and code path")
+    run_parser.add_argument("--max-seconds", type=float, default=10.0,
+                            help="Time limit per batch size and code path (at least 3 calls are made)")
+    run_parser.add_argument("--timeout", type=float, default=1800.0,
+                            help="Seconds one artifact's benchmark may take before it is recorded as failed")
+    run_parser.add_argument("--output", required=True, help="JSON file for the results")
+
+    compare_parser = commands.add_parser("compare", help="Flag regressions of a run against a baseline run")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.15, help="Relative change flagged (0.15 = 15%%)")
+    compare_parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Latency changes ignored below this")
+    compare_parser.add_argument("--min-delta-mb", type=float, default=5.0, help="Memory changes ignored below this")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Benchmark prediction throughput for different worker x thread splits of the CPU budget.
+
+Each split starts `workers` processes that load the model with `threads` threads and
+call predict() in a closed loop, the way gunicorn workers would under load.
+Run from the repository root, e.g.:
+
+    python -m app.benchmarks.thread_split --model app/new_model/new_model.pkl --batch-size 1
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import pathlib
+import pickle
+import time
+
+import numpy as np
+
+from app.services.thread_budget import THREAD_POOL_ENV_VARS, ThreadBudget
+
+BASE_DIR = pathlib.Path(__file__).parent.parent
+SALES_PATH = BASE_DIR / "data" / "kc_house_data.csv"
+DEMOGRAPHICS_PATH = BASE_DIR / "data" / "zipcode_demographics.csv"
+
+
+def load_rows(features):
+    """Sales rows joined with demographics, in the model's feature order."""
+    from app.create_new_model import ALL_FEATURES, load_data
+
+    x, _y = load_data(SALES_PATH, ALL_FEATURES, demographics_path=DEMOGRAPHICS_PATH)
+    return x[features].dropna()
+
+
+def run_worker(model_path, threads, rows, batch_size, duration, barrier, results):
+    """Closed-loop predict() calls for `duration` seconds; reports latencies to the parent."""
+    with open(model_path, "rb") as model_file:
+        model = pickle.load(model_file)
+    if threads > 0:
+        budget = ThreadBudget(cpu_budget=threads, workers=1, threads_per_worker=threads)
+        budget.apply_to_process()
+        budget.apply_to_model(model)
+
+    rng = np.random.default_rng(os.getpid())
+    model.predict(rows.iloc[:batch_size])
+    barrier.wait()
+
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = rng.integers(0, len(rows) - batch_size)
+        batch = rows.iloc[start:start + batch_size]
+        t0 = time.perf_counter()
+        model.predict(batch)
+        latencies.append(time.perf_counter() - t0)
+    results.put(latencies)
+
+
+def run_split(model_path, workers, threads, rows, batch_size, duration):
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+
+    # Children are spawned with this environment, so native pools start at the right size
+    previous = {name: os.environ.get(name) for name in THREAD_POOL_ENV_VARS}
+    for name in THREAD_POOL_ENV_VARS:
+        if threads > 0:
+            os.environ[name] = str(threads)
+        else:
+            os.environ.pop(name, None)
+    try:
+        processes = [
+            ctx.Process(target=run_worker, args=(model_path, threads, rows, batch_size, duration, barrier, results))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        latencies = np.concatenate([results.get() for _ in processes])
+        for process in processes:
+            process.join()
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    return {
+        "workers": workers,
+        "threads": threads if threads > 0 else "unbounded",
+        "requests_per_second": len(latencies) / duration,
+        "rows_per_second": len(latencies) * batch_size / duration,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=str(BASE_DIR / "new_model" / "new_model.pkl"))
+    parser.add_argument("--cpu-budget", type=int, default=None, help="Defaults to CPU_BUDGET or os.cpu_count()")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per split")
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    cpu_budget = args.cpu_budget or ThreadBudget.from_env().cpu_budget
+    with open(args.model, "rb") as model_file:
+        features = list(pickle.load(model_file).feature_names_in_)
+    rows = load_rows(features)
+
+    # Every exact split of the budget, plus today's behaviour: one worker per core with n_jobs=-1
+    splits = [(cpu_budget // threads, threads) for threads in range(1, cpu_budget + 1) if cpu_budget % threads == 0]
+    splits.append((cpu_budget, -1))
+
+    results = []
+    print(f"{'workers':>8} {'threads':>10} {'req/s':>10} {'rows/s':>12} {'p50 ms':>9} {'p99 ms':>9}")
+    for workers, threads in splits:
+        result = run_split(args.model, workers, threads, rows, args.batch_size, args.duration)
+        results.append(result)
+        print(f"{result['workers']:>8} {result['threads']:>10} {result['requests_per_second']:>10.1f} "
+              f"{result['rows_per_second']:>12.1f} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f}")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"cpu_budget": cpu_budget, "batch_size": args.batch_size, "results": results},
+                      output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
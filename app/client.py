@@ -0,0 +1,307 @@
+"""Python client for the prediction API, with a synchronous and an asyncio variant.
+
+Both keep a pool of keep-alive connections to the API, split large DataFrames into
+batch requests sent concurrently (at most max_in_flight at once), and retry requests the
+service rejected or could not take with exponential backoff, honouring Retry-After:
+
+    with PredictionClient() as client:
+        prices = client.predict_frame("real_estate_model_all_features", listings, all_features=True)
+
+    async with AsyncPredictionClient() as client:
+        prices = await client.predict_frame("real_estate_model", listings)
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Optional
+
+import httpx
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+API_URL = os.environ.get("API_URL", "http://127.0.0.1:8000")
+API_KEY = os.environ.get("API_KEY")
+CLIENT_TIMEOUT = float(os.environ.get("CLIENT_TIMEOUT") or 60.0)
+# Rows per batch request; the API accepts at most 10000
+CLIENT_CHUNK_SIZE = int(os.environ.get("CLIENT_CHUNK_SIZE") or 1000)
+CLIENT_MAX_IN_FLIGHT = int(os.environ.get("CLIENT_MAX_IN_FLIGHT") or 4)
+CLIENT_MAX_RETRIES = int(os.environ.get("CLIENT_MAX_RETRIES") or 4)
+CLIENT_BACKOFF = float(os.environ.get("CLIENT_BACKOFF") or 0.25)
+CLIENT_MAX_BACKOFF = 10.0
+# Rate limiting (429) and load shedding (503) reject a request before any work, so retrying is always safe
+RETRY_STATUSES = (429, 503)
+# Gateway errors and broken connections may hit a request that was processed: retried for idempotent calls only
+IDEMPOTENT_RETRY_STATUSES = (502, 504)
+
+
+class APIError(Exception):
+    def __init__(self, status_code: int, detail):
+        super().__init__(f"API error {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+def prediction_path(model_id: str, all_features: bool = False, kind: str = None) -> str:
+    """
+    Route of a prediction call: kind is None for a single input, "batch" or "sweep".
+    """
+    prefix = "/predictions/all_features/" if all_features else "/predictions/"
+    return f"{prefix}{kind}/{model_id}" if kind else f"{prefix}{model_id}"
+
+
+def frame_records(frame: pd.DataFrame) -> List[dict]:
+    """
+    JSON-ready records of a DataFrame, with numeric zipcodes (as read from a CSV) turned into strings.
+    """
+    if "zipcode" in frame.columns and pd.api.types.is_numeric_dtype(frame["zipcode"]):
+        frame = frame.assign(zipcode=frame["zipcode"].astype("int64").astype(str))
+    # to_json converts numpy scalars and turns NaN into null
+    return json.loads(frame.to_json(orient="records"))
+
+
+def chunk_frame(frame: pd.DataFrame, chunk_size: int) -> List[pd.DataFrame]:
+    return [frame.iloc[start:start + chunk_size] for start in range(0, len(frame), chunk_size)]
+
+
+def retry_delay(attempt: int, backoff: float, response: Optional[httpx.Response] = None) -> float:
+    """
+    Exponential backoff with jitter, never shorter than the Retry-After the service asked for.
+    """
+    delay = min(CLIENT_MAX_BACKOFF, backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+    if response is not None:
+        try:
+            delay = max(delay, float(response.headers.get("retry-after", 0)))
+        except ValueError:
+            pass
+    return delay
+
+
+def should_retry(response: Optional[httpx.Response], idempotent: bool) -> bool:
+    """
+    Whether a failed attempt is retried; response is None when the request raised a transport error.
+    """
+    if response is None:
+        return idempotent
+    return response.status_code in RETRY_STATUSES or (idempotent and response.status_code in IDEMPOTENT_RETRY_STATUSES)
+
+
+def parse_response(response: httpx.Response):
+    if response.status_code >= 400:
+        try:
+            detail = response.json().get("detail", response.text)
+        except ValueError:
+            detail = response.text
+        raise APIError(response.status_code, detail)
+    return response.json()
+
+
+def concat_predictions(frame: pd.DataFrame, responses: List[dict], explain: bool) -> pd.DataFrame:
+    """
+    One row per input row, in the input order: the price, the model version and, if asked, the explanation.
+    """
+    result = pd.DataFrame({
+        "prediction": [price for response in responses for price in response["prediction"]],
+        "version": [response["version"] for response in responses for _ in response["prediction"]],
+    }, index=frame.index)
+    if explain:
+        result["explanation"] = [explanation for response in responses for explanation in response["explanations"]]
+    return result
+
+
+class _ClientSettings:
+    def __init__(self, base_url: str = API_URL, api_key: str = API_KEY, timeout: float = CLIENT_TIMEOUT,
+                 chunk_size: int = CLIENT_CHUNK_SIZE, max_in_flight: int = CLIENT_MAX_IN_FLIGHT,
+                 max_retries: int = CLIENT_MAX_RETRIES, backoff: float = CLIENT_BACKOFF):
+        self.base_url = base_url.rstrip("/")
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.http_options = {
+            "base_url": self.base_url,
+            "timeout": timeout,
+            "headers": {"X-API-Key": api_key} if api_key else {},
+            # One keep-alive connection per concurrent request
+            "limits": httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight),
+        }
+
+
+class PredictionClient(_ClientSettings):
+    """
+    Synchronous client. Thread-safe: one instance (and its connection pool) can be shared.
+    """
+    def __init__(self, **settings):
+        super().__init__(**settings)
+        self.http = httpx.Client(**self.http_options)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.http.close()
+
+    def request(self, method: str, path: str, idempotent: bool = True, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = self.http.request(method, path, **kwargs)
+            except httpx.TransportError:
+                if attempt == self.max_retries or not should_retry(None, idempotent):
+                    raise
+            if response is not None and (attempt == self.max_retries or not should_retry(response, idempotent)):
+                return parse_response(response)
+            delay = retry_delay(attempt, self.backoff, response)
+            logger.info(f"Retrying {method} {path} in {delay:.2f}s (attempt {attempt + 1} of {self.max_retries})")
+            time.sleep(delay)
+
+    def register_model(self, model_id: str, model_name: str, features: List[str], author: str, pickle_path: str,
+                       candidate: bool = False) -> dict:
+        return self.request("POST", "/models/", idempotent=False, json={
+            "model_id": model_id, "model_name": model_name, "features": features,
+            "author": author, "pickle_path": pickle_path, "candidate": candidate,
+        })
+
+    def promote_model(self, model_id: str, version: str) -> dict:
+        return self.request("POST", f"/models/promote/{model_id}", json={"version": version})
+
+    def latest_model(self, model_id: str) -> dict:
+        return self.request("GET", f"/models/latest/{model_id}")
+
+    def predict(self, model_id: str, input_data: dict, all_features: bool = False, explain: bool = False) -> dict:
+        return self.request("POST", prediction_path(model_id, all_features), json=input_data, params={"explain": explain})
+
+    def predict_batch(self, model_id: str, inputs: List[dict], all_features: bool = False, explain: bool = False) -> dict:
+        return self.request("POST", prediction_path(model_id, all_features, "batch"), json={"inputs": inputs},
+                            params={"explain": explain})
+
+    def predict_frame(self, model_id: str, frame: pd.DataFrame, all_features: bool = False, explain: bool = False,
+                      progress: Callable[[int, int], None] = None) -> pd.DataFrame:
+        """
+        Price every row of a DataFrame through concurrent batch requests.
+
+        progress, if given, is called with (rows done, total rows) as batches complete.
+        """
+        chunks = chunk_frame(frame, self.chunk_size)
+        responses = [None] * len(chunks)
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="prediction-client") as executor:
+            futures = {
+                executor.submit(self.predict_batch, model_id, frame_records(chunk), all_features, explain): i
+                for i, chunk in enumerate(chunks)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                responses[i] = future.result()
+                done += len(chunks[i])
+                if progress:
+                    progress(done, len(frame))
+        return concat_predictions(frame, responses, explain)
+
+    def sweep(self, model_id: str, base: dict, axes: List[dict], all_features: bool = False) -> dict:
+        return self.request("POST", prediction_path(model_id, all_features, "sweep"), json={"base": base, "axes": axes})
+
+    def submit_job(self, kind: str, parameters: dict) -> dict:
+        return self.request("POST", f"/jobs/{kind}", idempotent=False, json=parameters)
+
+    def job(self, job_id: str) -> dict:
+        return self.request("GET", f"/jobs/{job_id}")
+
+    def cancel_job(self, job_id: str) -> dict:
+        return self.request("POST", f"/jobs/{job_id}/cancel")
+
+
+class AsyncPredictionClient(_ClientSettings):
+    """
+    asyncio client; the in-flight limit holds across every call made on the instance.
+    """
+    def __init__(self, **settings):
+        super().__init__(**settings)
+        self.http = httpx.AsyncClient(**self.http_options)
+        self.in_flight = asyncio.Semaphore(self.max_in_flight)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self.http.aclose()
+
+    async def request(self, method: str, path: str, idempotent: bool = True, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                async with self.in_flight:
+                    response = await self.http.request(method, path, **kwargs)
+            except httpx.TransportError:
+                if attempt == self.max_retries or not should_retry(None, idempotent):
+                    raise
+            if response is not None and (attempt == self.max_retries or not should_retry(response, idempotent)):
+                return parse_response(response)
+            delay = retry_delay(attempt, self.backoff, response)
+            logger.info(f"Retrying {method} {path} in {delay:.2f}s (attempt {attempt + 1} of {self.max_retries})")
+            await asyncio.sleep(delay)
+
+    async def register_model(self, model_id: str, model_name: str, features: List[str], author: str, pickle_path: str,
+                             candidate: bool = False) -> dict:
+        return await self.request("POST", "/models/", idempotent=False, json={
+            "model_id": model_id, "model_name": model_name, "features": features,
+            "author": author, "pickle_path": pickle_path, "candidate": candidate,
+        })
+
+    async def promote_model(self, model_id: str, version: str) -> dict:
+        return await self.request("POST", f"/models/promote/{model_id}", json={"version": version})
+
+    async def latest_model(self, model_id: str) -> dict:
+        return await self.request("GET", f"/models/latest/{model_id}")
+
+    async def predict(self, model_id: str, input_data: dict, all_features: bool = False, explain: bool = False) -> dict:
+        return await self.request("POST", prediction_path(model_id, all_features), json=input_data,
+                                  params={"explain": explain})
+
+    async def predict_batch(self, model_id: str, inputs: List[dict], all_features: bool = False,
+                            explain: bool = False) -> dict:
+        return await self.request("POST", prediction_path(model_id, all_features, "batch"), json={"inputs": inputs},
+                                  params={"explain": explain})
+
+    async def predict_frame(self, model_id: str, frame: pd.DataFrame, all_features: bool = False,
+                            explain: bool = False, progress: Callable[[int, int], None] = None) -> pd.DataFrame:
+        """
+        Price every row of a DataFrame through concurrent batch requests.
+
+        progress, if given, is called with (rows done, total rows) as batches complete.
+        """
+        done = 0
+
+        async def score(chunk):
+            nonlocal done
+            response = await self.predict_batch(model_id, frame_records(chunk), all_features, explain)
+            done += len(chunk)
+            if progress:
+                progress(done, len(frame))
+            return response
+
+        responses = await asyncio.gather(*(score(chunk) for chunk in chunk_frame(frame, self.chunk_size)))
+        return concat_predictions(frame, responses, explain)
+
+    async def sweep(self, model_id: str, base: dict, axes: List[dict], all_features: bool = False) -> dict:
+        return await self.request("POST", prediction_path(model_id, all_features, "sweep"),
+                                  json={"base": base, "axes": axes})
+
+    async def submit_job(self, kind: str, parameters: dict) -> dict:
+        return await self.request("POST", f"/jobs/{kind}", idempotent=False, json=parameters)
+
+    async def job(self, job_id: str) -> dict:
+        return await self.request("GET", f"/jobs/{job_id}")
+
+    async def cancel_job(self, job_id: str) -> dict:
+        return await self.request("POST", f"/jobs/{job_id}/cancel")
@@ -0,0 +1,106 @@
+"""Compact a trained forest model into a smaller float32 serving artifact.
+
+Run from the repository root, e.g.:
+
+    python -m app.compact_model --n-estimators 100 --min-node-samples 5 \
+        --register real_estate_model_all_features --candidate
+"""
+import argparse
+import json
+import pathlib
+import pickle
+import time
+
+import numpy as np
+from sklearn import model_selection
+from sklearn.metrics import mean_absolute_error, r2_score
+
+from app.create_new_model import ALL_FEATURES, SALES_COLUMN_SELECTION, load_data
+from app.services.artifact_store import artifact_store
+from app.services.compact_forest import compact_pipeline
+from app.services.model_manager import ModelRegistry, read_baseline_profile
+
+BASE_DIR = pathlib.Path(__file__).parent
+SALES_PATH = BASE_DIR / "data" / "kc_house_data.csv"
+DEMOGRAPHICS_PATH = BASE_DIR / "data" / "zipcode_demographics.csv"
+MODEL_REGISTRY_PATH = "app/model_registry/model_registry.csv"
+
+
+def evaluate(model, x_test, y_test):
+    """Return accuracy, latency and size metrics of a model on the test split."""
+    start = time.perf_counter()
+    y_pred = model.predict(x_test)
+    elapsed = time.perf_counter() - start
+    return y_pred, {
+        "MAE": mean_absolute_error(y_test, y_pred),
+        "R2": r2_score(y_test, y_pred),
+        "predict_seconds": elapsed,
+        "pickle_bytes": len(pickle.dumps(model)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=str(BASE_DIR / "new_model" / "new_model.pkl"))
+    parser.add_argument("--output", default=str(BASE_DIR / "new_model" / "compact_model.pkl"))
+    parser.add_argument("--n-estimators", type=int, default=None, help="Keep only the first N trees")
+    parser.add_argument("--max-depth", type=int, default=None, help="Collapse nodes deeper than this")
+    parser.add_argument("--min-node-samples", type=int, default=None,
+                        help="Collapse subtrees trained on fewer samples than this")
+    parser.add_argument("--register", metavar="MODEL_ID", default=None,
+                        help="Register the compacted artifact as the next version of MODEL_ID")
+    parser.add_argument("--candidate", action="store_true",
+                        help="Register the version as a candidate (e.g. to shadow it) instead of serving it right away")
+    parser.add_argument("--author", default="compact_model.py")
+    args = parser.parse_args()
+
+    with open(args.model, "rb") as model_file:
+        original = pickle.load(model_file)
+    features = list(original.feature_names_in_)
+
+    # Rebuild the same test split used by create_new_model.py
+    feature_set = ALL_FEATURES if "lat" in features else SALES_COLUMN_SELECTION
+    x, y = load_data(SALES_PATH, feature_set, demographics_path=DEMOGRAPHICS_PATH)
+    _x_train, x_test, _y_train, y_test = model_selection.train_test_split(x, y, random_state=42)
+    x_test = x_test[features]
+
+    compacted = compact_pipeline(original, n_estimators=args.n_estimators, max_depth=args.max_depth,
+                                 min_node_samples=args.min_node_samples)
+
+    original_pred, original_metrics = evaluate(original, x_test, y_test)
+    compact_pred, compact_metrics = evaluate(compacted, x_test, y_test)
+    metrics = {
+        "source": args.model,
+        "pruning": {"n_estimators": args.n_estimators, "max_depth": args.max_depth,
+                    "min_node_samples": args.min_node_samples},
+        "original": original_metrics,
+        "compact": compact_metrics,
+        "delta": {
+            "MAE": compact_metrics["MAE"] - original_metrics["MAE"],
+            "R2": compact_metrics["R2"] - original_metrics["R2"],
+            "max_abs_prediction_diff": float(np.max(np.abs(compact_pred - original_pred))),
+            "size_ratio": compact_metrics["pickle_bytes"] / original_metrics["pickle_bytes"],
+        },
+    }
+    print(json.dumps(metrics, indent=2))
+
+    output_path = pathlib.Path(args.output)
+    output_path.parent.mkdir(exist_ok=True)
+    with open(output_path, "wb") as output_file:
+        pickle.dump(compacted, output_file)
+    with open(output_path.with_name(output_path.stem + "_metrics.json"), "w") as metrics_file:
+        json.dump(metrics, metrics_file, indent=2)
+
+    if args.register:
+        registry = ModelRegistry(MODEL_REGISTRY_PATH)
+        latest = registry.get_latest_version(args.register)
+        model_name = latest["model_name"] if latest else f"{args.register} (compact)"
+        # The compacted forest serves the same inputs as the original: keep its training profile
+        model = registry.register(args.register, model_name, features, args.author, artifact_store.put(str(output_path)),
+                                  promoted=not args.candidate, baseline_profile=read_baseline_profile(args.model))
+        state = " as a candidate" if args.candidate else ""
+        print(f"Registered {args.register} version {model.version}{state} -> {model.pickle_path}")
+
+
+if __name__ == "__main__":
+    main()
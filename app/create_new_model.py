@@ -2,6 +2,7 @@ import json
 import pathlib
 import pickle
 from typing import List, Tuple
+import numpy as np
 import pandas as pd
 from sklearn import model_selection, neighbors, pipeline, preprocessing
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
@@ -11,6 +12,7 @@ from xgboost import XGBRegressor
 SALES_PATH = "data/kc_house_data.csv"
 DEMOGRAPHICS_PATH = "data/zipcode_demographics.csv"  # optional for future
 OUTPUT_DIR = "new_model/"
+PROFILE_BINS = 20  # bins per feature of the baseline profile used for drift monitoring
 
 SALES_COLUMN_SELECTION = [
     'price', 'bedrooms', 'bathrooms', 'sqft_living', 'sqft_lot', 'floors',
@@ -38,14 +40,46 @@ def load_data(path: str, features: List[str], demographics_path: str = DEMOGRAPH
     x = merged_data
     return x, y
 
+def build_baseline_profile(x: pd.DataFrame, bins: int = PROFILE_BINS) -> dict:
+    """Per-feature bins and summary statistics of the training inputs, the reference for input drift."""
+    features = {}
+    for column in x.columns:
+        values = x[column].dropna().to_numpy(dtype=float)
+        unique = np.unique(values)
+        if len(unique) <= bins:
+            # Discrete feature: one bin per value
+            cuts = (unique[:-1] + unique[1:]) / 2
+        else:
+            cuts = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1]))
+        counts = np.bincount(np.searchsorted(cuts, values, side="right"), minlength=len(cuts) + 1)
+        features[column] = {
+            "cuts": cuts.tolist(),
+            "counts": counts.tolist(),
+            "count": int(len(values)),
+            "mean": float(values.mean()),
+            "std": float(values.std()),
+            "min": float(values.min()),
+            "max": float(values.max()),
+        }
+    return {"source": SALES_PATH, "rows": len(x), "features": features}
+
+def make_model(name: str):
+    """Return a new, unfitted regressor for one of the compared model types."""
+    if name == "KNR":
+        return neighbors.KNeighborsRegressor()
+    if name == "RandomForest":
+        return RandomForestRegressor(n_estimators=200, max_depth=None, random_state=42, n_jobs=-1)
+    if name == "GradientBoosting":
+        return GradientBoostingRegressor(n_estimators=100, random_state=42)
+    if name == "XGBoost":
+        return XGBRegressor(n_estimators=100, random_state=42, n_jobs=-1, tree_method="hist")
+    raise ValueError(f"Unknown model type: {name}")
+
+MODEL_TYPES = ["KNR", "RandomForest", "GradientBoosting", "XGBoost"]
+
 def train_models(x_train, x_test, y_train, y_test, feature_set_name):
     """Trains KNN, RandomForest, GradientBoosting, XGBoost and returns metrics."""
-    models = {
-        "KNR": neighbors.KNeighborsRegressor(),
-        "RandomForest": RandomForestRegressor(n_estimators=200, max_depth=None, random_state=42, n_jobs=-1),
-        "GradientBoosting": GradientBoostingRegressor(n_estimators=100, random_state=42),
-        "XGBoost": XGBRegressor(n_estimators=100, random_state=42, n_jobs=-1, tree_method="hist")
-    }
+    models = {name: make_model(name) for name in MODEL_TYPES}
 
     metrics_list = []
 
@@ -96,14 +130,7 @@ def main():
     x_train, x_test, y_train, y_test = model_selection.train_test_split(x_best, y_best, random_state=42)
     
     # Save the best model as an artifact
-    if best_row["Model"] == "KNN":
-        best_model_obj = neighbors.KNeighborsRegressor()
-    elif best_row["Model"] == "RandomForest":
-        best_model_obj = RandomForestRegressor(n_estimators=200, max_depth=None, random_state=42, n_jobs=-1)
-    elif best_row["Model"] == "GradientBoosting":
-        best_model_obj = GradientBoostingRegressor(n_estimators=100, random_state=42)
-    else:
-        best_model_obj = XGBRegressor(n_estimators=100, random_state=42, n_jobs=-1, tree_method="hist")
+    best_model_obj = make_model(best_row["Model"])
 
     best_pipe = pipeline.make_pipeline(preprocessing.RobustScaler(), best_model_obj)
     best_pipe.fit(x_train, y_train)
@@ -114,5 +141,8 @@ def main():
     pickle.dump(best_pipe, open(output_dir / "new_model.pkl", "wb"))
     json.dump(list(x_train.columns), open(output_dir / "model_features.json", "w"))
 
+    # Baseline of every candidate feature, so served inputs of any model can be checked for drift
+    json.dump(build_baseline_profile(x_train_all), open(output_dir / "baseline_profile.json", "w"))
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
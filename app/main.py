@@ -61,14 +61,27 @@ st.subheader("🧩 API Endpoints")
 st.markdown("""
 - `POST /predictions/{model_id}` → Make predictions with the latest version of a given model using the **simple numeric features**.  
 - `POST /predictions/all_features/{model_id}` → Make predictions using the **ALL_FEATURES model**, which includes extended attributes.  
-- `POST /models/` → Create a new model or update an existing one; the system automatically increments the version and updates the model registry.  
-- `GET /models/latest/{model_id}` → Retrieve the latest version and metadata for a specific model.
+- `POST /predictions/batch/{model_id}` and `POST /predictions/all_features/batch/{model_id}` → Predict many inputs in one call. Add `?explain=true` to any prediction route to get each feature's contribution to the price (tree-path attribution on the flattened forest arrays; bias + contributions = prediction). A full forest is flattened in the background on its first explanation request, which answers 503 with `Retry-After` meanwhile; set `EXPLAIN_PREPARE_ON_LOAD=1` to flatten when the model loads instead.
+- `POST /predictions/sweep/{model_id}` and `POST /predictions/all_features/sweep/{model_id}` → What-if sweeps: vary one or two features of a base input and get the whole price curve or surface from one vectorized prediction.
+- `POST /predictions/compare` → Score one or many inputs against several `(model_id, version)` pairs side by side, with a single demographics join, for A/B evaluation.
+- `POST /models/` → Create a new model or update an existing one; the system automatically increments the version and updates the model registry. With `"candidate": true` the version is registered without being served.
+- `POST /models/promote/{model_id}` → Promote a candidate version: it becomes the latest version and every worker swaps it in.
+- `GET /models/latest/{model_id}` → Retrieve the latest version and metadata for a specific model. Supports `If-None-Match` / `If-Modified-Since`, so pollers get a `304` while nothing changed.
+- `GET /models/` and `GET /models/versions/{model_id}` → Paginated (`offset`, `limit`) listings of models and of a model's versions, served from an in-memory index of the registry with the same `ETag` / `Last-Modified` validators.
+- `PUT/GET/DELETE /models/shadow/{model_id}` → Shadow a candidate (not yet promoted) version on a sample of live traffic and read its prediction deltas against the served version; candidates are scored in the background, never on the request path.
+- `GET /models/drift/{model_id}` → Input drift of live traffic per model version: fixed-memory, mergeable per-feature sketches (histograms on the training bins, mean/variance, quantiles) compared with the training baseline profile written by `create_new_model.py` (PSI and KS distance).
+- `GET/POST /comps/` and `POST /comps/batch` → Find the nearest past sales (comps) to a location, optionally filtered by bedrooms, grade or living area.
+- `POST /jobs/train` and `POST /jobs/batch_score` → Queue a training or bulk scoring job, run by background job workers off the request path; `GET /jobs/{job_id}` reports progress, `POST /jobs/{job_id}/cancel` cancels, and trained models are registered automatically. Bulk scoring reads its CSV from the job input directory (`JOBS_INPUT_DIR`), given relative to it.
+- `GET /admin/audit` → Status of the prediction audit log: every prediction (inputs, model, version, output, latency) is written in batches to Parquet files (or Arrow IPC streams with `AUDIT_FORMAT=arrow`) by a background writer, rotated every minute or 50,000 rows so a crashed worker loses little. Part files left by stopped workers are salvaged at startup. Counters cover dropped and salvaged records.
+- `GET /admin/admission` → Admission control counters. Prediction routes are rate limited per API key (`X-API-Key`, only for keys listed in `RATE_LIMIT_API_KEYS`; any other key counts as its client IP) or client IP with token buckets (429), kept by each worker for the connections it serves (`RATE_LIMIT_RPS` / `RATE_LIMIT_BURST` per client and worker), and each worker caps its in-flight predictions (503); rejections carry `Retry-After` and are answered before any parsing or model work.
+- `GET /admin/models` → Models resident in each worker (serving, cached, retiring) with their estimated memory. Each worker keeps its models under `MODEL_MEMORY_BUDGET_MB` by evicting cached older versions, cheapest to reload per MB first; served versions, shadow candidates and `PINNED_MODEL_VERSIONS` are never evicted. A model or version that does not fit even after evictions is not kept, and requests for it get 503 with `Retry-After` until memory frees up; only pinned versions may exceed the budget.
 
 **Key points about the implementation:** 
 - The service always uses the **latest version** of the model for inference.
 - Different endpoints are available for the **simple** and **complex (all features)** models, each with its own validation schema.  
 - A **CSV-based model registry** tracks versions, features, authors, and artifact paths for all models.  
-- Models are loaded from local paths or could be retrieved from **S3** for horizontal scaling, ensuring consistency across multiple instances.  
+- Model artifacts are stored **by content hash** (SHA-256) in a local or **S3-compatible** artifact store: identical artifacts are stored and loaded once, remote artifacts are fetched in parallel chunks into a size-bounded LRU disk cache, and every load verifies the hash.  
+- `app/client.py` is the Python client for the API (sync and asyncio): pooled keep-alive connections, large DataFrames split into concurrent batch requests with an in-flight limit, and retries with backoff on rate limiting or load shedding. The Streamlit pages and `test_app.py` use it; set `API_URL` to point them at another server. The pages share one client and reload training metrics only when the file changes; the **Batch Price Prediction** page prices a whole uploaded CSV of listings at once.  
 - This setup allows new models to be deployed **without downtime**, supports **containerized deployment**, and can scale efficiently with Uvicorn workers.
 """)
 
@@ -90,6 +103,7 @@ st.subheader("🔄 Continuous Deployment & Scalability")
 st.markdown("""
 - Containerized architecture with Docker  
 - Uvicorn workers configured for concurrency and efficiency  
+- Optional inference worker pool (`INFERENCE_WORKERS`): API workers only parse requests and join demographics, then forward features over local Unix sockets to processes that keep the models loaded, so the HTTP and model tiers scale independently. The sockets live in a directory only the service's user may use (`INFERENCE_SOCKET_DIR`, by default under `XDG_RUNTIME_DIR`), messages carry plain arrays rather than pickles, and each inference process keeps its models under `INFERENCE_MEMORY_BUDGET_MB`  
 - Model artifacts stored in **S3**, ensuring consistency across multiple instances  
 - Supports **horizontal scaling** without replication issues  
 
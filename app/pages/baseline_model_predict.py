@@ -1,5 +1,9 @@
 import streamlit as st
-import requests
+import altair as alt
+import pandas as pd
+import httpx
+from app.client import APIError
+from app.utils.streamlit_cache import get_client
 
 st.set_page_config(page_title="🏠 Baseline Model Predict", page_icon="🏠")
 
@@ -33,38 +37,75 @@ with col2:
 
 zipcode = st.text_input("Zipcode", value="98052")
 
-if st.button("🚀 Predict"):
-    input_data = {
-        "bedrooms": bedrooms,
-        "bathrooms": bathrooms,
-        "sqft_living": sqft_living,
-        "sqft_lot": sqft_lot,
-        "floors": floors,
-        "waterfront": waterfront,
-        "view": view,
-        "condition": condition,
-        "grade": grade,
-        "sqft_above": sqft_above,
-        "sqft_basement": sqft_basement,
-        "yr_built": yr_built,
-        "yr_renovated": yr_renovated,
-        "zipcode": zipcode
-    }
+input_data = {
+    "bedrooms": bedrooms,
+    "bathrooms": bathrooms,
+    "sqft_living": sqft_living,
+    "sqft_lot": sqft_lot,
+    "floors": floors,
+    "waterfront": waterfront,
+    "view": view,
+    "condition": condition,
+    "grade": grade,
+    "sqft_above": sqft_above,
+    "sqft_basement": sqft_basement,
+    "yr_built": yr_built,
+    "yr_renovated": yr_renovated,
+    "zipcode": zipcode
+}
 
+if st.button("🚀 Predict"):
     try:
-        base_url = "http://127.0.0.1:8000/"
-        url = f"{base_url}predictions/real_estate_model"
+        prediction = get_client().predict("real_estate_model", input_data)["prediction"][0]
+        st.success(f"💰 **Predicted Price:** ${prediction:,.2f}")
+    except APIError as e:
+        st.error(f"❌ API Error: {e.detail}")
+    except httpx.HTTPError as e:
+        st.error(f"⚠️ Could not connect to the prediction service:\n\n{e}")
 
-        response = requests.post(url, json=input_data)
+# --- What-if analysis ---
+st.subheader("📈 What-if Analysis")
+st.write("See how the predicted price changes when one or two features vary, all in a single request.")
 
-        if response.status_code == 200:
-            prediction = response.json().get("prediction", ["No prediction available"])[0]
-            st.success(f"💰 **Predicted Price:** ${prediction:,.2f}")
-        else:
-            error_message = response.json().get("detail", "Unknown error occurred.")
-            st.error(f"❌ API Error: {error_message}")
+sweep_features = st.multiselect(
+    "Features to vary (one or two)",
+    [feature for feature in input_data if feature != "zipcode"],
+    default=["sqft_living"],
+    max_selections=2,
+)
 
-    except requests.exceptions.RequestException as e:
+axes = []
+for feature in sweep_features:
+    current = float(input_data[feature])
+    col_start, col_stop, col_num = st.columns(3)
+    start = col_start.number_input(f"{feature} from", value=current - abs(current) * 0.5, key=f"{feature}_start")
+    stop = col_stop.number_input(f"{feature} to", value=current + abs(current) * 0.5, key=f"{feature}_stop")
+    num = col_num.number_input(f"{feature} steps", min_value=2, max_value=50, value=20, key=f"{feature}_num")
+    axes.append({"feature": feature, "start": start, "stop": stop, "num": int(num)})
+
+if axes and st.button("📈 Run What-if"):
+    try:
+        sweep = get_client().sweep("real_estate_model", input_data, axes)
+        if len(sweep["axes"]) == 1:
+            axis = sweep["axes"][0]
+            curve = pd.DataFrame({"Predicted price": sweep["predictions"]}, index=pd.Index(axis["values"], name=axis["feature"]))
+            st.line_chart(curve)
+        else:
+            x_axis, y_axis = sweep["axes"]
+            surface = pd.DataFrame(
+                [(x, y, price) for x, row in zip(x_axis["values"], sweep["predictions"]) for y, price in zip(y_axis["values"], row)],
+                columns=[x_axis["feature"], y_axis["feature"], "Predicted price"],
+            )
+            chart = alt.Chart(surface).mark_rect().encode(
+                x=alt.X(f"{x_axis['feature']}:O", axis=alt.Axis(format=",.0f")),
+                y=alt.Y(f"{y_axis['feature']}:O", axis=alt.Axis(format=",.1f")),
+                color=alt.Color("Predicted price:Q", scale=alt.Scale(scheme="viridis")),
+                tooltip=[x_axis["feature"], y_axis["feature"], alt.Tooltip("Predicted price:Q", format="$,.0f")],
+            ).interactive()
+            st.altair_chart(chart, use_container_width=True)
+    except APIError as e:
+        st.error(f"❌ API Error: {e.detail}")
+    except httpx.HTTPError as e:
         st.error(f"⚠️ Could not connect to the prediction service:\n\n{e}")
 
 st.markdown("""
@@ -0,0 +1,69 @@
+import io
+import streamlit as st
+import pandas as pd
+import httpx
+from app.client import APIError
+from app.schemas.prediction_schemas import AllFeaturesPredictionInput, PredictionInput
+from app.utils.streamlit_cache import get_client
+
+st.set_page_config(page_title="📤 Batch Price Prediction", page_icon="📤", layout="wide")
+
+st.title("📤 Batch Price Prediction")
+st.write("""
+Upload a **CSV of listings** and get a price for every row at once, instead of entering homes one by one.
+
+The file needs one column per property feature (the same fields as on the prediction pages, e.g. `bedrooms`,
+`sqft_living` and `zipcode`); extra columns are kept in the results. Large files are sent in batches,
+with progress shown below.
+""")
+
+MODELS = {
+    "Advanced model (all features)": ("real_estate_model_all_features", True, AllFeaturesPredictionInput),
+    "Baseline model": ("real_estate_model", False, PredictionInput),
+}
+
+@st.cache_data(show_spinner=False)
+def read_listings(content: bytes) -> pd.DataFrame:
+    """
+    Parse an uploaded CSV once per file content, keeping zipcodes as text.
+    """
+    return pd.read_csv(io.BytesIO(content), dtype={"zipcode": str})
+
+model_label = st.selectbox("Model", list(MODELS))
+model_id, all_features, schema = MODELS[model_label]
+uploaded = st.file_uploader("Listings CSV", type="csv")
+
+if uploaded is not None:
+    listings = read_listings(uploaded.getvalue())
+    required = list(schema.__fields__)
+    missing_columns = [column for column in required if column not in listings.columns]
+    st.write(f"**{len(listings):,}** listings in `{uploaded.name}`")
+    st.dataframe(listings.head(), use_container_width=True)
+
+    if missing_columns:
+        st.error(f"❌ Missing columns for the {model_label.lower()}: {', '.join(missing_columns)}")
+    elif listings[required].isna().any(axis=1).any():
+        incomplete = listings.index[listings[required].isna().any(axis=1)]
+        st.error(f"❌ {len(incomplete):,} listings have empty required fields (first rows: {', '.join(map(str, incomplete[:10]))})")
+    elif st.button("💰 Price all listings"):
+        progress_bar = st.progress(0.0, text="Sending listings...")
+        try:
+            prices = get_client().predict_frame(
+                model_id, listings[required], all_features=all_features,
+                progress=lambda done, total: progress_bar.progress(done / total, text=f"Priced {done:,} of {total:,} listings"),
+            )
+            st.session_state["batch_result"] = (uploaded.name, model_label, listings.assign(
+                predicted_price=prices["prediction"], model_version=prices["version"]))
+        except APIError as e:
+            st.error(f"❌ API Error: {e.detail}")
+        except httpx.HTTPError as e:
+            st.error(f"⚠️ Could not connect to the prediction service:\n\n{e}")
+
+# Results survive the rerun triggered by the download button
+result = st.session_state.get("batch_result")
+if uploaded is not None and result and result[:2] == (uploaded.name, model_label):
+    _, _, priced = result
+    st.success(f"✅ Priced {len(priced):,} listings with version {', '.join(map(str, priced['model_version'].unique()))}")
+    st.dataframe(priced, use_container_width=True)
+    st.download_button("⬇️ Download prices (CSV)", priced.to_csv(index=False).encode(),
+                       file_name=f"priced_{uploaded.name}", mime="text/csv")
@@ -1,19 +1,88 @@
+import time
 import streamlit as st
 import pandas as pd
+import httpx
 from pathlib import Path
+from app.client import APIError
+from app.utils.streamlit_cache import file_version, get_client
 
 st.set_page_config(page_title="Model metrics", page_icon="🔧", layout="wide")
 st.title("🔧 Model Training Results")
 
 BASE_DIR = Path(__file__).parent.parent  # go up one level to `app/`
 metrics_path = BASE_DIR / "new_model" / "training_metrics.csv"
+client = get_client()
+
+# --- Train a model in the background ---
+st.subheader("🚀 Train a New Model")
+st.write("Training runs as a background job on the server; the trained model is registered automatically as a new version.")
+
+with st.form("train_job"):
+    col1, col2 = st.columns(2)
+    model_type = col1.selectbox("Model type", ["RandomForest", "XGBoost", "GradientBoosting", "KNR"])
+    feature_set = col2.selectbox("Feature set", ["all_features", "sales_subset"],
+                                 format_func=lambda x: "All features" if x == "all_features" else "Sales subset")
+    model_id = col1.text_input("Model ID", value="real_estate_model_all_features")
+    model_name = col2.text_input("Model name", value="Real Estate Price Predictor with All Features")
+    author = col1.text_input("Author", value="")
+    n_estimators = col2.number_input("Estimators (0 = model default)", min_value=0, max_value=2000, value=0, step=20)
+    submitted = st.form_submit_button("Start training")
+
+if submitted:
+    try:
+        job = client.submit_job("train", {
+            "model_id": model_id, "model_name": model_name, "author": author or "streamlit",
+            "model_type": model_type, "feature_set": feature_set, "n_estimators": int(n_estimators) or None,
+        })
+        st.session_state["train_job_id"] = job["id"]
+    except APIError as e:
+        st.error(f"❌ API Error: {e.detail}")
+    except httpx.HTTPError as e:
+        st.error(f"⚠️ Could not connect to the job service:\n\n{e}")
+
+job_id = st.session_state.get("train_job_id")
+if job_id:
+    status_text = st.empty()
+    progress_bar = st.progress(0.0)
+    cancel = st.button("Cancel training")
+    try:
+        if cancel:
+            client.cancel_job(job_id)
+        # Poll the job status; the API only reads a row, so this never blocks it
+        while True:
+            job = client.job(job_id)
+            progress_bar.progress(min(float(job["progress"]), 1.0))
+            status_text.write(f"Job `{job_id}` — **{job['status']}**: {job['message']}")
+            if job["status"] not in ("queued", "running"):
+                break
+            time.sleep(1)
+
+        if job["status"] == "succeeded":
+            result = job["result"]
+            st.success(f"✅ Registered **{result['model_id']}** version **{result['version']}**")
+            st.dataframe(pd.DataFrame([result["metrics"]]).style.format("{:,.4f}"), use_container_width=True)
+        elif job["status"] == "failed":
+            st.error(f"❌ Training failed: {job['error']}")
+        else:
+            st.warning("Training was cancelled.")
+    except APIError as e:
+        st.error(f"❌ API Error: {e.detail}")
+    except httpx.HTTPError as e:
+        st.error(f"⚠️ Could not connect to the job service:\n\n{e}")
+
+st.divider()
+
+@st.cache_data(show_spinner=False)
+def load_metrics_pivot(path: str, version: tuple) -> pd.DataFrame:
+    """
+    Training metrics pivoted by model and feature set, recomputed only when the metrics file changes.
+    """
+    metrics_df = pd.read_csv(path)
+    return metrics_df.pivot(index="Model", columns="Feature_Set", values=["MAE", "MSE", "R2"])
 
 if not metrics_path.exists():
     st.warning("⚠️ No training results found. Run `create_new_model.py` first to generate metrics.")
 else:
-    metrics_df = pd.read_csv(metrics_path)
-
-
     st.subheader("📊 Model Comparison")
     st.write("Below you can see how each model performed when trained with different types of information:")
 
@@ -22,8 +91,7 @@ else:
     - **All_Features:** Includes both property and neighborhood details (income, population, location, etc.)
     """)
 
-    # Pivot the table
-    pivot = metrics_df.pivot(index="Model", columns="Feature_Set", values=["MAE", "MSE", "R2"])
+    pivot = load_metrics_pivot(str(metrics_path), file_version(metrics_path))
     st.dataframe(pivot.style.format("{:,.2f}"), use_container_width=True)
 
     st.markdown("""
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, HTTPException
+from app.services.admission import admission_controller
+from app.services.audit_log import audit_log
+from app.services.model_server import model_server
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+@router.get("/audit")
+def get_audit_status():
+    """
+    Get the prediction audit log counters (including dropped records) and its closed files.
+    """
+    try:
+        return audit_log.report()
+    except Exception as e:
+        logger.exception("Error retrieving audit log status.")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/admission")
+def get_admission_status():
+    """
+    Get the admission limits and how many prediction requests were admitted, rate limited or shed.
+    """
+    try:
+        return admission_controller.report()
+    except Exception as e:
+        logger.exception("Error retrieving admission counters.")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/models")
+def get_resident_models():
+    """
+    Get the models every worker holds in memory, their estimated sizes and the memory budget.
+    """
+    try:
+        return model_server.report()
+    except Exception as e:
+        logger.exception("Error retrieving resident models.")
+        raise HTTPException(status_code=500, detail=str(e))
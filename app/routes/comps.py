@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, HTTPException
+from app.schemas.comps_schemas import CompsQuery, CompsBatchQuery
+from app.services.comps_index import get_comps_index
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+MAX_BATCH_QUERIES = 1000
+
+def find_comps(query: CompsQuery):
+    """
+    Nearest past sales for one query, with a short price summary.
+    """
+    filters = query.dict(exclude={"lat", "long", "k"})
+    comps = get_comps_index().query(query.lat, query.long, k=query.k, **filters)
+    prices = np.array([comp["price"] for comp in comps])
+    sqft_living = np.array([comp["sqft_living"] for comp in comps])
+    return {
+        "count": len(comps),
+        "median_price": float(np.median(prices)) if comps else None,
+        "median_price_per_sqft": float(np.median(prices / sqft_living)) if comps else None,
+        "comps": comps,
+    }
+
+@router.get("/")
+def get_comps(query: CompsQuery = Depends()):
+    """
+    Get the k nearest past sales to a location (query parameters).
+    """
+    return post_comps(query)
+
+@router.post("/")
+def post_comps(query: CompsQuery):
+    """
+    Get the k nearest past sales to a location, optionally filtered by bedrooms, grade or sqft range.
+    """
+    try:
+        return find_comps(query)
+    except Exception as e:
+        logger.exception("Error finding comparable sales")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/batch")
+def post_comps_batch(batch: CompsBatchQuery):
+    """
+    Get comparable sales for many listings in one request.
+    """
+    if len(batch.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    try:
+        return {"results": [find_comps(query) for query in batch.queries]}
+    except Exception as e:
+        logger.exception("Error finding comparable sales")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,96 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse
+from app.create_new_model import MODEL_TYPES
+from app.schemas.job_schemas import BatchScoreJobInput, TrainJobInput
+from app.services.jobs import JobQueue, resolve_input_path
+from app.services.model_manager import ModelRegistry
+from app.services.model_server import MODEL_REGISTRY_PATH
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+FEATURE_SETS = ["all_features", "sales_subset"]
+MAX_PAGE_SIZE = 500
+
+job_queue = JobQueue()
+model_registry = ModelRegistry(MODEL_REGISTRY_PATH)
+
+def get_job_or_404(job_id: str) -> dict:
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"No job found with ID: {job_id}")
+    return job
+
+@router.post("/train")
+def submit_train_job(input_data: TrainJobInput):
+    """
+    Queue a training job. The trained model is registered as the next version of model_id.
+    """
+    if input_data.model_type not in MODEL_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown model type {input_data.model_type}; use one of {MODEL_TYPES}")
+    if input_data.feature_set not in FEATURE_SETS:
+        raise HTTPException(status_code=400, detail=f"Unknown feature set {input_data.feature_set}; use one of {FEATURE_SETS}")
+    try:
+        return job_queue.submit("train", input_data.dict())
+    except Exception as e:
+        logger.exception("Error submitting training job.")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/batch_score")
+def submit_batch_score_job(input_data: BatchScoreJobInput):
+    """
+    Queue a bulk scoring job for a CSV of listings (same columns as the prediction routes)
+    placed in the job input directory; input_path is relative to that directory.
+    """
+    try:
+        input_path = resolve_input_path(input_data.input_path)
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if input_data.version:
+        if not model_registry.get_version(input_data.model_id, input_data.version):
+            raise HTTPException(status_code=404, detail=f"No model found with ID: {input_data.model_id} and version: {input_data.version}")
+    elif not model_registry.get_latest_version(input_data.model_id):
+        raise HTTPException(status_code=404, detail=f"No model found with ID: {input_data.model_id}")
+    try:
+        return job_queue.submit("batch_score", dict(input_data.dict(), input_path=input_path))
+    except Exception as e:
+        logger.exception("Error submitting batch scoring job.")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/")
+def list_jobs(status: str = None, offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE)):
+    """
+    List jobs, most recent first, optionally filtered by status.
+    """
+    try:
+        jobs, total = job_queue.list(status=status, offset=offset, limit=limit)
+        return {"total": total, "offset": offset, "limit": limit, "items": jobs}
+    except Exception as e:
+        logger.exception("Error listing jobs.")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{job_id}")
+def get_job(job_id: str):
+    """
+    Get the status, progress and result of a job.
+    """
+    return get_job_or_404(job_id)
+
+@router.post("/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """
+    Cancel a job: queued jobs never start, running jobs stop at their next progress report.
+    """
+    get_job_or_404(job_id)
+    return job_queue.cancel(job_id)
+
+@router.get("/{job_id}/output")
+def get_job_output(job_id: str):
+    """
+    Download the predictions CSV of a finished batch scoring job.
+    """
+    job = get_job_or_404(job_id)
+    if job["type"] != "batch_score" or job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail="Only succeeded batch scoring jobs have an output file")
+    return FileResponse(job["result"]["output_path"], media_type="text/csv", filename=f"predictions-{job_id}.csv")
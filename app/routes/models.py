@@ -1,6 +1,12 @@
-from fastapi import APIRouter, HTTPException
-from app.schemas.model_schemas import ModelInput
-from app.services.model_manager import Model, ModelRegistry
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from app.schemas.model_schemas import ModelInput, PromoteInput, ShadowInput
+from app.services.artifact_store import artifact_store
+from app.services.drift import drift_monitor
+from app.services.model_manager import ModelRegistry, read_baseline_profile
+from app.services.model_server import model_server
+from app.services.shadow import shadow_scorer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,40 +16,200 @@ router = APIRouter()
 MODEL_REGISTRY_PATH = "app/model_registry/model_registry.csv"
 model_registry = ModelRegistry(MODEL_REGISTRY_PATH)
 
+MAX_PAGE_SIZE = 500
+
+def conditional_response(request: Request, tag: str, last_modified: float, content):
+    """
+    Answer a registry read with ETag / Last-Modified validators, or 304 when the client's copy is current.
+
+    The ETag is a hash of the registry content the resource is built from.
+    If-None-Match takes precedence over If-Modified-Since, as in RFC 9110.
+    """
+    etag = f'"{tag}"'
+    headers = {"ETag": etag, "Last-Modified": formatdate(int(last_modified), usegmt=True), "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    elif request.headers.get("if-modified-since"):
+        try:
+            if int(last_modified) <= parsedate_to_datetime(request.headers["if-modified-since"]).timestamp():
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+    return JSONResponse(content=content, headers=headers)
+
+def page(items: list, offset: int, limit: int) -> dict:
+    next_offset = offset + limit if offset + limit < len(items) else None
+    return {"total": len(items), "offset": offset, "limit": limit, "next_offset": next_offset, "items": items[offset:offset + limit]}
+
 @router.post("/")
 def create_or_update_model(input_data: ModelInput):
     """
     Create or update a model. Automatically increments the version.
+    A candidate version is registered without being served until it is promoted.
     """
     try:
         model_id = input_data.model_id
         model_name = input_data.model_name
         features_list = input_data.features
         author = input_data.author
-        pickle_path = input_data.pickle_path
+        # Registered by content hash: identical artifacts are stored (and loaded) once
+        try:
+            pickle_path = artifact_store.ingest(input_data.pickle_path)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # Kept with the version for drift monitoring, as the stored artifact has no folder of its own
+        baseline_profile = read_baseline_profile(input_data.pickle_path)
 
-        next_version = model_registry.get_next_version(model_id)
+        # Create, save and register the model as the next version, atomically across workers
+        model = model_registry.register(model_id, model_name, features_list, author, pickle_path,
+                                        promoted=not input_data.candidate, baseline_profile=baseline_profile)
+        next_version = model.version
+        if input_data.candidate:
+            return {"message": f"Model {model_id} version {next_version} registered as a candidate.", "pickle_path": pickle_path}
 
-        # Create and save the model
-        model = Model(model_id=model_id, model_name=model_name, version=next_version, features=features_list, author=author, pickle_path=pickle_path)
-        model.save()
-        model_registry.add_entry(model)
+        # Load and warm the new version in the background; other workers pick it up from the registry
+        model_server.schedule(model_id, next_version)
 
-        return {"message": f"Model {model_id} version {next_version} created successfully."}
+        return {"message": f"Model {model_id} version {next_version} created successfully.", "pickle_path": pickle_path}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Error creating or updating model.")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/latest/{model_id}")
-def get_latest_model_version(model_id: str):
+@router.get("/")
+def list_models(request: Request, offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE)):
+    """
+    List registered models with their latest (promoted) version, paginated, from the in-memory registry index.
+    """
+    try:
+        index = model_registry.index()
+        models = [
+            {
+                "model_id": model_id,
+                "model_name": entries[-1]["model_name"],
+                "latest_version": index.latest[model_id]["version"] if model_id in index.latest else None,
+                "versions": len(entries),
+                "candidates": [entry["version"] for entry in entries if not entry["promoted"]],
+                "author": entries[-1]["author"],
+            }
+            for model_id, entries in index.models.items()
+        ]
+        return conditional_response(request, index.etag, index.mtime, page(models, offset, limit))
+    except Exception as e:
+        logger.exception("Error listing models.")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/versions/{model_id}")
+def list_model_versions(model_id: str, request: Request, offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE)):
     """
-    Get the latest version of a given model id.
+    List the registered versions of a model, oldest first, paginated.
     """
     try:
-        latest_model = model_registry.get_latest_version(model_id)
-        if not latest_model:
+        index = model_registry.index()
+        versions = index.models.get(model_id)
+        if not versions:
             raise HTTPException(status_code=404, detail=f"No model found with id {model_id}")
-        return latest_model
+        return conditional_response(request, index.model_etags[model_id], index.mtime, page(versions, offset, limit))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error listing model versions.")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/latest/{model_id}")
+def get_latest_model_version(model_id: str, request: Request):
+    """
+    Get the latest (promoted) version of a given model id.
+    Supports conditional requests (If-None-Match / If-Modified-Since), so pollers get cheap 304s.
+    """
+    try:
+        index = model_registry.index()
+        latest = index.latest.get(model_id)
+        if not latest:
+            raise HTTPException(status_code=404, detail=f"No promoted model found with id {model_id}")
+        return conditional_response(request, index.model_etags[model_id], index.mtime, latest)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Error retrieving latest model version.")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/promote/{model_id}")
+def promote_model_version(model_id: str, input_data: PromoteInput):
+    """
+    Promote a candidate version: it becomes the latest version and is swapped into serving.
+    Shadow scoring of that version stops, as it is now the served one.
+    """
+    try:
+        promoted = model_registry.promote(model_id, input_data.version)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    try:
+        model_server.schedule(model_id, input_data.version)
+        candidate = shadow_scorer.config.get(model_id)
+        if candidate and candidate["version"] == input_data.version:
+            shadow_scorer.remove_candidate(model_id)
+        state = "promoted" if promoted else "was already promoted"
+        return {"message": f"Model {model_id} version {input_data.version} {state}."}
+    except Exception as e:
+        logger.exception("Error promoting model version.")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/shadow/{model_id}")
+def get_shadow(model_id: str):
+    """
+    Get the shadow candidate of a model and its prediction deltas against the served version.
+    """
+    try:
+        return shadow_scorer.report(model_id)
+    except Exception as e:
+        logger.exception("Error retrieving shadow statistics.")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/shadow/{model_id}")
+def set_shadow(model_id: str, input_data: ShadowInput):
+    """
+    Shadow a candidate (registered, not yet promoted) version on a sample of the model's live prediction traffic.
+    """
+    entry = model_registry.get_version(model_id, input_data.version)
+    if not entry:
+        raise HTTPException(status_code=404, detail=f"No model found with ID: {model_id} and version: {input_data.version}")
+    if entry["promoted"]:
+        raise HTTPException(status_code=409, detail=f"Model {model_id} version {input_data.version} is already promoted; "
+                                                    "register the version to shadow with candidate=true")
+    try:
+        shadow_scorer.set_candidate(model_id, input_data.version, input_data.sample_rate)
+        return {"message": f"Shadowing model {model_id} version {input_data.version} on {input_data.sample_rate:.0%} of traffic."}
+    except Exception as e:
+        logger.exception("Error configuring shadow scoring.")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/shadow/{model_id}")
+def delete_shadow(model_id: str):
+    """
+    Stop shadow scoring for a model. Collected statistics are kept.
+    """
+    try:
+        shadow_scorer.remove_candidate(model_id)
+        return {"message": f"Shadow scoring stopped for model {model_id}."}
+    except Exception as e:
+        logger.exception("Error configuring shadow scoring.")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/drift/{model_id}")
+def get_drift(model_id: str):
+    """
+    Compare the inputs served by each version of a model with the training baseline profile.
+    """
+    try:
+        return drift_monitor.report(model_id)
+    except Exception as e:
+        logger.exception("Error retrieving drift statistics.")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,161 +1,258 @@
 from fastapi import APIRouter, HTTPException
-from app.schemas.prediction_schemas import PredictionInput, AllFeaturesPredictionInput
-from app.utils.helpers import get_demographic_data
+from app.schemas.prediction_schemas import (
+    PredictionInput, AllFeaturesPredictionInput, BatchPredictionInput, AllFeaturesBatchPredictionInput,
+    SweepInput, AllFeaturesSweepInput, CompareInput, ModelVersionRef, MAX_SWEEP_POINTS
+)
+from app.utils.helpers import build_sweep_grid, join_demographics, select_features
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-import pickle
-import os
-import json
 import logging
-from app.services.model_manager import ModelRegistry
-
-MODEL_REGISTRY_PATH = "app/model_registry/model_registry.csv"
-model_registry = ModelRegistry(MODEL_REGISTRY_PATH)
+import time
+from app.services.audit_log import audit_log
+from app.services.drift import drift_monitor
+from app.services.explain import EXPLAIN_RETRY_AFTER, ExplainerNotReady, explain_model, format_explanations
+from app.services.model_server import ModelMemoryError, ModelNotFoundError, model_server
+from app.services.shadow import shadow_scorer
+from app.services.thread_budget import thread_budget
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+MAX_COMPARE_ROWS = 10000
+MAX_BATCH_ROWS = 10000
+# Seconds a client should wait before retrying a model that does not fit in the worker's memory right now
+MODEL_MEMORY_RETRY_AFTER = 30
+
+# Models of a comparison run side by side; predict() mostly releases the GIL (or waits on the inference pool)
+compare_executor = ThreadPoolExecutor(max_workers=max(4, thread_budget.threads_per_worker), thread_name_prefix="compare")
+
+def predict_frame(model_id: str, input_df: pd.DataFrame, route: str = "predict", live: bool = True, explain: bool = False):
+    """
+    Predict every row of input_df with the latest version of a model after merging demographic data.
+
+    Returns the predictions, the model version that produced them and, if explain is set,
+    the per-feature contributions of every prediction (None otherwise). Every prediction is
+    recorded in the audit log under the given route. Live traffic (not synthetic inputs such as
+    sweeps) feeds the input drift statistics and may be sampled for shadow scoring by a candidate version.
+    """
+    start = time.perf_counter()
+    # The served version stays alive until this request is done, even if a newer one is swapped in
+    try:
+        with model_server.acquire(model_id) as loaded:
+            logger.info(f"Using model version: {loaded.version}")
+
+            # Predicting after merging with demographic data
+            try:
+                input_with_demographics = join_demographics(input_df)
+                model_input = select_features(input_with_demographics, loaded.features)
+            except ValueError as e:
+                logger.warning(str(e))
+                raise HTTPException(status_code=400, detail=str(e))
+
+            prediction = loaded.model.predict(model_input)
+            explanations = None
+            if explain:
+                try:
+                    bias, contributions = explain_model(loaded.model, model_input)
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+                except ExplainerNotReady as e:
+                    raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(EXPLAIN_RETRY_AFTER)})
+                explanations = format_explanations(loaded.features, bias, contributions)
+            audit_log.record(route, model_id, loaded.version, input_df, prediction, (time.perf_counter() - start) * 1000)
+            if live:
+                drift_monitor.update(model_id, loaded.version, model_input)
+                shadow_scorer.submit(model_id, loaded.version, input_with_demographics, prediction)
+    except ModelNotFoundError as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=404, detail=str(e))
+    except ModelMemoryError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(MODEL_MEMORY_RETRY_AFTER)})
+    except FileNotFoundError as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return prediction, loaded.version, explanations
+
+def predict_latest(model_id: str, inputs: list, explain: bool = False):
+    """
+    Predict one or many inputs with the latest version of a model, optionally explaining each prediction.
+    """
+    if not inputs:
+        raise HTTPException(status_code=400, detail="At least one input is required")
+    if len(inputs) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ROWS} inputs per request")
+
+    input_df = pd.DataFrame([input_data.dict() for input_data in inputs])
+    route = "predict" if len(inputs) == 1 else "batch"
+    prediction, version, explanations = predict_frame(model_id, input_df, route=route, explain=explain)
+    logger.info(f"Prediction of {len(inputs)} input(s) successful")
+    response = {"prediction": prediction.tolist(), "version": version}
+    if explain:
+        response["explanations"] = explanations
+    return response
+
+def sweep_latest(model_id: str, sweep_input):
+    """
+    Predict the whole what-if grid of a sweep in a single vectorized call.
+    """
+    try:
+        grid, axis_values = build_sweep_grid(sweep_input.base.dict(), sweep_input.axes, MAX_SWEEP_POINTS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    prediction, version, _ = predict_frame(model_id, grid, route="sweep", live=False)
+    logger.info(f"Sweep of {len(grid)} points successful")
+    return {
+        "version": version,
+        "axes": [{"feature": axis.feature, "values": values.tolist()} for axis, values in zip(sweep_input.axes, axis_values)],
+        # One price per point: a curve for one axis, a (first axis x second axis) surface for two
+        "predictions": prediction.reshape([len(values) for values in axis_values]).tolist(),
+    }
+
+def score_model(ref: ModelVersionRef, input_df: pd.DataFrame, input_with_demographics: pd.DataFrame):
+    """
+    Score the shared, demographics-joined inputs with one model version.
+    """
+    start = time.perf_counter()
+    try:
+        with model_server.acquire(ref.model_id, ref.version) as loaded:
+            prediction = loaded.model.predict(select_features(input_with_demographics, loaded.features))
+        latency_ms = (time.perf_counter() - start) * 1000
+        audit_log.record("compare", ref.model_id, loaded.version, input_df, prediction, latency_ms)
+        return {
+            "model_id": ref.model_id,
+            "version": loaded.version,
+            "prediction": prediction.tolist(),
+            "latency_ms": latency_ms,
+        }
+    except (ModelNotFoundError, ModelMemoryError, FileNotFoundError, ValueError) as e:
+        logger.warning(f"Comparison failed for model {ref.model_id} version {ref.version}: {e}")
+        return {"model_id": ref.model_id, "version": ref.version, "error": str(e)}
+    except Exception as e:
+        # A version that fails to load or predict must not fail the other models of the comparison
+        logger.exception(f"Comparison failed for model {ref.model_id} version {ref.version}")
+        return {"model_id": ref.model_id, "version": ref.version, "error": f"{type(e).__name__}: {e}"}
+
+def compare_models(compare_input: CompareInput):
+    """
+    Score the same inputs against several model versions with one demographics join.
+    """
+    if not compare_input.inputs or not compare_input.models:
+        raise HTTPException(status_code=400, detail="A comparison needs at least one input and one model")
+    if len(compare_input.inputs) > MAX_COMPARE_ROWS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_COMPARE_ROWS} inputs per comparison")
+
+    input_df = pd.DataFrame([input_data.dict() for input_data in compare_input.inputs])
+    try:
+        input_with_demographics = join_demographics(input_df)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    results = list(compare_executor.map(lambda ref: score_model(ref, input_df, input_with_demographics), compare_input.models))
+    logger.info(f"Compared {len(compare_input.models)} models on {len(input_df)} inputs")
+    return {"rows": len(input_df), "results": results}
+
+# Declared before /{model_id} so that "compare" is not taken as a model id
+@router.post("/compare")
+def predict_compare(compare_input: CompareInput):
+    """
+    Endpoint for scoring one or many inputs against a list of (model_id, version) pairs side by side.
+    A missing version means the latest one.
+    """
+    try:
+        logger.info(f"Received comparison request for {len(compare_input.models)} models")
+        return compare_models(compare_input)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error during comparison")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/batch/{model_id}")
+def predict_batch(model_id: str, batch_input: BatchPredictionInput, explain: bool = False):
+    """
+    Endpoint for predicting many inputs in one call with the latest version of a given model.
+    With explain=true, every prediction comes with its per-feature contributions.
+    """
+    try:
+        logger.info(f"Received batch prediction request of {len(batch_input.inputs)} inputs for model ID: {model_id}")
+        return predict_latest(model_id, batch_input.inputs, explain=explain)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error during batch prediction")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/{model_id}")
-def predict(model_id: str, input_data: PredictionInput):
+def predict(model_id: str, input_data: PredictionInput, explain: bool = False):
     """
     Endpoint for making predictions with the latest version of a given model.
     """
     try:
         logger.info(f"Received prediction request for model ID: {model_id}")
-
-        # Fetch the latest version of the model
-        latest_model = model_registry.get_latest_version(model_id)
-        if not latest_model:
-            logger.error(f"No model found with ID: {model_id}")
-            raise HTTPException(status_code=404, detail=f"No model found with ID: {model_id}")
-
-        version = latest_model["version"]
-        logger.info(f"Using model version: {version}")
-
-        model_path = os.path.join("app/model_registry/models/", model_id, version, "model_path.txt")
-        features_path = os.path.join("app/model_registry/models/", model_id, version, "model_features.json")
-
-        # Read the model path from the text file (This could be getting from the S3)
-        # An S3 approach would be more complex and require boto3 or similar library
-        # But in terms of performance, it would be similar once the model is loaded into memory and best for horizontal scaling
-        try:
-            with open(model_path, "r") as path_file:
-                model_path = path_file.read().strip()
-        except FileNotFoundError:
-            logger.error(f"Model path file not found at path: {model_path}")
-            raise HTTPException(status_code=500, detail=f"Model path file not found at path: {model_path}")
-
-        # Load the pickle
-        try:
-            with open(model_path, "rb") as model_file:
-                model = pickle.load(model_file)
-        except FileNotFoundError:
-            logger.error(f"Model file not found at path: {model_path}")
-            raise HTTPException(status_code=500, detail=f"Model file not found at path: {model_path}")
-
-        # Load the features
-        try:
-            with open(features_path, "r") as features_file:
-                model_features = json.load(features_file)
-        except FileNotFoundError:
-            logger.error(f"Features file not found at path: {features_path}")
-            raise HTTPException(status_code=500, detail=f"Features file not found at path: {features_path}")
-        
-        # Predicting after merging with demographic data
-        input_dict = input_data.dict()
-        input_df = pd.DataFrame([input_dict])
-        zipcode = input_dict["zipcode"]
-        demographic_data = get_demographic_data(zipcode)
-
-        if demographic_data is None:
-            logger.warning(f"No demographic data found for zipcode: {zipcode}")
-            raise HTTPException(status_code=400, detail=f"No demographic data found for zipcode: {zipcode}")
-
-        input_with_demographics = pd.concat([input_df, pd.DataFrame([demographic_data])], axis=1)
-
-        missing_features = [feature for feature in model_features if feature not in input_with_demographics.columns]
-        if missing_features:
-            logger.error(f"Missing required features: {missing_features}")
-            raise HTTPException(status_code=400, detail=f"Missing required features: {missing_features}")
-
-        input_with_demographics = input_with_demographics[model_features]
-        prediction = model.predict(input_with_demographics)
-        logger.info("Prediction successful")
-        return {"prediction": prediction.tolist()}
-
+        return predict_latest(model_id, [input_data], explain=explain)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Error during prediction")
         raise HTTPException(status_code=500, detail=str(e))
 
-# Assuming that the previous route can be flexible for handling different feature sets, we add another route for ALL_FEATURES
-# Only for demonstration; in practice, you might want to handle this differently.
-# In this case can also be used a different validation schema if needed.
-# Also, most of these method's code is duplicated, consider refactoring.
+# The ALL_FEATURES route shares the prediction code above but validates inputs with its own schema
+
+@router.post("/all_features/batch/{model_id}")
+def predict_all_features_batch(model_id: str, batch_input: AllFeaturesBatchPredictionInput, explain: bool = False):
+    """
+    Endpoint for batch predictions with the ALL_FEATURES model, optionally explained.
+    """
+    try:
+        logger.info(f"Received batch prediction request of {len(batch_input.inputs)} inputs for ALL_FEATURES model ID: {model_id}")
+        return predict_latest(model_id, batch_input.inputs, explain=explain)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error during batch prediction")
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/all_features/{model_id}")
-def predict_all_features(model_id: str, input_data: AllFeaturesPredictionInput):
+def predict_all_features(model_id: str, input_data: AllFeaturesPredictionInput, explain: bool = False):
     """
     Endpoint for making predictions with the ALL_FEATURES model.
+    With explain=true, the response includes the contribution of every feature to the price.
     """
     try:
         logger.info(f"Received prediction request for ALL_FEATURES model ID: {model_id}")
+        return predict_latest(model_id, [input_data], explain=explain)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error during prediction")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Fetch the latest version of the model
-        latest_model = model_registry.get_latest_version(model_id)
-        if not latest_model:
-            logger.error(f"No model found with ID: {model_id}")
-            raise HTTPException(status_code=404, detail=f"No model found with ID: {model_id}")
-
-        version = latest_model["version"]
-        logger.info(f"Using model version: {version}")
-
-        # Load the appropriate model and features based on the version
-        model_path = os.path.join("app/model_registry/models/", model_id, version, "model_path.txt")
-        features_path = os.path.join("app/model_registry/models/", model_id, version, "model_features.json")
-
-        try:  # Debugging print
-            with open(model_path, "r") as path_file:
-                model_path = path_file.read().strip()
-        except FileNotFoundError:
-            logger.error(f"Model path file not found at path: {model_path}")
-            raise HTTPException(status_code=500, detail=f"Model path file not found at path: {model_path}")
-
-        try:
-            with open(model_path, "rb") as model_file:
-                 # Debugging print
-                model = pickle.load(model_file)
-        except FileNotFoundError:
-            logger.error(f"Model file not found at path: {model_path}")
-            raise HTTPException(status_code=500, detail=f"Model file not found at path: {model_path}")
-
-        try:
-            with open(features_path, "r") as features_file:
-                model_features = json.load(features_file)
-        except FileNotFoundError:
-            logger.error(f"Features file not found at path: {features_path}")
-            raise HTTPException(status_code=500, detail=f"Features file not found at path: {features_path}")
-        
-        # Predicting after merging with demographic data
-        input_dict = input_data.dict()
-        input_df = pd.DataFrame([input_dict])
-        zipcode = input_dict["zipcode"]
-        demographic_data = get_demographic_data(zipcode)
-
-        if demographic_data is None:
-            logger.warning(f"No demographic data found for zipcode: {zipcode}")
-            raise HTTPException(status_code=400, detail=f"No demographic data found for zipcode: {zipcode}")
-
-        input_with_demographics = pd.concat([input_df, pd.DataFrame([demographic_data])], axis=1)
-
-        missing_features = [feature for feature in model_features if feature not in input_with_demographics.columns]
-        if missing_features:
-            logger.error(f"Missing required features: {missing_features}")
-            raise HTTPException(status_code=400, detail=f"Missing required features: {missing_features}")
-
-        input_with_demographics = input_with_demographics[model_features]
-        prediction = model.predict(input_with_demographics)
-        logger.info("Prediction successful")
-        return {"prediction": prediction.tolist()}
+@router.post("/sweep/{model_id}")
+def predict_sweep(model_id: str, sweep_input: SweepInput):
+    """
+    Endpoint for what-if sweeps: price curve or surface over one or two features of a base input.
+    """
+    try:
+        logger.info(f"Received sweep request for model ID: {model_id}")
+        return sweep_latest(model_id, sweep_input)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error during sweep")
+        raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/all_features/sweep/{model_id}")
+def predict_all_features_sweep(model_id: str, sweep_input: AllFeaturesSweepInput):
+    """
+    Endpoint for what-if sweeps with the ALL_FEATURES model.
+    """
+    try:
+        logger.info(f"Received sweep request for ALL_FEATURES model ID: {model_id}")
+        return sweep_latest(model_id, sweep_input)
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.exception("Error during prediction")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        logger.exception("Error during sweep")
+        raise HTTPException(status_code=500, detail=str(e))
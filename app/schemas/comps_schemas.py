@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+class CompsQuery(BaseModel):
+    lat: float
+    long: float
+    k: int = Field(10, ge=1, le=100)
+    bedrooms: Optional[int] = None
+    min_grade: Optional[int] = None
+    max_grade: Optional[int] = None
+    min_sqft_living: Optional[int] = None
+    max_sqft_living: Optional[int] = None
+
+class CompsBatchQuery(BaseModel):
+    queries: List[CompsQuery]
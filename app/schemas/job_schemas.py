@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class TrainJobInput(BaseModel):
+    model_id: str
+    model_name: str
+    author: str
+    model_type: str = "RandomForest"
+    feature_set: str = "all_features"
+    n_estimators: Optional[int] = Field(None, ge=1, le=2000)
+    # Register the trained model as a candidate instead of serving it right away
+    candidate: bool = False
+
+class BatchScoreJobInput(BaseModel):
+    model_id: str
+    version: Optional[str] = None
+    input_path: str
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List
 
 class ModelInput(BaseModel):
@@ -6,4 +6,13 @@ class ModelInput(BaseModel):
     model_name: str
     features: List[str]
     author: str
-    pickle_path: str
\ No newline at end of file
+    pickle_path: str
+    # A candidate is registered without being served, e.g. to be shadowed first, until it is promoted
+    candidate: bool = False
+
+class PromoteInput(BaseModel):
+    version: str
+
+class ShadowInput(BaseModel):
+    version: str
+    sample_rate: float = Field(1.0, gt=0.0, le=1.0)
@@ -1,4 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+# Largest what-if grid a sweep may ask for, over all its axes
+MAX_SWEEP_POINTS = 10000
 
 class PredictionInput(BaseModel):
     bedrooms: int
@@ -34,4 +38,33 @@ class AllFeaturesPredictionInput(BaseModel):
     lat: float
     long: float
     sqft_living15: int
-    sqft_lot15: int
\ No newline at end of file
+    sqft_lot15: int
+
+class BatchPredictionInput(BaseModel):
+    inputs: List[PredictionInput]
+
+class AllFeaturesBatchPredictionInput(BaseModel):
+    inputs: List[AllFeaturesPredictionInput]
+
+class SweepAxis(BaseModel):
+    feature: str
+    values: Optional[List[float]] = Field(None, max_length=MAX_SWEEP_POINTS)
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    num: int = Field(20, ge=1, le=MAX_SWEEP_POINTS)
+
+class SweepInput(BaseModel):
+    base: PredictionInput
+    axes: List[SweepAxis]
+
+class AllFeaturesSweepInput(BaseModel):
+    base: AllFeaturesPredictionInput
+    axes: List[SweepAxis]
+
+class ModelVersionRef(BaseModel):
+    model_id: str
+    version: Optional[str] = None
+
+class CompareInput(BaseModel):
+    inputs: List[AllFeaturesPredictionInput]
+    models: List[ModelVersionRef]
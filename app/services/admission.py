@@ -0,0 +1,201 @@
+import os
+import json
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from app.services.worker_snapshots import read_snapshots, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Limits are per client and per gunicorn worker. A keep-alive client stays on one worker and gets
+# the full rate; a client whose connections spread over several workers can get up to workers x rate
+RATE_LIMIT_RPS = float(os.environ.get("RATE_LIMIT_RPS") or 50)
+RATE_LIMIT_BURST = float(os.environ.get("RATE_LIMIT_BURST") or 100)
+# Prediction requests a single worker works on at once; more are shed with 503
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT") or 32)
+ADMISSION_PATHS = tuple(os.environ.get("ADMISSION_PATHS", "/predictions").split(","))
+API_KEY_HEADER = b"x-api-key"
+# API keys that get a bucket of their own (comma-separated). Nothing authenticates the header, so any
+# other key is ignored and its requests are charged to the client IP like requests without one
+RATE_LIMIT_API_KEYS = frozenset(key for key in os.environ.get("RATE_LIMIT_API_KEYS", "").split(",") if key)
+MAX_TRACKED_CLIENTS = 10000
+ADMISSION_STATS_DIR = "app/model_registry/admission_stats/"
+ADMISSION_SNAPSHOT_INTERVAL = float(os.environ.get("ADMISSION_SNAPSHOT_INTERVAL") or 5.0)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """
+        Take one token. Returns 0 when admitted, otherwise the seconds until a token is available.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """
+    Decides, before any request parsing, whether a prediction request is served.
+
+    Every client (a configured API key, or else the client IP) has a token bucket; a client out of
+    tokens gets 429. Buckets are per worker: they are not shared between processes, so
+    the limits apply to the traffic a worker sees. Each worker also caps the prediction requests it has in flight and
+    sheds the excess with 503. Both carry a Retry-After header. All state is touched from
+    the worker's event loop only; counters are published as snapshots for the admin route.
+    """
+    def __init__(self, rate: float = RATE_LIMIT_RPS, burst: float = RATE_LIMIT_BURST, max_in_flight: int = MAX_IN_FLIGHT,
+                 stats_dir: str = ADMISSION_STATS_DIR, snapshot_interval: float = ADMISSION_SNAPSHOT_INTERVAL,
+                 api_keys: frozenset = RATE_LIMIT_API_KEYS):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_in_flight = max_in_flight
+        self.stats_dir = stats_dir
+        self.snapshot_interval = snapshot_interval
+        self.api_keys = api_keys
+        self.buckets = OrderedDict()
+        self.in_flight = 0
+        self.counters = {"requests": 0, "admitted": 0, "rate_limited": 0, "shed": 0, "peak_in_flight": 0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="admission-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        self.publish()
+
+    def _run(self):
+        while not self._stop.wait(self.snapshot_interval):
+            try:
+                self.publish()
+            except Exception:
+                logger.exception("Error publishing admission counters")
+
+    def client_key(self, scope) -> str:
+        """
+        The bucket a request is charged to: its API key when that key is configured, otherwise its client IP.
+        """
+        for name, value in scope["headers"]:
+            if name == API_KEY_HEADER:
+                api_key = value.decode("latin-1")
+                if api_key in self.api_keys:
+                    return "key:" + api_key
+                break
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    def admit(self, client: str):
+        """
+        Returns None when the request is admitted, otherwise (status, detail, retry_after seconds).
+        """
+        self.counters["requests"] += 1
+        if self.rate > 0:
+            now = time.monotonic()
+            bucket = self.buckets.get(client)
+            if bucket is None:
+                bucket = self.buckets[client] = TokenBucket(self.rate, self.burst, now)
+                if len(self.buckets) > MAX_TRACKED_CLIENTS:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(client)
+            wait = bucket.take(now)
+            if wait:
+                self.counters["rate_limited"] += 1
+                return 429, "Rate limit exceeded", wait
+
+        if self.in_flight >= self.max_in_flight:
+            self.counters["shed"] += 1
+            return 503, "Server overloaded", 1.0
+
+        self.in_flight += 1
+        self.counters["admitted"] += 1
+        self.counters["peak_in_flight"] = max(self.counters["peak_in_flight"], self.in_flight)
+        return None
+
+    def release(self):
+        self.in_flight -= 1
+
+    def publish(self):
+        write_snapshot(self.stats_dir, dict(self.counters, in_flight=self.in_flight, clients=len(self.buckets)))
+
+    def report(self) -> dict:
+        """
+        Limits and counters merged across all workers.
+        """
+        self.publish()
+        totals = {}
+        for snapshot in read_snapshots(self.stats_dir):
+            for key, value in snapshot.items():
+                if key == "peak_in_flight":
+                    totals[key] = max(totals.get(key, 0), value)
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return {
+            "limits": {
+                "rate_per_client_per_worker": self.rate,
+                "burst_per_client_per_worker": self.burst,
+                "max_in_flight_per_worker": self.max_in_flight,
+                "paths": list(ADMISSION_PATHS),
+                "api_keys": len(self.api_keys),
+            },
+            "counters": totals,
+        }
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware applying the admission controller to the prediction routes.
+
+    Rejected requests are answered straight from here, so neither the request body,
+    validation, pandas nor the model is touched for them.
+    """
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(ADMISSION_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        rejection = self.controller.admit(self.controller.client_key(scope))
+        if rejection:
+            await self.reject(send, *rejection)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
+
+    @staticmethod
+    async def reject(send, status: int, detail: str, retry_after: float):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,373 @@
+import os
+import hashlib
+import logging
+import pickle
+import shutil
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from app.utils.private_dir import default_private_dir, ensure_private_dir
+
+logger = logging.getLogger(__name__)
+
+# Registered pickle paths of the form "sha256:<hex digest>" refer to the artifact store
+ARTIFACT_REF_PREFIX = "sha256:"
+ARTIFACT_BACKEND = os.environ.get("ARTIFACT_BACKEND", "local")
+ARTIFACT_ROOT = os.environ.get("ARTIFACT_ROOT", "app/model_registry/artifacts/")
+ARTIFACT_S3_BUCKET = os.environ.get("ARTIFACT_S3_BUCKET")
+ARTIFACT_S3_PREFIX = os.environ.get("ARTIFACT_S3_PREFIX", "artifacts/")
+# Point this at any S3-compatible server (MinIO, a local moto server, ...)
+ARTIFACT_S3_ENDPOINT_URL = os.environ.get("ARTIFACT_S3_ENDPOINT_URL")
+# Artifacts in the cache are unpickled, so it must be a directory only this user can write to (checked on use)
+ARTIFACT_CACHE_DIR = os.environ.get("ARTIFACT_CACHE_DIR") or default_private_dir("real-estate-artifacts")
+ARTIFACT_CACHE_BYTES = int(os.environ.get("ARTIFACT_CACHE_BYTES") or 2 * 1024 ** 3)
+ARTIFACT_CHUNK_SIZE = int(os.environ.get("ARTIFACT_CHUNK_SIZE") or 8 * 1024 ** 2)
+ARTIFACT_FETCH_THREADS = int(os.environ.get("ARTIFACT_FETCH_THREADS") or 8)
+
+_HASH_BLOCK_SIZE = 1024 ** 2
+
+
+class ArtifactIntegrityError(ValueError):
+    pass
+
+
+def is_artifact_ref(path: str) -> bool:
+    return path.startswith(ARTIFACT_REF_PREFIX)
+
+
+def read_verified(path: str, digest: str) -> bytes:
+    """
+    Content of a file, checked against its digest. The bytes returned are the bytes hashed, so the
+    file cannot be swapped between the check and their use.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    actual = hashlib.sha256(data).hexdigest()
+    if actual != digest:
+        raise ArtifactIntegrityError(f"Artifact {digest} is corrupt (content hashes to {actual})")
+    return data
+
+
+def file_digest(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+class LocalBackend:
+    """
+    Artifacts as files under a local (or network mounted) directory, sharded by digest prefix.
+    """
+    def __init__(self, root: str = ARTIFACT_ROOT):
+        self.root = root
+
+    def local_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.local_path(digest))
+
+    def size(self, digest: str) -> int:
+        return os.path.getsize(self.local_path(digest))
+
+    def read_range(self, digest: str, start: int, end: int) -> bytes:
+        with open(self.local_path(digest), "rb") as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    def upload(self, digest: str, path: str):
+        target = self.local_path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class S3Backend:
+    """
+    Artifacts as objects in an S3-compatible bucket. Requires boto3.
+    """
+    def __init__(self, bucket: str = ARTIFACT_S3_BUCKET, prefix: str = ARTIFACT_S3_PREFIX,
+                 endpoint_url: str = ARTIFACT_S3_ENDPOINT_URL, client=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise ImportError("The S3 artifact backend requires boto3 (pip install boto3).")
+            client = boto3.client("s3", endpoint_url=endpoint_url)
+        if not bucket:
+            raise ValueError("ARTIFACT_S3_BUCKET must be set for the S3 artifact backend.")
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def key(self, digest: str) -> str:
+        return f"{self.prefix}{digest[:2]}/{digest}"
+
+    def exists(self, digest: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key(digest))
+            return True
+        except self.client.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def size(self, digest: str) -> int:
+        return self.client.head_object(Bucket=self.bucket, Key=self.key(digest))["ContentLength"]
+
+    def read_range(self, digest: str, start: int, end: int) -> bytes:
+        response = self.client.get_object(Bucket=self.bucket, Key=self.key(digest), Range=f"bytes={start}-{end - 1}")
+        return response["Body"].read()
+
+    def upload(self, digest: str, path: str):
+        self.client.upload_file(path, self.bucket, self.key(digest))
+
+
+class DiskCache:
+    """
+    Size-bounded directory of fetched artifacts, evicting the least recently used ones.
+
+    Recency is kept in file mtimes, so the gunicorn workers sharing the directory
+    (and restarts) see the same order.
+    """
+    def __init__(self, directory: str = ARTIFACT_CACHE_DIR, max_bytes: int = ARTIFACT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest)
+
+    def get(self, digest: str):
+        path = self.path(digest)
+        try:
+            ensure_private_dir(self.directory, create=False)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def _entries(self) -> OrderedDict:
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+        return OrderedDict((name, size) for _, name, size in sorted(entries))
+
+    def reserve(self, size: int, keep: str = None):
+        """
+        Evict least recently used artifacts until size more bytes fit.
+        """
+        with self.lock:
+            ensure_private_dir(self.directory)
+            entries = self._entries()
+            total = sum(entries.values())
+            for name, entry_size in entries.items():
+                if total + size <= self.max_bytes:
+                    break
+                if name == keep:
+                    continue
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                    total -= entry_size
+                    logger.info(f"Evicted artifact {name} from the local cache")
+                except FileNotFoundError:
+                    pass
+            if total + size > self.max_bytes:
+                logger.warning(f"Artifact of {size} bytes exceeds the free artifact cache space")
+
+    def discard(self, digest: str):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+
+class ArtifactStore:
+    """
+    Content-addressed model artifacts: each artifact is stored once under its SHA-256 digest.
+
+    Registering an artifact that is already stored only returns its reference, so identical
+    artifacts registered under several versions share one object, one local copy and,
+    while any version uses it, one unpickled model per process. Remote artifacts are fetched
+    in parallel byte ranges into a local LRU disk cache, and every load verifies the digest.
+    """
+    def __init__(self, backend, cache: DiskCache = None, chunk_size: int = ARTIFACT_CHUNK_SIZE,
+                 fetch_threads: int = ARTIFACT_FETCH_THREADS):
+        self.backend = backend
+        self.cache = cache or DiskCache()
+        self.chunk_size = chunk_size
+        self.fetch_threads = fetch_threads
+        self.fetch_locks = {}
+        self.lock = threading.Lock()
+        self.models = weakref.WeakValueDictionary()
+
+    @classmethod
+    def from_env(cls):
+        if ARTIFACT_BACKEND == "s3":
+            return cls(S3Backend())
+        if ARTIFACT_BACKEND == "local":
+            return cls(LocalBackend())
+        raise ValueError(f"Unknown artifact backend: {ARTIFACT_BACKEND}")
+
+    def put(self, path: str) -> str:
+        """
+        Store a local file if its content is not stored yet, and return its "sha256:<digest>" reference.
+        """
+        digest = file_digest(path)
+        if self.backend.exists(digest):
+            logger.info(f"Artifact {path} is already stored as {digest}")
+        else:
+            self.backend.upload(digest, path)
+            logger.info(f"Stored artifact {path} as {digest}")
+        return ARTIFACT_REF_PREFIX + digest
+
+    def ingest(self, path: str) -> str:
+        """
+        Reference to register for a pickle path: existing references are checked, files are stored.
+        """
+        if is_artifact_ref(path):
+            if not self.backend.exists(path[len(ARTIFACT_REF_PREFIX):]):
+                raise FileNotFoundError(f"Artifact not found in the store: {path}")
+            return path
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model file not found at path: {path}")
+        return self.put(path)
+
+    def _verify(self, path: str, digest: str):
+        actual = file_digest(path)
+        if actual != digest:
+            raise ArtifactIntegrityError(f"Artifact {digest} is corrupt (content hashes to {actual})")
+
+    @contextmanager
+    def _fetch_lock(self, digest: str):
+        """
+        Serialize fetches of one artifact within the process; the lock is dropped once no thread holds or waits for it.
+        """
+        with self.lock:
+            entry = self.fetch_locks.setdefault(digest, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self.fetch_locks[digest]
+
+    def _fetch(self, digest: str) -> str:
+        size = self.backend.size(digest)
+        self.cache.reserve(size, keep=digest)
+        target = self.cache.path(digest)
+        tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        ranges = [(start, min(start + self.chunk_size, size)) for start in range(0, size, self.chunk_size)]
+
+        def fetch_range(byte_range):
+            start, end = byte_range
+            data = self.backend.read_range(digest, start, end)
+            if len(data) != end - start:
+                raise ArtifactIntegrityError(f"Short read of artifact {digest} at bytes {start}-{end}")
+            os.pwrite(fd, data, start)
+
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            with ThreadPoolExecutor(max_workers=self.fetch_threads, thread_name_prefix="artifact-fetch") as executor:
+                list(executor.map(fetch_range, ranges))
+            os.close(fd)
+            fd = None
+            self._verify(tmp_path, digest)
+            os.replace(tmp_path, target)
+        finally:
+            if fd is not None:
+                os.close(fd)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        logger.info(f"Fetched artifact {digest} ({size} bytes in {len(ranges)} chunks)")
+        return target
+
+    def size(self, ref: str) -> int:
+        """
+        Size of an artifact in bytes, from the local copy when there is one.
+        """
+        digest = ref[len(ARTIFACT_REF_PREFIX):] if is_artifact_ref(ref) else ref
+        if not hasattr(self.backend, "local_path"):
+            try:
+                return os.path.getsize(self.cache.path(digest))
+            except FileNotFoundError:
+                pass
+        return self.backend.size(digest)
+
+    def _local(self, ref: str, use):
+        """
+        Apply use(path, digest) to a local copy of the artifact, fetching it into the cache if needed.
+        use verifies the content and raises ArtifactIntegrityError when it does not match.
+        """
+        digest = ref[len(ARTIFACT_REF_PREFIX):] if is_artifact_ref(ref) else ref
+        if hasattr(self.backend, "local_path"):
+            path = self.backend.local_path(digest)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Artifact not found in the store: {ref}")
+            return use(path, digest)
+
+        with self._fetch_lock(digest):
+            path = self.cache.get(digest)
+            if path:
+                try:
+                    return use(path, digest)
+                except ArtifactIntegrityError:
+                    logger.warning(f"Cached artifact {digest} is corrupt; fetching it again")
+                    self.cache.discard(digest)
+            if not self.backend.exists(digest):
+                raise FileNotFoundError(f"Artifact not found in the store: {ref}")
+            return use(self._fetch(digest), digest)
+
+    def get_path(self, ref: str) -> str:
+        """
+        Local path of a verified copy of the artifact, fetching it into the cache if needed.
+        """
+        def verified_path(path: str, digest: str) -> str:
+            self._verify(path, digest)
+            return path
+
+        return self._local(ref, verified_path)
+
+    def read(self, ref: str) -> bytes:
+        """
+        Verified content of the artifact, fetching it into the cache if needed.
+        """
+        return self._local(ref, read_verified)
+
+    def load(self, ref: str):
+        """
+        Unpickle an artifact, sharing the object with other versions registered with the same content.
+
+        Only the bytes that were verified are unpickled: the file is read once, not checked and reopened.
+        """
+        digest = ref[len(ARTIFACT_REF_PREFIX):] if is_artifact_ref(ref) else ref
+        model = self.models.get(digest)
+        if model is None:
+            model = pickle.loads(self.read(digest))
+            try:
+                self.models[digest] = model
+            except TypeError:
+                pass
+        return model
+
+
+artifact_store = ArtifactStore.from_env()
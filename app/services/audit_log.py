@@ -0,0 +1,310 @@
+import os
+import re
+import time
+import uuid
+import logging
+import threading
+from collections import deque, namedtuple
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from app.services.worker_snapshots import process_alive, read_snapshots, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+AUDIT_DIR = os.environ.get("AUDIT_DIR", "app/audit_log/")
+AUDIT_STATS_DIR = os.path.join(AUDIT_DIR, "stats")
+# "parquet" or "arrow" (Arrow IPC stream format, readable up to the last complete batch even if never closed)
+AUDIT_FORMAT = os.environ.get("AUDIT_FORMAT", "parquet")
+# Rows the in-memory buffer holds before new records are dropped
+AUDIT_BUFFER_ROWS = int(os.environ.get("AUDIT_BUFFER_ROWS") or 100000)
+AUDIT_BATCH_ROWS = int(os.environ.get("AUDIT_BATCH_ROWS") or 5000)
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL") or 1.0)
+# A Parquet file is only readable once closed: rotating often bounds what a crashed worker loses
+AUDIT_ROTATE_ROWS = int(os.environ.get("AUDIT_ROTATE_ROWS") or 50000)
+AUDIT_ROTATE_SECONDS = float(os.environ.get("AUDIT_ROTATE_SECONDS") or 60)
+
+_EXTENSIONS = {"parquet": "parquet", "arrow": "arrows"}
+# Part files are named audit-<time>-<pid>-<index>.<extension>.tmp until closed
+_PART_FILE = re.compile(r"audit-\d{8}T\d{6}-(?P<pid>\d+)-\d+\.(?P<extension>parquet|arrows)\.tmp$")
+
+AUDIT_SCHEMA = pa.schema([
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+    ("request_id", pa.string()),
+    ("route", pa.string()),
+    ("model_id", pa.string()),
+    ("version", pa.string()),
+    ("row", pa.int32()),
+    # Inputs as received, one JSON object per row (models have different feature sets)
+    ("inputs", pa.string()),
+    ("prediction", pa.float64()),
+    ("latency_ms", pa.float64()),
+])
+
+AuditRecord = namedtuple("AuditRecord", ["timestamp", "request_id", "route", "model_id", "version", "inputs", "prediction", "latency_ms"])
+
+
+class AuditLog:
+    """
+    Records every prediction (inputs, model, version, output, latency) to rotating columnar files.
+
+    Request threads only append a reference to their inputs and predictions to a bounded
+    in-memory buffer; when it is full the record is dropped and counted instead of blocking.
+    A background writer serialises the buffered records in batches and appends them to the
+    current Parquet / Arrow IPC stream file, which is rotated by row count and age. Files are
+    written under a temporary name and renamed once closed, so every visible file is complete.
+
+    Part files left behind by workers that died are salvaged at startup: an Arrow stream keeps
+    every batch written before the crash, a Parquet file only if it was complete (its footer
+    is written on close). Unreadable ones are kept aside as .partial files.
+    """
+    def __init__(self, directory: str = AUDIT_DIR, file_format: str = AUDIT_FORMAT, buffer_rows: int = AUDIT_BUFFER_ROWS,
+                 batch_rows: int = AUDIT_BATCH_ROWS, flush_interval: float = AUDIT_FLUSH_INTERVAL,
+                 rotate_rows: int = AUDIT_ROTATE_ROWS, rotate_seconds: float = AUDIT_ROTATE_SECONDS,
+                 stats_dir: str = AUDIT_STATS_DIR):
+        if file_format not in ("parquet", "arrow"):
+            raise ValueError(f"Unknown audit log format: {file_format}")
+        self.directory = directory
+        self.file_format = file_format
+        self.buffer_rows = buffer_rows
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.rotate_rows = rotate_rows
+        self.rotate_seconds = rotate_seconds
+        self.stats_dir = stats_dir
+        self.buffer = deque()
+        self.buffered_rows = 0
+        self.lock = threading.Lock()
+        self.counters = {"records": 0, "rows": 0, "dropped_records": 0, "dropped_rows": 0,
+                         "written_rows": 0, "write_errors": 0, "lost_rows": 0, "files": 0,
+                         "salvaged_files": 0, "salvaged_rows": 0, "partial_files": 0}
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._writer = None
+        self._writer_path = None
+        self._writer_rows = 0
+        self._writer_opened = 0.0
+        self._file_index = 0
+
+    def start(self):
+        try:
+            self.salvage()
+        except Exception:
+            logger.exception("Error salvaging audit log part files")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            # The writer flushes what is left and closes its file on the way out
+            self._thread.join(timeout=10)
+            if self._thread.is_alive():
+                # Flushing here too would race the writer on the same part file
+                logger.warning("Audit log writer did not stop in time; it keeps flushing in the background")
+            return
+        self._shutdown()
+
+    def salvage(self):
+        """
+        Finish the part files of workers that are no longer running, keeping every row that can still be read.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            match = _PART_FILE.match(name)
+            if not match or process_alive(int(match["pid"])):
+                continue
+            final_path = os.path.join(self.directory, name[:-len(".tmp")])
+            # Workers starting together all look: the one that renames the file salvages it
+            path = f"{final_path}.salvage-{os.getpid()}"
+            try:
+                os.rename(os.path.join(self.directory, name), path)
+            except FileNotFoundError:
+                continue
+            try:
+                rows = self._salvage_file(path, final_path, match["extension"])
+            except Exception:
+                logger.exception(f"Could not read audit log part file {name}; keeping it as {final_path}.partial")
+                os.replace(path, final_path + ".partial")
+                with self.lock:
+                    self.counters["partial_files"] += 1
+                continue
+            with self.lock:
+                self.counters["salvaged_files"] += 1
+                self.counters["salvaged_rows"] += rows
+            logger.warning(f"Salvaged {rows} rows from audit log part file {name} of a stopped worker")
+
+    @staticmethod
+    def _salvage_file(path: str, final_path: str, extension: str) -> int:
+        if extension == "parquet":
+            # Raises unless the footer was written
+            rows = pq.ParquetFile(path).metadata.num_rows
+            os.replace(path, final_path)
+            return rows
+
+        batches = []
+        with pa.OSFile(path, "rb") as source:
+            try:
+                reader = pa.ipc.open_stream(source)
+                for batch in reader:
+                    batches.append(batch)
+            except (pa.ArrowInvalid, OSError):
+                # Truncated in the middle of a batch: keep the complete ones
+                pass
+        if not batches:
+            os.remove(path)
+            return 0
+        with pa.OSFile(final_path + ".tmp", "wb") as sink, pa.ipc.new_stream(sink, AUDIT_SCHEMA) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+        os.replace(final_path + ".tmp", final_path)
+        os.remove(path)
+        return sum(batch.num_rows for batch in batches)
+
+    def _shutdown(self):
+        try:
+            self._flush()
+            self._close_file()
+        except Exception:
+            logger.exception("Error closing the audit log")
+        self.publish()
+
+    def record(self, route: str, model_id: str, version: str, inputs, prediction, latency_ms: float):
+        """
+        Called on the request path: buffer one request's inputs and predictions without ever blocking on disk.
+        """
+        rows = len(inputs)
+        entry = AuditRecord(time.time(), uuid.uuid4().hex, route, model_id, version, inputs, prediction, latency_ms)
+        with self.lock:
+            self.counters["records"] += 1
+            self.counters["rows"] += rows
+            if self.buffered_rows + rows > self.buffer_rows:
+                self.counters["dropped_records"] += 1
+                self.counters["dropped_rows"] += rows
+                return
+            self.buffer.append(entry)
+            self.buffered_rows += rows
+            if self.buffered_rows >= self.batch_rows:
+                self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self._flush()
+                if self._writer and time.monotonic() - self._writer_opened >= self.rotate_seconds:
+                    self._close_file()
+            except Exception:
+                logger.exception("Error in audit log writer")
+            self.publish()
+        self._shutdown()
+
+    def _flush(self):
+        with self.lock:
+            if not self.buffer:
+                return
+            entries, self.buffer = self.buffer, deque()
+            rows, self.buffered_rows = self.buffered_rows, 0
+
+        try:
+            table = self._to_table(entries)
+            self._write(table)
+        except Exception:
+            logger.exception(f"Failed to write {rows} audit rows")
+            self._close_file()
+            with self.lock:
+                self.counters["write_errors"] += 1
+                self.counters["lost_rows"] += rows
+            return
+        with self.lock:
+            self.counters["written_rows"] += rows
+
+    @staticmethod
+    def _to_table(entries) -> pa.Table:
+        counts = [len(entry.inputs) for entry in entries]
+
+        def repeat(values):
+            return np.repeat(np.asarray(values, dtype=object), counts)
+
+        inputs = []
+        for entry in entries:
+            inputs.extend(entry.inputs.to_json(orient="records", lines=True).splitlines())
+
+        return pa.Table.from_arrays([
+            pa.array(np.repeat([int(entry.timestamp * 1e6) for entry in entries], counts), type=AUDIT_SCHEMA.field("timestamp").type),
+            pa.array(repeat([entry.request_id for entry in entries]), type=pa.string()),
+            pa.array(repeat([entry.route for entry in entries]), type=pa.string()),
+            pa.array(repeat([entry.model_id for entry in entries]), type=pa.string()),
+            pa.array(repeat([entry.version for entry in entries]), type=pa.string()),
+            pa.array(np.concatenate([np.arange(count, dtype=np.int32) for count in counts])),
+            pa.array(inputs, type=pa.string()),
+            pa.array(np.concatenate([np.asarray(entry.prediction, dtype=float).ravel() for entry in entries])),
+            pa.array(np.repeat([entry.latency_ms for entry in entries], counts).astype(float)),
+        ], schema=AUDIT_SCHEMA)
+
+    def _write(self, table: pa.Table):
+        if self._writer is None:
+            self._open_file()
+        if self.file_format == "parquet":
+            self._writer.write_table(table)
+        else:
+            self._writer.write_table(table, max_chunksize=self.batch_rows)
+        self._writer_rows += table.num_rows
+        if self._writer_rows >= self.rotate_rows:
+            self._close_file()
+
+    def _open_file(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._file_index += 1
+        extension = _EXTENSIONS[self.file_format]
+        name = f"audit-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self._file_index:04d}.{extension}"
+        self._writer_path = os.path.join(self.directory, name)
+        if self.file_format == "parquet":
+            self._writer = pq.ParquetWriter(self._writer_path + ".tmp", AUDIT_SCHEMA)
+        else:
+            self._writer = pa.ipc.new_stream(self._writer_path + ".tmp", AUDIT_SCHEMA)
+        self._writer_rows = 0
+        self._writer_opened = time.monotonic()
+
+    def _close_file(self):
+        if self._writer is None:
+            return
+        writer, self._writer = self._writer, None
+        try:
+            writer.close()
+            os.replace(self._writer_path + ".tmp", self._writer_path)
+            with self.lock:
+                self.counters["files"] += 1
+            logger.info(f"Closed audit log file {self._writer_path} ({self._writer_rows} rows)")
+        except Exception:
+            logger.exception(f"Failed to close audit log file {self._writer_path}")
+
+    def publish(self):
+        with self.lock:
+            payload = dict(self.counters, buffered_rows=self.buffered_rows)
+        write_snapshot(self.stats_dir, payload)
+
+    def report(self) -> dict:
+        """
+        Counters merged across all workers, and the closed audit files.
+        """
+        self.publish()
+        totals = {}
+        for snapshot in read_snapshots(self.stats_dir):
+            for key, value in snapshot.items():
+                totals[key] = totals.get(key, 0) + value
+        try:
+            files = sorted(name for name in os.listdir(self.directory) if name.endswith((".parquet", ".arrows")))
+        except FileNotFoundError:
+            files = []
+        return {"format": self.file_format, "directory": self.directory, "counters": totals, "files": files}
+
+
+audit_log = AuditLog()
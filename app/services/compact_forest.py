@@ -0,0 +1,229 @@
+import logging
+import numpy as np
+from sklearn import pipeline
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from sklearn.base import BaseEstimator, RegressorMixin
+
+logger = logging.getLogger(__name__)
+
+# Rows are traversed in chunks so the (n_trees, n_rows) index matrix stays small
+PREDICT_CHUNK_SIZE = 4096
+
+
+class CompactForest(RegressorMixin, BaseEstimator):
+    """
+    Serving variant of a fitted tree ensemble regressor (RandomForest / ExtraTrees).
+
+    Every tree is flattened into shared node arrays with float32 thresholds and
+    node values. Leaves point to themselves, so all trees are traversed together
+    with a fixed number of vectorized steps instead of one Python call per tree.
+    Instances are built with from_forest(); fit() is intentionally not supported.
+    """
+    def __init__(self, feature, threshold, children_left, children_right, value, roots, depth, n_features_in):
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        self.value = value
+        self.roots = roots
+        self.depth = depth
+        self.n_features_in = n_features_in
+        self.n_features_in_ = n_features_in
+
+    @classmethod
+    def from_forest(cls, forest, n_estimators: int = None, max_depth: int = None, min_node_samples: int = None):
+        """
+        Flatten a fitted forest, optionally pruning it.
+
+        Args:
+            forest: fitted sklearn forest regressor with single output
+            n_estimators: keep only the first n trees
+            max_depth: collapse every node at this depth into a leaf
+            min_node_samples: collapse nodes trained on fewer samples into leaves
+        """
+        estimators = forest.estimators_[:n_estimators] if n_estimators else forest.estimators_
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        forest_depth = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            if tree.value.shape[1] != 1:
+                raise ValueError("CompactForest only supports single-output regression trees.")
+
+            # Walk the tree level by level, keeping only the nodes that survive pruning
+            levels, stops = [], []
+            frontier = np.array([0])
+            depth = 0
+            while frontier.size:
+                stop = tree.children_left[frontier] == -1
+                if max_depth is not None and depth >= max_depth:
+                    stop[:] = True
+                if min_node_samples is not None:
+                    stop |= tree.n_node_samples[frontier] < min_node_samples
+                levels.append(frontier)
+                stops.append(stop)
+                internal = frontier[~stop]
+                frontier = np.stack([tree.children_left[internal], tree.children_right[internal]], axis=1).ravel()
+                depth += 1
+
+            kept = np.concatenate(levels)
+            is_leaf = np.concatenate(stops)
+            remap = np.full(tree.node_count, -1)
+            remap[kept] = np.arange(len(kept)) + offset
+            self_index = np.arange(len(kept)) + offset
+
+            features.append(np.where(is_leaf, 0, tree.feature[kept]))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold[kept]))
+            lefts.append(np.where(is_leaf, self_index, remap[tree.children_left[kept]]))
+            rights.append(np.where(is_leaf, self_index, remap[tree.children_right[kept]]))
+            values.append(tree.value[kept, 0, 0])
+            roots.append(offset)
+            offset += len(kept)
+            forest_depth = max(forest_depth, depth - 1)
+
+        # Round thresholds down to float32 so that x <= threshold keeps the same outcome
+        # for every float32 input, which is what sklearn trees compare against
+        threshold = np.concatenate(thresholds)
+        threshold32 = threshold.astype(np.float32)
+        rounded_up = threshold32 > threshold
+        threshold32[rounded_up] = np.nextafter(threshold32[rounded_up], np.float32(-np.inf))
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=threshold32,
+            children_left=np.concatenate(lefts).astype(np.int32),
+            children_right=np.concatenate(rights).astype(np.int32),
+            value=np.concatenate(values).astype(np.float32),
+            roots=np.asarray(roots, dtype=np.int32),
+            depth=int(forest_depth),
+            n_features_in=int(forest.n_features_in_),
+        )
+
+    def fit(self, X, y=None):
+        raise TypeError("CompactForest cannot be fitted; it is built from a fitted forest with CompactForest.from_forest().")
+
+    def __sklearn_is_fitted__(self):
+        return True
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.value)
+
+    def _leaves(self, X):
+        """
+        Return the leaf index reached in every tree, shape (n_trees, n_rows).
+
+        (tree, row) pairs are kept in flat arrays and dropped as soon as they reach a
+        leaf, so each step only gathers the paths that are still descending.
+        """
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        nodes = np.repeat(self.roots, n_rows)
+        rows = np.tile(np.arange(n_rows), len(self.roots))
+        positions = np.arange(nodes.size)
+        leaves = np.empty_like(nodes)
+        for _ in range(self.depth):
+            go_left = flat_X[rows * n_features + self.feature[nodes]] <= self.threshold[nodes]
+            next_nodes = np.where(go_left, self.children_left[nodes], self.children_right[nodes])
+            done = next_nodes == nodes
+            if done.any():
+                leaves[positions[done]] = next_nodes[done]
+                descending = ~done
+                nodes, rows, positions = next_nodes[descending], rows[descending], positions[descending]
+            else:
+                nodes = next_nodes
+            if not nodes.size:
+                break
+        leaves[positions] = nodes
+        return leaves.reshape(len(self.roots), n_rows)
+
+    def predict(self, X):
+        """
+        Predict the mean of all trees for each row of X.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected input with {self.n_features_in_} features, got shape {X.shape}.")
+
+        predictions = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], PREDICT_CHUNK_SIZE):
+            chunk = X[start:start + PREDICT_CHUNK_SIZE]
+            leaves = self._leaves(chunk)
+            predictions[start:start + PREDICT_CHUNK_SIZE] = self.value[leaves].mean(axis=0, dtype=np.float64)
+        return predictions
+
+    def explain(self, X):
+        """
+        Tree-path (Saabas) attribution of predict(X).
+
+        Every step down a tree moves the node value from the parent's mean to the child's;
+        that change is credited to the feature the parent splits on. Returns the bias (mean
+        root value) per row and the contributions of shape (n_rows, n_features), so that
+        bias + contributions.sum(axis=1) equals predict(X).
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected input with {self.n_features_in_} features, got shape {X.shape}.")
+
+        n_rows, n_features = X.shape
+        bias = np.full(n_rows, self.value[self.roots].mean(dtype=np.float64))
+        contributions = np.empty((n_rows, n_features), dtype=np.float64)
+        for start in range(0, n_rows, PREDICT_CHUNK_SIZE):
+            chunk = X[start:start + PREDICT_CHUNK_SIZE]
+            contributions[start:start + PREDICT_CHUNK_SIZE] = self._path_contributions(chunk)
+        return bias, contributions / self.n_estimators
+
+    def _path_contributions(self, X):
+        """
+        Sum over all trees of the value changes along each row's path, per split feature.
+
+        Same active-set traversal as _leaves(); the value deltas of every step are
+        scattered into a flat (row, feature) accumulator with one bincount.
+        """
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        nodes = np.repeat(self.roots, n_rows)
+        rows = np.tile(np.arange(n_rows), len(self.roots))
+        totals = np.zeros(n_rows * n_features, dtype=np.float64)
+        for _ in range(self.depth):
+            split = rows * n_features + self.feature[nodes]
+            go_left = flat_X[split] <= self.threshold[nodes]
+            next_nodes = np.where(go_left, self.children_left[nodes], self.children_right[nodes])
+            descending = next_nodes != nodes
+            delta = self.value[next_nodes].astype(np.float64) - self.value[nodes]
+            totals += np.bincount(split[descending], weights=delta[descending], minlength=totals.size)
+            nodes, rows = next_nodes[descending], rows[descending]
+            if not nodes.size:
+                break
+        return totals.reshape(n_rows, n_features)
+
+
+def compact_pipeline(pipe, n_estimators: int = None, max_depth: int = None, min_node_samples: int = None):
+    """
+    Return a copy of a fitted sklearn pipeline whose final forest step is replaced by a CompactForest.
+
+    Preprocessing steps are reused as-is, so the result keeps the same predict() interface
+    and can be pickled and registered like any other model artifact.
+    """
+    name, forest = pipe.steps[-1]
+    if not isinstance(forest, (RandomForestRegressor, ExtraTreesRegressor)):
+        raise ValueError(
+            f"Final pipeline step '{name}' is a {type(forest).__name__}; only RandomForestRegressor "
+            "and ExtraTreesRegressor can be compacted."
+        )
+    if not hasattr(forest, "estimators_"):
+        raise ValueError(f"Final pipeline step '{name}' is not fitted.")
+
+    compact = CompactForest.from_forest(
+        forest, n_estimators=n_estimators, max_depth=max_depth, min_node_samples=min_node_samples
+    )
+    logger.info(
+        f"Compacted {name}: {len(forest.estimators_)} -> {compact.n_estimators} trees, "
+        f"{sum(e.tree_.node_count for e in forest.estimators_)} -> {compact.node_count} nodes, depth {compact.depth}"
+    )
+    return pipeline.Pipeline(pipe.steps[:-1] + [("compactforest", compact)])
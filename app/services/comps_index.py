@@ -0,0 +1,95 @@
+import logging
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+logger = logging.getLogger(__name__)
+
+SALES_PATH = "app/data/kc_house_data.csv"
+COMPS_COLUMNS = [
+    "id", "date", "price", "bedrooms", "bathrooms", "sqft_living", "sqft_lot", "floors",
+    "waterfront", "view", "condition", "grade", "yr_built", "yr_renovated", "zipcode", "lat", "long",
+]
+EARTH_RADIUS_KM = 6371.0
+
+
+class CompsIndex:
+    """
+    KD-tree over the locations of past sales, for nearest comparable-sales lookups.
+
+    Coordinates are projected to kilometres around the dataset's mean latitude, which is
+    accurate to well under a percent across King County.
+    """
+    def __init__(self, sales: pd.DataFrame):
+        self.sales = sales.reset_index(drop=True)
+        self.cos_lat = np.cos(np.radians(self.sales["lat"].mean()))
+        self.tree = cKDTree(self._project(self.sales["lat"].to_numpy(), self.sales["long"].to_numpy()))
+
+        # Plain arrays and records, so answering a query never touches pandas
+        self.bedrooms = self.sales["bedrooms"].to_numpy()
+        self.grade = self.sales["grade"].to_numpy()
+        self.sqft_living = self.sales["sqft_living"].to_numpy()
+        self.records = self.sales.to_dict(orient="records")
+
+    @classmethod
+    def from_csv(cls, path: str = SALES_PATH):
+        sales = pd.read_csv(path, usecols=COMPS_COLUMNS, dtype={"id": str, "zipcode": str, "date": str})
+        index = cls(sales)
+        logger.info(f"Comps index built over {len(sales)} sales from {path}")
+        return index
+
+    def _project(self, lat, long):
+        return np.column_stack([
+            EARTH_RADIUS_KM * np.radians(long) * self.cos_lat,
+            EARTH_RADIUS_KM * np.radians(lat),
+        ])
+
+    def _matches(self, idx, bedrooms=None, min_grade=None, max_grade=None, min_sqft_living=None, max_sqft_living=None):
+        mask = np.ones(len(idx), dtype=bool)
+        if bedrooms is not None:
+            mask &= self.bedrooms[idx] == bedrooms
+        if min_grade is not None:
+            mask &= self.grade[idx] >= min_grade
+        if max_grade is not None:
+            mask &= self.grade[idx] <= max_grade
+        if min_sqft_living is not None:
+            mask &= self.sqft_living[idx] >= min_sqft_living
+        if max_sqft_living is not None:
+            mask &= self.sqft_living[idx] <= max_sqft_living
+        return mask
+
+    def nearest(self, lat: float, long: float, k: int = 10, **filters):
+        """
+        Return (row indices, distances in km) of the k nearest sales that pass the filters, closest first.
+        """
+        point = self._project(np.array([lat]), np.array([long]))[0]
+        filters = {name: value for name, value in filters.items() if value is not None}
+
+        # With filters, widen the candidate set until enough sales match (or the whole index is scanned)
+        candidates = k if not filters else k * 8
+        while True:
+            candidates = min(candidates, len(self.sales))
+            distances, idx = self.tree.query(point, k=candidates)
+            distances, idx = np.atleast_1d(distances), np.atleast_1d(idx)
+            mask = self._matches(idx, **filters)
+            if mask.sum() >= k or candidates == len(self.sales):
+                break
+            candidates *= 8
+
+        return idx[mask][:k], distances[mask][:k]
+
+    def query(self, lat: float, long: float, k: int = 10, **filters) -> list:
+        """
+        Return the k nearest past sales to a location as records with their distance_km.
+        """
+        idx, distances = self.nearest(lat, long, k=k, **filters)
+        return [dict(self.records[i], distance_km=float(d)) for i, d in zip(idx, distances)]
+
+
+@lru_cache(maxsize=1)
+def get_comps_index() -> CompsIndex:
+    """
+    The comps index of this worker, built once on first use.
+    """
+    return CompsIndex.from_csv()
@@ -0,0 +1,310 @@
+import os
+import json
+import logging
+import threading
+import numpy as np
+from app.services.artifact_store import is_artifact_ref
+from app.services.model_manager import BASELINE_PROFILE_NAME, MODEL_BASE_PATH
+from app.services.worker_snapshots import read_snapshots, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Profile of the bundled model, for versions registered without one
+DEFAULT_BASELINE_PROFILE_PATH = "app/new_model/baseline_profile.json"
+DRIFT_STATS_DIR = "app/model_registry/drift_stats/"
+DRIFT_SNAPSHOT_INTERVAL = float(os.environ.get("DRIFT_SNAPSHOT_INTERVAL") or 5.0)
+# PSI is biased upwards on small samples; below this many rows a feature is reported but not flagged
+DRIFT_MIN_ROWS = int(os.environ.get("DRIFT_MIN_ROWS") or 500)
+# Population stability index thresholds
+PSI_WARNING = 0.1
+PSI_ALERT = 0.25
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+
+def baseline_profile_path(model_id: str, version: str) -> str:
+    """
+    The baseline profile saved with a model version, or the default training profile.
+
+    Versions registered before profiles were saved with them may have one next to their pickle
+    path; content-addressed artifacts have no directory to look in.
+    """
+    version_path = os.path.join(MODEL_BASE_PATH, model_id, version)
+    saved = os.path.join(version_path, BASELINE_PROFILE_NAME)
+    if os.path.exists(saved):
+        return saved
+    try:
+        with open(os.path.join(version_path, "model_path.txt"), "r") as f:
+            pickle_path = f.read().strip()
+    except FileNotFoundError:
+        return DEFAULT_BASELINE_PROFILE_PATH
+    if not is_artifact_ref(pickle_path):
+        candidate = os.path.join(os.path.dirname(pickle_path), BASELINE_PROFILE_NAME)
+        if os.path.exists(candidate):
+            return candidate
+    return DEFAULT_BASELINE_PROFILE_PATH
+
+
+class DriftSketch:
+    """
+    Fixed-memory, mergeable statistics of a model's served inputs.
+
+    Every feature gets a histogram over the cut points of its baseline profile (plus an
+    underflow and an overflow bin for values outside the training range), Welford
+    mean / variance, min, max and a missing-value count. Memory does not grow with traffic,
+    and sketches of different workers are merged by adding histograms and combining moments.
+    """
+    def __init__(self, profile: dict, features: list):
+        self.features = [feature for feature in features if feature in profile["features"]]
+        self.cuts = [np.asarray(profile["features"][feature]["cuts"], dtype=float) for feature in self.features]
+        self.lower = np.array([profile["features"][feature]["min"] for feature in self.features], dtype=float)
+        self.upper = np.array([profile["features"][feature]["max"] for feature in self.features], dtype=float)
+        n_features = len(self.features)
+        self.histograms = [np.zeros(len(cuts) + 3, dtype=np.int64) for cuts in self.cuts]
+        self.count = np.zeros(n_features, dtype=np.int64)
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.min = np.full(n_features, np.inf)
+        self.max = np.full(n_features, -np.inf)
+        self.missing = np.zeros(n_features, dtype=np.int64)
+        self.lock = threading.Lock()
+
+    def update(self, values: np.ndarray):
+        """
+        Add a batch of rows (columns in the order of self.features).
+        """
+        valid = ~np.isnan(values)
+        batch_count = valid.sum(axis=0)
+        safe_count = np.maximum(batch_count, 1)
+        batch_mean = np.where(valid, values, 0.0).sum(axis=0) / safe_count
+        batch_m2 = np.where(valid, (values - batch_mean) ** 2, 0.0).sum(axis=0)
+
+        bins = []
+        for i, cuts in enumerate(self.cuts):
+            column = values[valid[:, i], i]
+            index = np.searchsorted(cuts, column, side="right") + 1
+            index[column < self.lower[i]] = 0
+            index[column > self.upper[i]] = len(cuts) + 2
+            bins.append(np.bincount(index, minlength=len(cuts) + 3))
+
+        with self.lock:
+            self._combine(batch_count, batch_mean, batch_m2)
+            self.min = np.fmin(self.min, np.where(valid, values, np.inf).min(axis=0))
+            self.max = np.fmax(self.max, np.where(valid, values, -np.inf).max(axis=0))
+            self.missing += len(values) - batch_count
+            for histogram, counts in zip(self.histograms, bins):
+                histogram += counts
+
+    def _combine(self, count, mean, m2):
+        # Chan et al. parallel update of Welford moments; caller holds the lock
+        total = self.count + count
+        safe_total = np.maximum(total, 1)
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / safe_total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / safe_total
+        self.count = total
+
+    def merge(self, other: "DriftSketch"):
+        with self.lock:
+            self._combine(other.count, other.mean, other.m2)
+            self.min = np.fmin(self.min, other.min)
+            self.max = np.fmax(self.max, other.max)
+            self.missing += other.missing
+            for histogram, counts in zip(self.histograms, other.histograms):
+                histogram += counts
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                "features": self.features,
+                "histograms": [histogram.tolist() for histogram in self.histograms],
+                "count": self.count.tolist(),
+                "mean": self.mean.tolist(),
+                "m2": self.m2.tolist(),
+                "min": [float(value) if np.isfinite(value) else None for value in self.min],
+                "max": [float(value) if np.isfinite(value) else None for value in self.max],
+                "missing": self.missing.tolist(),
+            }
+
+    @classmethod
+    def from_dict(cls, profile: dict, values: dict) -> "DriftSketch":
+        sketch = cls(profile, values["features"])
+        if sketch.features != values["features"]:
+            raise ValueError("Drift snapshot does not match the baseline profile")
+        sketch.histograms = [np.asarray(histogram, dtype=np.int64) for histogram in values["histograms"]]
+        sketch.count = np.asarray(values["count"], dtype=np.int64)
+        sketch.mean = np.asarray(values["mean"], dtype=float)
+        sketch.m2 = np.asarray(values["m2"], dtype=float)
+        sketch.min = np.array([np.inf if value is None else value for value in values["min"]], dtype=float)
+        sketch.max = np.array([-np.inf if value is None else value for value in values["max"]], dtype=float)
+        sketch.missing = np.asarray(values["missing"], dtype=np.int64)
+        return sketch
+
+    def compare(self, profile: dict) -> dict:
+        """
+        Summary of every feature against its baseline: moments, approximate quantiles, PSI and KS distance.
+        """
+        report = {}
+        for i, feature in enumerate(self.features):
+            baseline = profile["features"][feature]
+            count = int(self.count[i])
+            stats = {"count": count, "missing": int(self.missing[i]),
+                     "baseline_mean": baseline["mean"], "baseline_std": baseline["std"]}
+            if count == 0:
+                report[feature] = dict(stats, status="no_data")
+                continue
+
+            served = self.histograms[i] / count
+            expected = np.concatenate([[0], baseline["counts"], [0]]) / baseline["count"]
+            # Smooth empty bins so the PSI stays finite
+            served_smooth = np.maximum(served, 1e-4)
+            expected_smooth = np.maximum(expected, 1e-4)
+            psi = float(((served_smooth - expected_smooth) * np.log(served_smooth / expected_smooth)).sum())
+            ks = float(np.abs(np.cumsum(served) - np.cumsum(expected)).max())
+            std = (self.m2[i] / count) ** 0.5
+
+            if count < DRIFT_MIN_ROWS:
+                status = "insufficient_data"
+            elif psi >= PSI_ALERT:
+                status = "drift"
+            elif psi >= PSI_WARNING:
+                status = "warning"
+            else:
+                status = "ok"
+
+            report[feature] = dict(
+                stats,
+                mean=float(self.mean[i]),
+                std=float(std),
+                min=float(self.min[i]),
+                max=float(self.max[i]),
+                quantiles=self._quantiles(i),
+                mean_shift=float((self.mean[i] - baseline["mean"]) / baseline["std"]) if baseline["std"] else None,
+                out_of_range=float(served[0] + served[-1]),
+                psi=psi,
+                ks=ks,
+                status=status,
+            )
+        return report
+
+    def _quantiles(self, i: int) -> dict:
+        # Linear interpolation inside the histogram bins; outer bins span the observed range
+        edges = np.concatenate([[min(self.min[i], self.lower[i])], [self.lower[i]], self.cuts[i],
+                                [self.upper[i]], [max(self.max[i], self.upper[i])]])
+        cumulative = np.concatenate([[0], np.cumsum(self.histograms[i])]) / self.count[i]
+        return {f"p{int(q * 100):02d}": float(np.interp(q, cumulative, edges)) for q in QUANTILES}
+
+
+class DriftMonitor:
+    """
+    Keeps a drift sketch per served model version, fed from the prediction path.
+
+    Each worker publishes its sketches as a snapshot every few seconds; reports merge the
+    snapshots of all workers and compare them with the baseline profile of the version.
+    """
+    def __init__(self, stats_dir: str = DRIFT_STATS_DIR, snapshot_interval: float = DRIFT_SNAPSHOT_INTERVAL):
+        self.stats_dir = stats_dir
+        self.snapshot_interval = snapshot_interval
+        self.sketches = {}
+        self.profiles = {}
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="drift-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        self.publish()
+
+    def _run(self):
+        while not self._stop.wait(self.snapshot_interval):
+            try:
+                self.publish()
+            except Exception:
+                logger.exception("Error publishing drift statistics")
+
+    def load_profile(self, path: str):
+        """
+        Load a baseline profile once per process; None when it does not exist.
+        """
+        with self.lock:
+            if path not in self.profiles:
+                try:
+                    with open(path, "r") as f:
+                        self.profiles[path] = json.load(f)
+                except FileNotFoundError:
+                    logger.warning(f"No baseline profile at {path}; input drift is not tracked for it")
+                    self.profiles[path] = None
+            return self.profiles[path]
+
+    def _sketch_for(self, model_id: str, version: str, features: list):
+        key = f"{model_id}/{version}"
+        sketch = self.sketches.get(key)
+        if sketch is None:
+            profile = self.load_profile(baseline_profile_path(model_id, version))
+            if profile is None:
+                return None
+            with self.lock:
+                sketch = self.sketches.setdefault(key, DriftSketch(profile, features))
+        return sketch
+
+    def update(self, model_id: str, version: str, model_input):
+        """
+        Called on the request path with the model input of live predictions.
+        """
+        try:
+            sketch = self._sketch_for(model_id, version, list(model_input.columns))
+            if sketch is not None and sketch.features:
+                sketch.update(model_input[sketch.features].to_numpy(dtype=float))
+        except Exception:
+            logger.exception(f"Error updating drift statistics of model {model_id} version {version}")
+
+    def publish(self):
+        with self.lock:
+            sketches = dict(self.sketches)
+        if sketches:
+            write_snapshot(self.stats_dir, {key: sketch.to_dict() for key, sketch in sketches.items()})
+
+    def report(self, model_id: str) -> dict:
+        """
+        Input drift of every version of a model, merged across all workers.
+        """
+        self.publish()
+        merged = {}
+        for snapshot in read_snapshots(self.stats_dir):
+            for key, values in snapshot.items():
+                snapshot_model_id, version = key.rsplit("/", 1)
+                if snapshot_model_id != model_id:
+                    continue
+                path = baseline_profile_path(model_id, version)
+                profile = self.load_profile(path)
+                if profile is None:
+                    continue
+                try:
+                    sketch = DriftSketch.from_dict(profile, values)
+                except ValueError:
+                    logger.warning(f"Skipping drift snapshot of {key} that does not match {path}")
+                    continue
+                if version in merged:
+                    merged[version][1].merge(sketch)
+                else:
+                    merged[version] = (path, sketch)
+
+        versions = {}
+        for version, (path, sketch) in merged.items():
+            features = sketch.compare(self.load_profile(path))
+            versions[version] = {
+                "baseline_profile": path,
+                "rows": int(sketch.count.max()) if len(sketch.count) else 0,
+                "drifted_features": sorted(name for name, stats in features.items() if stats["status"] == "drift"),
+                "features": features,
+            }
+        return {"model_id": model_id, "versions": versions}
+
+
+drift_monitor = DriftMonitor()
@@ -0,0 +1,154 @@
+import os
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app.services.compact_forest import CompactForest
+from app.services.model_memory import object_bytes
+
+logger = logging.getLogger(__name__)
+
+# Flattening a full forest takes seconds and adds about a quarter of its memory, so by default it
+# only happens once a model is first explained, on a background thread. Set to flatten at load time.
+EXPLAIN_PREPARE_ON_LOAD = os.environ.get("EXPLAIN_PREPARE_ON_LOAD", "").lower() in ("1", "true", "yes")
+# Seconds a client should wait before retrying an explanation whose arrays are being built
+EXPLAIN_RETRY_AFTER = 5
+
+# Full sklearn forests are flattened once per loaded model and explained on the compact arrays
+_flattened_forests = weakref.WeakKeyDictionary()
+_flattened_bytes = weakref.WeakKeyDictionary()
+_pending_forests = weakref.WeakKeyDictionary()
+_flatten_lock = threading.Lock()
+_flatten_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain-flatten")
+
+
+class ExplainerNotReady(RuntimeError):
+    """
+    The arrays a model is explained on are being built in the background; retry shortly.
+    """
+
+
+def _final_estimator(model):
+    steps = getattr(model, "steps", None)
+    return steps[-1][1] if steps else model
+
+
+def _is_sklearn_forest(estimator) -> bool:
+    return hasattr(estimator, "estimators_") and hasattr(estimator.estimators_[0], "tree_")
+
+
+def flattened_forest(forest) -> CompactForest:
+    """
+    The flattened arrays a full sklearn forest is explained on, built once per forest even
+    when several threads ask for them at the same time.
+    """
+    flattened = _flattened_forests.get(forest)
+    if flattened is None:
+        with _flatten_lock:
+            flattened = _flattened_forests.get(forest)
+            if flattened is None:
+                flattened = _flattened_forests[forest] = CompactForest.from_forest(forest)
+                _flattened_bytes[forest] = object_bytes(flattened)
+                logger.info(f"Flattened {type(forest).__name__} for explanations")
+    return flattened
+
+
+def _flatten_in_background(forest):
+    try:
+        flattened_forest(forest)
+    except Exception:
+        logger.exception(f"Failed to flatten {type(forest).__name__} for explanations")
+    finally:
+        with _flatten_lock:
+            _pending_forests.pop(forest, None)
+
+
+def _flattened_or_schedule(forest) -> CompactForest:
+    """
+    The flattened forest if built; otherwise start building it off the request thread and raise ExplainerNotReady.
+    """
+    flattened = _flattened_forests.get(forest)
+    if flattened is not None:
+        return flattened
+    with _flatten_lock:
+        if forest not in _flattened_forests and forest not in _pending_forests:
+            _pending_forests[forest] = _flatten_executor.submit(_flatten_in_background, forest)
+    raise ExplainerNotReady(f"Explanations for this {type(forest).__name__} are being prepared; "
+                            f"retry in {EXPLAIN_RETRY_AFTER} seconds")
+
+
+def prepare_explainer(model):
+    """
+    Build what explaining a model needs now rather than on its first explanation (see EXPLAIN_PREPARE_ON_LOAD).
+    Returns the objects built for it, or None.
+    """
+    if hasattr(model, "explain"):
+        return None
+    estimator = _final_estimator(model)
+    return flattened_forest(estimator) if _is_sklearn_forest(estimator) else None
+
+
+def explainer_bytes(model) -> int:
+    """
+    Memory of what has been built so far to explain a model: 0 until it is first explained.
+    """
+    if hasattr(model, "explain"):
+        return 0
+    try:
+        return _flattened_bytes.get(_final_estimator(model), 0)
+    except TypeError:
+        # Not weakly referenceable, so never flattened
+        return 0
+
+
+def _tree_explainer(estimator):
+    if isinstance(estimator, CompactForest):
+        return estimator.explain
+    if _is_sklearn_forest(estimator):
+        return _flattened_or_schedule(estimator).explain
+    if hasattr(estimator, "get_booster"):
+        def explain_booster(X):
+            import xgboost
+
+            # XGBoost computes the same path attribution natively; the last column is the bias
+            contributions = estimator.get_booster().predict(xgboost.DMatrix(np.asarray(X)), pred_contribs=True)
+            return contributions[:, -1].astype(np.float64), contributions[:, :-1].astype(np.float64)
+        return explain_booster
+    return None
+
+
+def explain_model(model, frame):
+    """
+    Per-feature contributions of a tree model's predictions for every row of frame.
+
+    Works on a bare tree model, on a pipeline ending in one (the preprocessing steps must map
+    features one to one, like the scalers used here) or on a model in the inference pool.
+    Returns the bias and the contributions of shape (n_rows, n_features), in frame column order.
+    Raises ValueError when the model cannot be explained, and ExplainerNotReady while the
+    arrays of a full forest are being built after its first explanation request.
+    """
+    if hasattr(model, "explain"):
+        return model.explain(frame)
+
+    steps = getattr(model, "steps", None)
+    estimator = _final_estimator(model)
+    explain = _tree_explainer(estimator)
+    if explain is None:
+        raise ValueError(f"Explanations are not supported for {type(estimator).__name__} models")
+
+    X = model[:-1].transform(frame) if steps and len(steps) > 1 else frame
+    bias, contributions = explain(X)
+    if contributions.shape[1] != frame.shape[1]:
+        raise ValueError("Preprocessing does not keep one column per feature; cannot attribute contributions")
+    return bias, contributions
+
+
+def format_explanations(features: list, bias, contributions) -> list:
+    """
+    One {"bias", "contributions"} entry per row, contributions keyed by feature.
+    """
+    return [
+        {"bias": float(row_bias), "contributions": dict(zip(features, row.tolist()))}
+        for row_bias, row in zip(bias, contributions)
+    ]
@@ -0,0 +1,356 @@
+"""Out-of-process inference workers reached by the API workers over Unix sockets.
+
+Start the pool from the repository root (run_services.py does this when INFERENCE_WORKERS > 0):
+
+    python -m app.services.inference_pool --workers 4
+"""
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import socket
+import socketserver
+import stat
+import struct
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from app.services.explain import EXPLAIN_PREPARE_ON_LOAD, ExplainerNotReady, explainer_bytes, prepare_explainer
+from app.services.model_memory import ModelMemoryError
+from app.utils.private_dir import default_private_dir, ensure_private_dir
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS") or 0)
+# Only this user may create or connect to the sockets (the directory is checked before use)
+INFERENCE_SOCKET_DIR = os.environ.get("INFERENCE_SOCKET_DIR") or default_private_dir("real-estate-inference")
+INFERENCE_MODEL_CACHE_SIZE = int(os.environ.get("INFERENCE_MODEL_CACHE_SIZE") or 8)
+# Memory the models of one inference process may take; least recently used models are evicted to stay under it
+INFERENCE_MEMORY_BUDGET_MB = float(os.environ.get("INFERENCE_MEMORY_BUDGET_MB") or 2048)
+
+# A message is a length-prefixed JSON header followed by the raw buffers of the numpy arrays
+# it refers to. Nothing received is unpickled, so a peer can send data but never code.
+_HEADER = struct.Struct("!Q")
+_PEERCRED = struct.Struct("3i")
+
+
+def socket_path(index: int, socket_dir: str = INFERENCE_SOCKET_DIR) -> str:
+    return os.path.join(socket_dir, f"inference-{index}.sock")
+
+
+def _encode(value, buffers: list):
+    if isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            return {"__objects__": _encode(value.tolist(), buffers)}
+        buffers.append(np.ascontiguousarray(value).tobytes())
+        return {"__array__": len(buffers) - 1, "dtype": value.dtype.str, "shape": list(value.shape)}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {key: _encode(item, buffers) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item, buffers) for item in value]
+    return value
+
+
+def _decode(value, buffers: list):
+    if isinstance(value, dict):
+        if "__array__" in value:
+            dtype = np.dtype(value["dtype"])
+            if dtype.hasobject:
+                raise ValueError("Object arrays are not accepted as raw buffers")
+            return np.frombuffer(buffers[value["__array__"]], dtype=dtype).reshape(value["shape"])
+        if "__objects__" in value:
+            return np.array(_decode(value["__objects__"], buffers), dtype=object)
+        return {key: _decode(item, buffers) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item, buffers) for item in value]
+    return value
+
+
+def send_message(sock, message):
+    buffers = []
+    header = json.dumps({"message": _encode(message, buffers), "buffers": [len(buffer) for buffer in buffers]}).encode()
+    sock.sendall(b"".join([_HEADER.pack(len(header)), header, *buffers]))
+
+
+def _recv_exact(sock, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise ConnectionError("Inference socket closed")
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def recv_message(sock):
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    header = json.loads(_recv_exact(sock, size))
+    buffers = [_recv_exact(sock, length) for length in header["buffers"]]
+    return _decode(header["message"], buffers)
+
+
+def check_peer(sock):
+    """
+    Refuse a peer running as another user, where the platform reports Unix socket credentials.
+    """
+    if not hasattr(socket, "SO_PEERCRED"):
+        return
+    _pid, uid, _gid = _PEERCRED.unpack(sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, _PEERCRED.size))
+    if uid != os.getuid():
+        raise PermissionError(f"Inference socket peer runs as uid {uid}, not {os.getuid()}")
+
+
+class InferenceWorker:
+    """
+    Holds models loaded once per inference process and runs predict() for the API workers.
+
+    Least recently used models are evicted when there are more than cache_size of them or their
+    estimated memory exceeds the budget. A model that does not fit in the budget on its own is
+    refused with ModelMemoryError (remembering its size, so it is not loaded again to find out), and
+    one whose stored pickle alone is larger than the budget is refused without being loaded.
+    """
+    def __init__(self, cache_size: int = INFERENCE_MODEL_CACHE_SIZE, memory_budget_mb: float = INFERENCE_MEMORY_BUDGET_MB):
+        self.cache_size = cache_size
+        self.memory_budget = int(memory_budget_mb * 1024 ** 2)
+        self.models = OrderedDict()
+        self.sizes = {}
+        self.lock = threading.Lock()
+
+    def memory_bytes(self) -> int:
+        """
+        Estimated memory of the models held, with the explanation arrays built for them so far. Caller holds the lock.
+        """
+        return sum(self.sizes[key] + explainer_bytes(model) for key, model in self.models.items())
+
+    def _refuse(self, model_id: str, version: str) -> ModelMemoryError:
+        return ModelMemoryError(f"Model {model_id} version {version} ({self.sizes[model_id, version] / 1024 ** 2:.1f} MB) "
+                                f"does not fit in the {self.memory_budget / 1024 ** 2:.0f} MB budget of an inference worker")
+
+    def get_model(self, model_id: str, version: str):
+        from app.services.model_manager import load_model_artifacts, stored_model_bytes
+        from app.services.model_memory import model_bytes
+        from app.services.thread_budget import thread_budget
+
+        key = (model_id, version)
+        with self.lock:
+            if key in self.models:
+                self.models.move_to_end(key)
+                return self.models[key]
+            # Before the first load the pickle's size stands in for the model's: refuse without unpickling it
+            if key not in self.sizes:
+                self.sizes[key] = stored_model_bytes(model_id, version) or 0
+            if self.sizes[key] > self.memory_budget:
+                raise self._refuse(model_id, version)
+            model, _features = load_model_artifacts(model_id, version)
+            thread_budget.apply_to_model(model)
+            if EXPLAIN_PREPARE_ON_LOAD:
+                prepare_explainer(model)
+            self.sizes[key] = model_bytes(model)
+            if self.sizes[key] + explainer_bytes(model) > self.memory_budget:
+                raise self._refuse(model_id, version)
+            self.models[key] = model
+            while len(self.models) > self.cache_size or self.memory_bytes() > self.memory_budget:
+                evicted, _ = self.models.popitem(last=False)
+                logger.info(f"Evicted model {evicted} ({self.sizes[evicted] / 1024 ** 2:.1f} MB) "
+                            f"from inference worker {os.getpid()}")
+            logger.info(f"Loaded model {model_id} version {version} ({self.sizes[key] / 1024 ** 2:.1f} MB) "
+                        f"in inference worker {os.getpid()}")
+            return model
+
+    def handle(self, message: dict):
+        import pandas as pd
+
+        op = message["op"]
+        if op == "ping":
+            return os.getpid()
+        model = self.get_model(message["model_id"], message["version"])
+        if op == "load":
+            return True
+        frame = pd.DataFrame(message["values"], columns=message["columns"])
+        if op == "predict":
+            return model.predict(frame)
+        if op == "explain":
+            from app.services.explain import explain_model
+
+            return explain_model(model, frame)
+        raise ValueError(f"Unknown inference op: {op}")
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            check_peer(self.request)
+        except PermissionError as e:
+            logger.warning(str(e))
+            return
+        while True:
+            try:
+                message = recv_message(self.request)
+            except ConnectionError:
+                return
+            try:
+                response = {"ok": True, "result": self.server.worker.handle(message)}
+            except (ModelMemoryError, ExplainerNotReady, ValueError) as e:
+                # Raised again as the same type by the client, so routes answer them as they would locally
+                logger.warning(str(e))
+                response = {"ok": False, "error": str(e), "type": type(e).__name__}
+            except Exception as e:
+                logger.exception("Error in inference worker")
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            send_message(self.request, response)
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, worker: InferenceWorker):
+        # A socket left by a previous run is replaced; anything else at the path is not ours to delete
+        if os.path.lexists(path):
+            if not stat.S_ISSOCK(os.lstat(path).st_mode):
+                raise FileExistsError(f"{path} exists and is not a socket")
+            os.unlink(path)
+        super().__init__(path, _RequestHandler)
+        self.worker = worker
+
+
+def serve(index: int, socket_dir: str = INFERENCE_SOCKET_DIR):
+    """
+    Entry point of one inference process.
+    """
+    from app.services.thread_budget import thread_budget
+    from app.utils.logger import configure_logging
+
+    configure_logging()
+    thread_budget.apply_to_process()
+    ensure_private_dir(socket_dir)
+    path = socket_path(index, socket_dir)
+    with InferenceServer(path, InferenceWorker()) as server:
+        logger.info(f"Inference worker {index} (pid {os.getpid()}) listening on {path}")
+        server.serve_forever()
+
+
+class InferencePoolClient:
+    """
+    Used by the API workers: round-robins requests over the inference sockets and keeps
+    idle connections open per socket so each request skips the connect.
+    """
+    def __init__(self, socket_paths: list, timeout: float = 30.0):
+        self.socket_paths = socket_paths
+        self.timeout = timeout
+        self.idle = {path: queue.LifoQueue() for path in socket_paths}
+        self.counter = itertools.count()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Client for the configured pool, or None when models run inside the API workers.
+        """
+        if not INFERENCE_WORKERS:
+            return None
+        return cls([socket_path(i) for i in range(INFERENCE_WORKERS)])
+
+    def _connect(self, path: str):
+        try:
+            return self.idle[path].get_nowait()
+        except queue.Empty:
+            ensure_private_dir(os.path.dirname(path), create=False)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(path)
+                check_peer(sock)
+            except Exception:
+                sock.close()
+                raise
+            return sock
+
+    def _send(self, path: str, message: dict):
+        sock = self._connect(path)
+        try:
+            send_message(sock, message)
+            response = recv_message(sock)
+        except Exception:
+            sock.close()
+            raise
+        self.idle[path].put(sock)
+        if not response["ok"]:
+            if response.get("type") == "ModelMemoryError":
+                raise ModelMemoryError(response["error"])
+            if response.get("type") == "ExplainerNotReady":
+                raise ExplainerNotReady(response["error"])
+            if response.get("type") == "ValueError":
+                raise ValueError(response["error"])
+            raise RuntimeError(f"Inference worker error: {response['error']}")
+        return response["result"]
+
+    def request(self, message: dict):
+        """
+        Send a message to the next inference worker, retrying once on another worker if it is unreachable.
+        """
+        start = next(self.counter)
+        for attempt in range(min(2, len(self.socket_paths))):
+            path = self.socket_paths[(start + attempt) % len(self.socket_paths)]
+            try:
+                return self._send(path, message)
+            except (ConnectionError, FileNotFoundError, socket.timeout) as e:
+                logger.warning(f"Inference worker at {path} unavailable: {e}")
+                error = e
+        raise error
+
+    def broadcast(self, message: dict) -> list:
+        return [self._send(path, message) for path in self.socket_paths]
+
+    def predict(self, model_id: str, version: str, frame, op: str = "predict"):
+        return self.request({
+            "op": op, "model_id": model_id, "version": version,
+            "columns": list(frame.columns), "values": frame.to_numpy(),
+        })
+
+
+class RemoteModel:
+    """
+    Stand-in for a loaded model whose predict() runs in the inference pool.
+    """
+    def __init__(self, client: InferencePoolClient, model_id: str, version: str):
+        self.client = client
+        self.model_id = model_id
+        self.version = version
+
+    def load(self):
+        """
+        Load the model on every inference worker ahead of the first prediction.
+        """
+        self.client.broadcast({"op": "load", "model_id": self.model_id, "version": self.version})
+
+    def predict(self, frame):
+        return self.client.predict(self.model_id, self.version, frame)
+
+    def explain(self, frame):
+        return self.client.predict(self.model_id, self.version, frame, op="explain")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the local inference worker pool.")
+    parser.add_argument("--workers", type=int, default=INFERENCE_WORKERS or 1)
+    parser.add_argument("--socket-dir", default=INFERENCE_SOCKET_DIR)
+    args = parser.parse_args()
+
+    processes = [
+        multiprocessing.Process(target=serve, args=(index, args.socket_dir), daemon=True)
+        for index in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+"""Local background jobs (model training, bulk scoring) backed by a SQLite queue.
+
+The API only inserts and reads job rows; worker processes claim queued jobs and run them.
+Start the workers from the repository root (run_services.py does this when JOB_WORKERS > 0):
+
+    python -m app.services.jobs --workers 1
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = os.environ.get("JOBS_DB_PATH", "app/model_registry/jobs.sqlite3")
+JOBS_OUTPUT_DIR = os.environ.get("JOBS_OUTPUT_DIR", "app/model_registry/jobs/")
+# Bulk scoring only reads input files from under this directory
+JOBS_INPUT_DIR = os.environ.get("JOBS_INPUT_DIR", "app/model_registry/job_inputs/")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS") or 1)
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL") or 1.0)
+# How often a worker looks for running jobs whose worker process has died
+JOB_RECOVER_INTERVAL = float(os.environ.get("JOB_RECOVER_INTERVAL") or 30.0)
+# A worker running a job refreshes its heartbeat this often; a job whose heartbeat is older than the
+# timeout is failed even if a process with its worker's PID exists (PIDs are reused)
+JOB_HEARTBEAT_INTERVAL = float(os.environ.get("JOB_HEARTBEAT_INTERVAL") or 10.0)
+JOB_HEARTBEAT_TIMEOUT = float(os.environ.get("JOB_HEARTBEAT_TIMEOUT") or 6 * JOB_HEARTBEAT_INTERVAL)
+BATCH_SCORE_CHUNK_ROWS = int(os.environ.get("BATCH_SCORE_CHUNK_ROWS") or 10000)
+# Ensembles are grown this many estimators at a time, so training reports progress and can be cancelled
+TRAIN_ESTIMATORS_PER_STEP = 20
+
+BASE_DIR = pathlib.Path(__file__).parent.parent
+SALES_PATH = BASE_DIR / "data" / "kc_house_data.csv"
+DEMOGRAPHICS_PATH = BASE_DIR / "data" / "zipcode_demographics.csv"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker_pid INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def resolve_input_path(path: str, input_dir: str = JOBS_INPUT_DIR) -> str:
+    """
+    Absolute path of a bulk scoring input, given relative to (or inside) input_dir.
+
+    Raises ValueError for a path outside input_dir (symlinks and ".." resolved) and
+    FileNotFoundError for a missing file.
+    """
+    root = os.path.realpath(input_dir)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"Input files must be under the job input directory {input_dir}")
+    if not os.path.isfile(resolved):
+        raise FileNotFoundError(f"Input file not found in the job input directory: {path}")
+    return resolved
+
+
+class JobQueue:
+    """
+    Job rows in a SQLite database shared by the API workers and the job workers.
+    """
+    def __init__(self, db_path: str = JOBS_DB_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+            columns = {row["name"] for row in connection.execute("PRAGMA table_info(jobs)")}
+            if "heartbeat_at" not in columns:
+                connection.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+
+    @contextmanager
+    def _connect(self):
+        # Autocommit connections; claim() opens its own write transaction
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _to_dict(row) -> dict:
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def submit(self, job_type: str, params: dict) -> dict:
+        job_id = uuid.uuid4().hex
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, type, params, status, message, created_at) VALUES (?, ?, ?, 'queued', 'Queued', ?)",
+                (job_id, job_type, json.dumps(params), time.time()),
+            )
+        logger.info(f"Submitted {job_type} job {job_id}")
+        return self.get(job_id)
+
+    def get(self, job_id: str):
+        with self._connect() as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, status: str = None, offset: int = 0, limit: int = 50):
+        """
+        Most recent jobs first, with the total number of matching jobs.
+        """
+        where, args = ("WHERE status = ?", (status,)) if status else ("", ())
+        with self._connect() as connection:
+            total = connection.execute(f"SELECT COUNT(*) FROM jobs {where}", args).fetchone()[0]
+            rows = connection.execute(
+                f"SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT ? OFFSET ?", args + (limit, offset)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows], total
+
+    def cancel(self, job_id: str):
+        """
+        Cancel a queued job immediately; a running job is asked to stop at its next progress report.
+        """
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = 'cancelled', message = 'Cancelled before start', finished_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+            connection.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        return self.get(job_id)
+
+    def claim(self):
+        """
+        Atomically move the oldest queued job to running for this process.
+        """
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            now = time.time()
+            connection.execute(
+                "UPDATE jobs SET status = 'running', message = 'Started', worker_pid = ?, started_at = ?, heartbeat_at = ? "
+                "WHERE id = ?",
+                (os.getpid(), now, now, row["id"]),
+            )
+            connection.execute("COMMIT")
+        return self.get(row["id"])
+
+    def report(self, job_id: str, progress: float, message: str) -> bool:
+        """
+        Record progress; returns True when cancellation was requested.
+        """
+        with self._connect() as connection:
+            connection.execute("UPDATE jobs SET progress = ?, message = ? WHERE id = ?", (progress, message, job_id))
+            row = connection.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def heartbeat(self, job_id: str):
+        with self._connect() as connection:
+            connection.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'", (time.time(), job_id))
+
+    def finish(self, job_id: str, status: str, message: str, result: dict = None, error: str = None):
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, message = ?, result = ?, error = ?, finished_at = ?, "
+                "progress = CASE WHEN ? = 'succeeded' THEN 1 ELSE progress END WHERE id = ?",
+                (status, message, json.dumps(result) if result is not None else None, error, time.time(), status, job_id),
+            )
+
+    def recover(self):
+        """
+        Fail running jobs whose worker process no longer exists (e.g. after a crash or restart).
+
+        A worker is taken for gone when its PID does not exist or belongs to another user's process,
+        or when it has not refreshed its heartbeat in time: its PID may have been reused.
+        """
+        with self._connect() as connection:
+            rows = connection.execute("SELECT id, worker_pid, heartbeat_at FROM jobs WHERE status = 'running'").fetchall()
+        now = time.time()
+        for row in rows:
+            if row["heartbeat_at"] is not None and now - row["heartbeat_at"] > JOB_HEARTBEAT_TIMEOUT:
+                reason = f"has not reported for {now - row['heartbeat_at']:.0f} s"
+            else:
+                try:
+                    os.kill(row["worker_pid"], 0)
+                    continue
+                except (ProcessLookupError, PermissionError, TypeError):
+                    reason = "is gone"
+            self.finish(row["id"], "failed", "Worker exited", error="The job worker exited while running this job")
+            logger.warning(f"Marked job {row['id']} as failed: its worker {row['worker_pid']} {reason}")
+
+
+def run_train_job(job: dict, progress) -> dict:
+    """
+    Train a model on kc_house_data, evaluate it on a hold-out split and register it.
+    """
+    import pickle
+    from sklearn import model_selection, pipeline, preprocessing
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+    from app.create_new_model import ALL_FEATURES, SALES_COLUMN_SELECTION, build_baseline_profile, load_data, make_model
+    from app.services.artifact_store import artifact_store
+    from app.services.model_manager import ModelRegistry
+    from app.services.model_server import MODEL_REGISTRY_PATH
+    from app.services.thread_budget import thread_budget
+
+    params = job["params"]
+    progress(0.02, "Loading training data")
+    feature_set = ALL_FEATURES if params["feature_set"] == "all_features" else SALES_COLUMN_SELECTION
+    x, y = load_data(SALES_PATH, feature_set, demographics_path=DEMOGRAPHICS_PATH)
+    x_train, x_test, y_train, y_test = model_selection.train_test_split(x, y, random_state=42)
+
+    model_obj = make_model(params["model_type"])
+    if params.get("n_estimators"):
+        model_obj.set_params(n_estimators=params["n_estimators"])
+    pipe = pipeline.make_pipeline(preprocessing.RobustScaler(), model_obj)
+    thread_budget.apply_to_model(pipe, thread_budget.job_threads)
+
+    if "warm_start" in model_obj.get_params():
+        # Grow the ensemble in steps so that progress is visible and cancellation is honoured
+        total = model_obj.n_estimators
+        trained = 0
+        model_obj.set_params(warm_start=True)
+        while trained < total:
+            trained = min(trained + TRAIN_ESTIMATORS_PER_STEP, total)
+            model_obj.set_params(n_estimators=trained)
+            pipe.fit(x_train, y_train)
+            progress(0.05 + 0.8 * trained / total, f"Trained {trained}/{total} estimators")
+        model_obj.set_params(warm_start=False)
+    else:
+        progress(0.05, f"Training {params['model_type']}")
+        pipe.fit(x_train, y_train)
+
+    progress(0.88, "Evaluating on the test split")
+    y_pred = pipe.predict(x_test)
+    metrics = {
+        "MAE": float(mean_absolute_error(y_test, y_pred)),
+        "MSE": float(mean_squared_error(y_test, y_pred)),
+        "R2": float(r2_score(y_test, y_pred)),
+    }
+
+    progress(0.93, "Saving and registering the model")
+    output_dir = pathlib.Path(JOBS_OUTPUT_DIR) / job["id"]
+    output_dir.mkdir(parents=True, exist_ok=True)
+    pickle_path = output_dir / "model.pkl"
+    with open(pickle_path, "wb") as f:
+        pickle.dump(pipe, f)
+    features = list(x_train.columns)
+    with open(output_dir / "model_features.json", "w") as f:
+        json.dump(features, f)
+    baseline_profile = build_baseline_profile(x_train)
+    with open(output_dir / "baseline_profile.json", "w") as f:
+        json.dump(baseline_profile, f)
+    with open(output_dir / "metrics.json", "w") as f:
+        json.dump(metrics, f)
+
+    registry = ModelRegistry(MODEL_REGISTRY_PATH)
+    model = registry.register(params["model_id"], params["model_name"], features, params["author"],
+                              artifact_store.put(str(pickle_path)), promoted=not params.get("candidate", False),
+                              baseline_profile=baseline_profile)
+    return {"model_id": params["model_id"], "version": model.version, "pickle_path": model.pickle_path,
+            "candidate": params.get("candidate", False), "metrics": metrics}
+
+
+def run_batch_score_job(job: dict, progress) -> dict:
+    """
+    Score a CSV of listings in chunks with a registered model and write the predictions next to the inputs.
+    """
+    import pandas as pd
+    from app.services.model_manager import ModelRegistry, load_model_artifacts
+    from app.services.model_server import MODEL_REGISTRY_PATH
+    from app.services.thread_budget import thread_budget
+    from app.utils.helpers import load_demographics, select_features
+
+    params = job["params"]
+    version = params.get("version")
+    if not version:
+        latest = ModelRegistry(MODEL_REGISTRY_PATH).get_latest_version(params["model_id"])
+        if not latest:
+            raise ValueError(f"No model found with ID: {params['model_id']}")
+        version = latest["version"]
+    progress(0.0, f"Loading model {params['model_id']} version {version}")
+    model, features = load_model_artifacts(params["model_id"], version)
+    thread_budget.apply_to_model(model, thread_budget.job_threads)
+    demographics = load_demographics()
+
+    # Checked again here: the job row is the only input this worker trusts
+    input_path = resolve_input_path(params["input_path"])
+    with open(input_path, "rb") as f:
+        total_rows = max(sum(1 for _ in f) - 1, 1)
+
+    output_dir = pathlib.Path(JOBS_OUTPUT_DIR) / job["id"]
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = output_dir / "predictions.csv"
+    scored = skipped = 0
+    for index, chunk in enumerate(pd.read_csv(input_path, dtype={"zipcode": str}, chunksize=BATCH_SCORE_CHUNK_ROWS)):
+        # Rows without demographic data are written without a prediction instead of failing the job
+        known = chunk["zipcode"].isin(demographics.index)
+        chunk["prediction"] = float("nan")
+        if known.any():
+            joined = chunk[known].join(demographics, on="zipcode")
+            chunk.loc[known, "prediction"] = model.predict(select_features(joined, features))
+        chunk.to_csv(output_path, mode="w" if index == 0 else "a", header=index == 0, index=False)
+        scored += int(known.sum())
+        skipped += int((~known).sum())
+        progress(min((scored + skipped) / total_rows, 0.99), f"Scored {scored + skipped}/{total_rows} rows")
+
+    return {"model_id": params["model_id"], "version": version, "output_path": str(output_path),
+            "scored_rows": scored, "skipped_rows": skipped}
+
+
+JOB_HANDLERS = {
+    "train": run_train_job,
+    "batch_score": run_batch_score_job,
+}
+
+
+def run_job(queue: JobQueue, job: dict):
+    def progress(fraction: float, message: str):
+        if queue.report(job["id"], fraction, message):
+            raise JobCancelled()
+
+    def beat():
+        while not stopped.wait(JOB_HEARTBEAT_INTERVAL):
+            try:
+                queue.heartbeat(job["id"])
+            except Exception:
+                logger.exception(f"Error refreshing the heartbeat of job {job['id']}")
+
+    # Beats from a thread, as a training step can run longer than the heartbeat timeout between progress reports
+    stopped = threading.Event()
+    heartbeat = threading.Thread(target=beat, name="job-heartbeat", daemon=True)
+    heartbeat.start()
+    logger.info(f"Running {job['type']} job {job['id']}")
+    try:
+        result = JOB_HANDLERS[job["type"]](job, progress)
+    except JobCancelled:
+        queue.finish(job["id"], "cancelled", "Cancelled")
+        logger.info(f"Cancelled job {job['id']}")
+    except Exception as e:
+        logger.exception(f"Job {job['id']} failed")
+        queue.finish(job["id"], "failed", "Failed", error=f"{type(e).__name__}: {e}")
+    else:
+        queue.finish(job["id"], "succeeded", "Done", result=result)
+        logger.info(f"Finished job {job['id']}")
+    finally:
+        stopped.set()
+        heartbeat.join()
+
+
+def work(db_path: str = JOBS_DB_PATH, poll_interval: float = JOB_POLL_INTERVAL):
+    """
+    Entry point of one job worker process: claim and run queued jobs forever.
+
+    Every worker also fails, now and then, the running jobs of workers that died, so a
+    crashed worker's job does not stay "running" while the other workers carry on.
+    """
+    from app.services.thread_budget import thread_budget
+    from app.utils.logger import configure_logging
+
+    configure_logging()
+    thread_budget.apply_to_process(thread_budget.job_threads)
+    queue = JobQueue(db_path)
+    last_recover = 0.0
+    logger.info(f"Job worker {os.getpid()} polling {db_path}")
+    while True:
+        if time.monotonic() - last_recover >= JOB_RECOVER_INTERVAL:
+            queue.recover()
+            last_recover = time.monotonic()
+        job = queue.claim()
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        run_job(queue, job)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the background job workers.")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS)
+    parser.add_argument("--db", default=JOBS_DB_PATH)
+    args = parser.parse_args()
+
+    processes = [multiprocessing.Process(target=work, args=(args.db,), daemon=True) for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
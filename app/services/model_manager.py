@@ -1,26 +1,55 @@
+import io
 import os
 import json
+import fcntl
+import hashlib
+import pickle
 import logging
+import threading
+from contextlib import contextmanager
 import pandas as pd
 import logging
+from app.services.artifact_store import artifact_store, is_artifact_ref
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
 MODEL_BASE_PATH = "app/model_registry/models/"
+# Training-data profile a version's served inputs are compared with for drift, saved in its version folder
+BASELINE_PROFILE_NAME = "baseline_profile.json"
+
+@contextmanager
+def atomic_write(path: str):
+    """
+    Write a file through a temporary file and rename it into place,
+    so concurrent readers never see a partially written file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def version_number(version: str) -> int:
+    return int(version[1:]) if version.startswith("v") else -1
 
 class Model:
     """
     Represents a model with its metadata and file storage.
     """
-    def __init__(self, model_id: str, model_name: str, version: str, features: list, author: str, pickle_path: str):
+    def __init__(self, model_id: str, model_name: str, version: str, features: list, author: str, pickle_path: str,
+                 baseline_profile: dict = None):
         self.model_id = model_id
         self.model_name = model_name
         self.version = version
         self.features = features
         self.author = author
         self.pickle_path = pickle_path
+        self.baseline_profile = baseline_profile
 
     def save(self):
         """
@@ -31,16 +60,56 @@ class Model:
 
         # Save the pickle path as a reference
         pickle_path_file = os.path.join(version_path, "model_path.txt")
-        with open(pickle_path_file, "w") as f:
+        with atomic_write(pickle_path_file) as f:
             f.write(self.pickle_path)
         logger.info(f"Model pickle path saved at {pickle_path_file}")
 
         # Save the features as JSON
         features_path = os.path.join(version_path, "model_features.json")
-        with open(features_path, "w") as f:
+        with atomic_write(features_path) as f:
             json.dump(self.features, f)
         logger.info(f"Model features saved at {features_path}")
 
+        if self.baseline_profile is not None:
+            profile_path = os.path.join(version_path, BASELINE_PROFILE_NAME)
+            with atomic_write(profile_path) as f:
+                json.dump(self.baseline_profile, f)
+            logger.info(f"Baseline profile saved at {profile_path}")
+
+
+class RegistryIndex:
+    """
+    In-memory view of one state of the registry file.
+
+    The index carries validators for conditional reads: a hash of the whole file, and per model
+    a hash of its entries, so a model's tag only changes when one of its entries does. Being
+    derived from content, they never match a different state of the registry.
+
+    A version registered as a candidate is not served until it is promoted, which
+    appends its entry again marked as promoted; the last entry of a version wins.
+    The latest version of a model is its highest promoted one.
+    """
+    def __init__(self, entries: list, mtime: float, stat_key: tuple = None, digest: str = ""):
+        self.entries = entries
+        self.mtime = mtime
+        self.stat_key = stat_key
+        self.etag = digest
+        versions = {}
+        model_entries = {}
+        for entry in entries:
+            # Re-assigning a version keeps its original position: versions stay in registration order
+            versions.setdefault(entry["model_id"], {})[entry["version"]] = entry
+            model_entries.setdefault(entry["model_id"], []).append(entry)
+        self.model_etags = {
+            model_id: hashlib.sha256(json.dumps(entries_of_model, sort_keys=True).encode()).hexdigest()[:32]
+            for model_id, entries_of_model in model_entries.items()
+        }
+        self.models = {model_id: list(model_versions.values()) for model_id, model_versions in versions.items()}
+        self.latest = {}
+        for model_id, model_versions in self.models.items():
+            promoted = [entry for entry in model_versions if entry["promoted"]]
+            if promoted:
+                self.latest[model_id] = max(promoted, key=lambda entry: version_number(entry["version"]))
 
 
 class ModelRegistry:
@@ -49,16 +118,72 @@ class ModelRegistry:
     """
     def __init__(self, registry_path: str):
         self.registry_path = registry_path
+        self._index = None
+        self._held = threading.local()
+
+        os.makedirs(os.path.dirname(self.registry_path) or ".", exist_ok=True)
+        with self.lock():
+            # Check if the registry file exists; if not, create it
+            if not os.path.exists(self.registry_path):
+                logger.info(f"Registry file not found at {self.registry_path}. Creating a new one.")
+                # Create an empty DataFrame with the required columns
+                columns = ["model_id", "model_name", "version", "features", "author", "pickle_path", "promoted"]
+                empty_registry = pd.DataFrame(columns=columns)
+                with atomic_write(self.registry_path) as f:
+                    empty_registry.to_csv(f, index=False)
+                logger.info(f"Created new registry file at {self.registry_path}.")
+
+    @contextmanager
+    def lock(self):
+        """
+        Hold the registry exclusively, across threads and processes (API workers, job workers, scripts).
+
+        Writers read the file, choose a version and write it back under this lock, so no update is
+        lost and no two writers pick the same version. Reentrant within a thread.
+        """
+        if getattr(self._held, "depth", 0):
+            self._held.depth += 1
+            try:
+                yield
+            finally:
+                self._held.depth -= 1
+            return
+        with open(f"{self.registry_path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._held.depth = 1
+            try:
+                yield
+            finally:
+                self._held.depth = 0
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def index(self) -> RegistryIndex:
+        """
+        The registry as an in-memory index, re-read only when the file has changed.
+        """
+        stat = os.stat(self.registry_path)
+        stat_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        index = self._index
+        if index is None or index.stat_key != stat_key:
+            # Parse the same bytes that are hashed, in case the file is replaced in between
+            with open(self.registry_path, "rb") as f:
+                content = f.read()
+            registry = pd.read_csv(io.BytesIO(content), dtype=str, keep_default_na=False)
+            # Entries registered before candidates existed have no promoted value and were all served
+            entries = [
+                dict(entry, features=json.loads(entry["features"]), promoted=entry.get("promoted", "") != "false")
+                for entry in registry.to_dict(orient="records")
+            ]
+            digest = hashlib.sha256(content).hexdigest()[:32]
+            index = self._index = RegistryIndex(entries, stat.st_mtime, stat_key, digest)
+        return index
 
     def get_next_version(self, model_id: str) -> str:
         """
         Get the next version for a given model ID.
         """
-        registry = pd.read_csv(self.registry_path)
-        print(registry)
-        model_versions = registry[registry["model_id"] == model_id]["version"]
-        print(model_versions)
-        if model_versions.empty:
+        model_versions = [entry["version"] for entry in self.index().models.get(model_id, [])]
+        if not model_versions:
             # If no versions exist for this model ID, start with v1
             return "v1"
 
@@ -68,9 +193,9 @@ class ModelRegistry:
         next_version = f"v{latest_version + 1}"
         return next_version
 
-    def add_entry(self, model: Model):
+    def add_entry(self, model: Model, promoted: bool = True):
         """
-        Add a new entry to the model registry.
+        Add a new entry to the model registry. A candidate entry (promoted=False) is not served until promote().
         """
         new_entry = {
             "model_id": model.model_id,
@@ -79,94 +204,140 @@ class ModelRegistry:
             "features": json.dumps(model.features),
             "author": model.author,
             "pickle_path": model.pickle_path,
+            "promoted": "true" if promoted else "false",
         }
-        registry = pd.read_csv(self.registry_path)
-        registry = pd.concat([registry, pd.DataFrame([new_entry])], ignore_index=True)
-        registry.to_csv(self.registry_path, index=False)
-        logger.info(f"Model {model.model_name} version {model.version} added to registry.")
+        with self.lock():
+            registry = pd.read_csv(self.registry_path, dtype=str, keep_default_na=False)
+            registry = pd.concat([registry, pd.DataFrame([new_entry])], ignore_index=True)
+            with atomic_write(self.registry_path) as f:
+                registry.to_csv(f, index=False)
+        state = "added to registry" if promoted else "added to registry as a candidate"
+        logger.info(f"Model {model.model_name} version {model.version} {state}.")
 
-    def get_latest_version(self, model_id: str):
+    def register(self, model_id: str, model_name: str, features: list, author: str, pickle_path: str,
+                 promoted: bool = True, baseline_profile: dict = None) -> Model:
         """
-        Get the latest version of a given model name.
-        """
-        registry = pd.read_csv(self.registry_path)
-        model_versions = registry[registry["model_id"] == model_id]
-        if model_versions.empty:
-            return None
-        latest_version = model_versions.iloc[-1]
-        return {
-            "model_id": latest_version["model_id"],
-            "model_name": latest_version["model_name"],
-            "version": latest_version["version"],
-            "features": json.loads(latest_version["features"]),
-            "author": latest_version["author"],
-            "pickle_path": latest_version["pickle_path"],
-        }
-    
+        Save and register a model as the next version of model_id, in one step under the registry lock.
+        """
+        with self.lock():
+            model = Model(model_id=model_id, model_name=model_name, version=self.get_next_version(model_id),
+                          features=features, author=author, pickle_path=pickle_path, baseline_profile=baseline_profile)
+            model.save()
+            self.add_entry(model, promoted=promoted)
+        return model
 
-class ModelRegistry:
-    """
-    Manages the model registry, including metadata and versioning.
-    """
-    def __init__(self, registry_path: str):
-        self.registry_path = registry_path
+    def promote(self, model_id: str, version: str) -> bool:
+        """
+        Promote a candidate version so that it becomes the latest (served) version.
 
-        # Check if the registry file exists; if not, create it
-        if not os.path.exists(self.registry_path):
-            logger.info(f"Registry file not found at {self.registry_path}. Creating a new one.")
-            # Create an empty DataFrame with the required columns
-            columns = ["model_id", "model_name", "version", "features", "author", "pickle_path"]
-            empty_registry = pd.DataFrame(columns=columns)
-            empty_registry.to_csv(self.registry_path, index=False)
-            logger.info(f"Created new registry file at {self.registry_path}.")
+        Returns False if the version was already promoted. Raises LookupError for an unknown
+        version and ValueError for a candidate older than the latest version.
+        """
+        with self.lock():
+            entry = self.get_version(model_id, version)
+            if entry is None:
+                raise LookupError(f"No model found with ID: {model_id} and version: {version}")
+            if entry["promoted"]:
+                return False
+            latest = self.get_latest_version(model_id)
+            if latest and version_number(latest["version"]) > version_number(version):
+                raise ValueError(f"Version {version} is older than the latest version {latest['version']} of model {model_id}")
+            # Only the registry entry is appended again; the version folder (and its profile) stays as saved
+            model = Model(model_id=model_id, model_name=entry["model_name"], version=version, features=entry["features"],
+                          author=entry["author"], pickle_path=entry["pickle_path"])
+            self.add_entry(model, promoted=True)
+        return True
 
-    def get_next_version(self, model_id: str) -> str:
+    def get_latest_versions(self) -> dict:
         """
-        Get the next version for a given model ID.
+        Get the latest promoted version of every registered model id.
         """
-        registry = pd.read_csv(self.registry_path)
-        model_versions = registry[registry["model_id"] == model_id]["version"]
-        if model_versions.empty:
-            # If no versions exist for this model ID, start with v1
-            return "v1"
-
-        # Extract the numeric part of the version and find the maximum
-        numeric_versions = [int(v[1:]) for v in model_versions if v.startswith("v")]
-        latest_version = max(numeric_versions)
-        next_version = f"v{latest_version + 1}"
-        return next_version
+        return {model_id: entry["version"] for model_id, entry in self.index().latest.items()}
 
-    def add_entry(self, model: Model):
+    def get_latest_version(self, model_id: str):
         """
-        Add a new entry to the model registry.
+        Get the latest promoted version of a given model name.
         """
-        new_entry = {
-            "model_id": model.model_id,
-            "model_name": model.model_name,
-            "version": model.version,
-            "features": json.dumps(model.features),
-            "author": model.author,
-            "pickle_path": model.pickle_path,
-        }
-        registry = pd.read_csv(self.registry_path)
-        registry = pd.concat([registry, pd.DataFrame([new_entry])], ignore_index=True)
-        registry.to_csv(self.registry_path, index=False)
-        logger.info(f"Model {model.model_name} version {model.version} added to registry.")
+        latest = self.index().latest.get(model_id)
+        return dict(latest) if latest else None
 
-    def get_latest_version(self, model_id: str):
+    def get_version(self, model_id: str, version: str):
         """
-        Get the latest version of a given model name.
-        """
-        registry = pd.read_csv(self.registry_path)
-        model_versions = registry[registry["model_id"] == model_id]
-        if model_versions.empty:
-            return None
-        latest_version = model_versions.iloc[-1]
-        return {
-            "model_id": latest_version["model_id"],
-            "model_name": latest_version["model_name"],
-            "version": latest_version["version"],
-            "features": json.loads(latest_version["features"]),
-            "author": latest_version["author"],
-            "pickle_path": latest_version["pickle_path"],
-        }
\ No newline at end of file
+        Get the registry entry of a specific model version.
+        """
+        for entry in self.index().models.get(model_id, []):
+            if entry["version"] == version:
+                return dict(entry)
+        return None
+
+
+def read_baseline_profile(pickle_path: str):
+    """
+    The baseline profile written next to a local model file (as create_new_model.py does), or None.
+    """
+    if is_artifact_ref(pickle_path):
+        return None
+    try:
+        with open(os.path.join(os.path.dirname(pickle_path), BASELINE_PROFILE_NAME), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load_model_features(model_id: str, version: str) -> list:
+    """
+    Load the feature list registered for a model version.
+    """
+    features_path = os.path.join(MODEL_BASE_PATH, model_id, version, "model_features.json")
+    try:
+        with open(features_path, "r") as features_file:
+            return json.load(features_file)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Features file not found at path: {features_path}")
+
+
+def registered_pickle_path(model_id: str, version: str) -> str:
+    """
+    The pickle path (or artifact reference) saved for a model version.
+    """
+    path_file = os.path.join(MODEL_BASE_PATH, model_id, version, "model_path.txt")
+    try:
+        with open(path_file, "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Model path file not found at path: {path_file}")
+
+
+def stored_model_bytes(model_id: str, version: str):
+    """
+    Size of a model version's stored pickle, or None when it cannot be found out.
+
+    A loaded model takes at least about as much memory as its pickle, so this is known, cheaply,
+    before unpickling it.
+    """
+    try:
+        pickle_path = registered_pickle_path(model_id, version)
+        return artifact_store.size(pickle_path) if is_artifact_ref(pickle_path) else os.path.getsize(pickle_path)
+    except Exception as e:
+        logger.warning(f"Could not find the stored size of model {model_id} version {version}: {e}")
+        return None
+
+
+def load_model_artifacts(model_id: str, version: str):
+    """
+    Load the pickled model and feature list registered for a model version.
+    """
+    pickle_path = registered_pickle_path(model_id, version)
+
+    # Content-addressed artifacts come from the artifact store (local or S3, verified on load);
+    # plain paths are still supported for entries registered before it
+    if is_artifact_ref(pickle_path):
+        model = artifact_store.load(pickle_path)
+    else:
+        try:
+            with open(pickle_path, "rb") as model_file:
+                model = pickle.load(model_file)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Model file not found at path: {pickle_path}")
+
+    return model, load_model_features(model_id, version)
@@ -0,0 +1,72 @@
+import gc
+import sys
+import types
+import numpy as np
+
+# Shared code rather than model state: never counted in a model's footprint
+_SKIPPED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+class ModelMemoryError(RuntimeError):
+    """
+    A model version does not fit in a process's memory budget, even after evicting every cached version that can go.
+    """
+
+
+def object_bytes(*roots) -> int:
+    """
+    Deep size of everything reachable from the roots, each object counted once.
+    """
+    seen = set()
+    pending = list(roots)
+    total = 0
+    while pending:
+        item = pending.pop()
+        if id(item) in seen or isinstance(item, _SKIPPED_TYPES):
+            continue
+        seen.add(id(item))
+        # An array's size includes its buffer only when it owns it, and arrays do not report
+        # their base or elements as referents, so both are followed explicitly
+        total += sys.getsizeof(item)
+        if isinstance(item, np.ndarray):
+            if item.base is not None:
+                pending.append(item.base)
+            if item.dtype.hasobject:
+                pending.extend(item.ravel().tolist())
+        else:
+            pending.extend(gc.get_referents(item))
+    return total
+
+
+def _estimators(model):
+    """
+    The final estimator of a model (or pipeline) and, recursively, the estimators it is an ensemble of.
+    """
+    estimator = model.steps[-1][1] if hasattr(model, "steps") else model
+    yield estimator
+    members = getattr(estimator, "estimators_", None)
+    if members is not None:
+        # Forests hold a list of trees, gradient boosting a 2-d array of them
+        for member in (members.ravel() if hasattr(members, "ravel") else members):
+            yield from _estimators(member)
+
+
+def model_bytes(model) -> int:
+    """
+    Estimated memory footprint of a loaded model: its object graph plus the native buffers it holds.
+    """
+    native = 0
+    hidden = []
+    for estimator in _estimators(model):
+        if hasattr(estimator, "get_booster"):
+            # XGBoost keeps its trees in C++ memory; the serialized booster is a close lower bound
+            native += len(estimator.get_booster().save_raw())
+        elif hasattr(estimator, "tree_"):
+            from sklearn.tree._tree import NODE_DTYPE
+            # scikit-learn trees keep their nodes (plus one value per output and class) in malloc'd buffers
+            tree = estimator.tree_
+            native += tree.node_count * (NODE_DTYPE.itemsize + 8 * tree.n_outputs * tree.max_n_classes)
+        elif hasattr(getattr(estimator, "_tree", None), "get_arrays"):
+            # Neighbors' KD / ball trees hold their arrays in attributes the garbage collector cannot see
+            hidden.extend(estimator._tree.get_arrays())
+    return object_bytes(model, *hidden) + native
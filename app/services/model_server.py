@@ -0,0 +1,497 @@
+import os
+import time
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+import pandas as pd
+from app.services.explain import EXPLAIN_PREPARE_ON_LOAD, explainer_bytes, prepare_explainer
+from app.services.inference_pool import InferencePoolClient, RemoteModel
+from app.services.model_manager import (
+    ModelRegistry, load_model_artifacts, load_model_features, stored_model_bytes, version_number,
+)
+from app.services.model_memory import ModelMemoryError, model_bytes
+from app.services.thread_budget import thread_budget
+from app.services.worker_snapshots import process_alive, read_snapshots, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+MODEL_REGISTRY_PATH = "app/model_registry/model_registry.csv"
+REGISTRY_POLL_INTERVAL = float(os.environ.get("REGISTRY_POLL_INTERVAL") or 2.0)
+# Older versions requested explicitly (e.g. for comparisons) are kept in a small cache
+MAX_EXTRA_VERSIONS = int(os.environ.get("MAX_EXTRA_VERSIONS") or 4)
+# Memory all models held by one worker may take; cached extra versions are evicted to stay under it
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get("MODEL_MEMORY_BUDGET_MB") or 2048)
+# Versions never evicted besides the served ones, as "model_id:version,model_id:version"
+PINNED_MODEL_VERSIONS = os.environ.get("PINNED_MODEL_VERSIONS", "")
+MODEL_MEMORY_DIR = "app/model_registry/model_memory/"
+
+# When INFERENCE_WORKERS is set, predict() runs in the inference pool instead of this worker
+inference_pool = InferencePoolClient.from_env()
+
+
+class ModelNotFoundError(LookupError):
+    pass
+
+
+def parse_pinned_versions(value: str) -> set:
+    return {tuple(entry.strip().split(":", 1)) for entry in value.split(",") if ":" in entry}
+
+
+def load_model(model_id: str, version: str):
+    """
+    Load a model version and its features, or a handle to it in the inference pool.
+    """
+    if inference_pool:
+        model = RemoteModel(inference_pool, model_id, version)
+        model.load()
+        return model, load_model_features(model_id, version)
+
+    model, model_features = load_model_artifacts(model_id, version)
+    # Models are pickled with n_jobs=-1; keep each worker inside its thread budget
+    thread_budget.apply_to_model(model)
+    return model, model_features
+
+
+def stored_size(model_id: str, version: str):
+    """
+    Size of a version's stored pickle, which its loaded model is not much smaller than;
+    None in pool mode, where models take their memory in the inference processes.
+    """
+    return None if inference_pool else stored_model_bytes(model_id, version)
+
+
+class LoadedModel:
+    """
+    A model version held in memory, with its estimated footprint and the number of requests currently using it.
+    """
+    def __init__(self, model_id: str, version: str, model, features: list, load_seconds: float, memory_bytes: int = 0):
+        self.model_id = model_id
+        self.version = version
+        self.model = model
+        self.features = features
+        self.load_seconds = load_seconds
+        self.model_bytes = memory_bytes
+        self.loaded_at = time.time()
+        self.in_flight = 0
+        # GreedyDual-Size priority of a cached extra version: the lowest is evicted first
+        self.priority = 0.0
+
+    @property
+    def memory_bytes(self) -> int:
+        """
+        Estimated footprint, including the explanation arrays once the model has been explained.
+        """
+        return self.model_bytes + explainer_bytes(self.model)
+
+    def describe(self) -> dict:
+        return {
+            "model_id": self.model_id,
+            "version": self.version,
+            "memory_mb": self.memory_bytes / 1024 ** 2,
+            "load_seconds": self.load_seconds,
+            "loaded_at": self.loaded_at,
+            "in_flight": self.in_flight,
+        }
+
+    def warm(self):
+        """
+        Run one prediction so lazy initialisation happens before the model takes traffic.
+        """
+        self.model.predict(pd.DataFrame([[0.0] * len(self.features)], columns=self.features))
+
+
+class ModelServer:
+    """
+    Serves the latest version of every registered model from memory (blue/green).
+
+    New versions are loaded and warmed on a background thread while the previous version
+    keeps serving, then swapped in atomically. Requests hold the version they started with,
+    and a replaced version is retired once its in-flight requests have finished.
+    Every worker polls the registry file, so a version registered on one worker is
+    picked up by all of them. Specific older versions can also be acquired; those are
+    loaded on demand and cached next to the served versions.
+
+    Every model's footprint is estimated when it loads. Cached versions are evicted when
+    there are more than MAX_EXTRA_VERSIONS of them or all models together exceed the memory
+    budget, cheapest to reload per byte first (GreedyDual-Size: load seconds / size, aged
+    on every eviction so rarely used versions eventually go). Served versions, pinned
+    versions (such as shadow candidates) and versions in use are never evicted.
+
+    The budget is enforced: a version (served or cached) that does not fit even after
+    evictions is dropped right after loading, and ModelMemoryError is raised. Sizes are
+    remembered, so later requests for it are refused without loading it again until
+    enough memory is free. Before a version's first load, the size of its stored pickle
+    stands in for its footprint, so an artifact that clearly cannot fit is never unpickled.
+    Only pinned versions may take the worker over budget.
+    """
+    def __init__(self, registry: ModelRegistry, loader=load_model, poll_interval: float = REGISTRY_POLL_INTERVAL,
+                 memory_budget_mb: float = MODEL_MEMORY_BUDGET_MB, memory_dir: str = MODEL_MEMORY_DIR,
+                 stored_size=stored_size):
+        self.registry = registry
+        self.loader = loader
+        self.stored_size = stored_size
+        self.poll_interval = poll_interval
+        self.memory_budget = memory_budget_mb * 1024 ** 2
+        self.memory_dir = memory_dir
+        self.active = {}
+        self.versions = {}
+        self.retiring = []
+        self.loading = set()
+        # One load per version at a time: a request and the background loader wait on the same one
+        self.pending_loads = {}
+        self.pinned = {"config": parse_pinned_versions(PINNED_MODEL_VERSIONS)}
+        # Last measured footprint of every version loaded, to refuse ones that cannot fit without loading them
+        self.model_sizes = {}
+        # GreedyDual-Size inflation value: the priority of the last evicted version
+        self.inflation = 0.0
+        self.evictions = 0
+        self.over_budget = False
+        self._memory_changed = True
+        self.lock = threading.Lock()
+        self.load_locks = defaultdict(threading.Lock)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+        self._stop = threading.Event()
+        self._watcher = None
+        self._registry_mtime = None
+
+    def start(self):
+        """
+        Load the latest versions in the background and start watching the registry.
+        """
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="registry-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher:
+            self._watcher.join(timeout=self.poll_interval + 1)
+
+    def _watch(self):
+        while not self._stop.is_set():
+            try:
+                mtime = os.stat(self.registry.registry_path).st_mtime_ns
+                if mtime != self._registry_mtime:
+                    self._registry_mtime = mtime
+                    self.refresh()
+            except Exception:
+                logger.exception("Error watching the model registry")
+            try:
+                if self._memory_changed:
+                    self.publish()
+            except Exception:
+                logger.exception("Error publishing the resident models")
+            self._stop.wait(self.poll_interval)
+
+    def refresh(self):
+        """
+        Schedule a background load for every model whose latest registered version is not being served.
+        """
+        for model_id, version in self.registry.get_latest_versions().items():
+            self.schedule(model_id, version)
+
+    def schedule(self, model_id: str, version: str):
+        with self.lock:
+            current = self.active.get(model_id)
+            if current and version_number(current.version) >= version_number(version):
+                return
+            if (model_id, version) in self.loading:
+                return
+            self.loading.add((model_id, version))
+        self.executor.submit(self._load_and_swap, model_id, version)
+
+    def _load(self, model_id: str, version: str) -> LoadedModel:
+        start = time.perf_counter()
+        model, features = self.loader(model_id, version)
+        load_seconds = time.perf_counter() - start
+        # A model served by the inference pool takes its memory there, not in this worker
+        memory = 0 if isinstance(model, RemoteModel) else model_bytes(model)
+        loaded = LoadedModel(model_id, version, model, features, load_seconds, memory)
+        loaded.warm()
+        if EXPLAIN_PREPARE_ON_LOAD:
+            prepare_explainer(model)
+        with self.lock:
+            self.model_sizes[(model_id, version)] = loaded.memory_bytes
+        logger.info(f"Loaded model {model_id} version {version} in {loaded.load_seconds:.2f}s, "
+                    f"{loaded.memory_bytes / 1024 ** 2:.1f} MB (pid {os.getpid()})")
+        return loaded
+
+    def _load_once(self, model_id: str, version: str) -> LoadedModel:
+        """
+        Load a version, or wait for the load of it already in progress on another thread,
+        so a version is never unpickled twice at the same time.
+        """
+        key = (model_id, version)
+        with self.lock:
+            pending = self.pending_loads.get(key)
+            if pending is None:
+                pending = self.pending_loads[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return pending.result()
+        try:
+            loaded = self._load(model_id, version)
+            pending.set_result(loaded)
+            return loaded
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.pending_loads.pop(key, None)
+
+    def _load_and_swap(self, model_id: str, version: str):
+        try:
+            # The served version is replaced, so it does not count against the new one
+            self._check_known_size(model_id, version, replacing=self.active.get(model_id))
+            self._swap(self._load_once(model_id, version))
+        except ModelMemoryError:
+            # Already logged with the memory figures; the current version keeps serving
+            pass
+        except Exception:
+            logger.exception(f"Failed to load model {model_id} version {version}; keeping the current version")
+        finally:
+            with self.lock:
+                self.loading.discard((model_id, version))
+
+    def _swap(self, loaded: LoadedModel):
+        with self.lock:
+            current = self.active.get(loaded.model_id)
+            if current and version_number(current.version) >= version_number(loaded.version):
+                return
+            # The replaced version retires once its requests finish, so it does not count against the new one
+            if not self._make_room((loaded.model_id, loaded.version), loaded.memory_bytes, loaded.model, replacing=current):
+                raise self._memory_error(loaded.model_id, loaded.version, loaded.memory_bytes)
+            self.active[loaded.model_id] = loaded
+            if current:
+                self.retiring.append(current)
+                self._retire_idle()
+            self._evict()
+        logger.info(f"Now serving model {loaded.model_id} version {loaded.version}")
+
+    def _retire_idle(self):
+        """
+        Drop replaced versions that no request is using anymore. Caller holds the lock.
+        """
+        for loaded in [m for m in self.retiring if m.in_flight == 0]:
+            self.retiring.remove(loaded)
+            self._memory_changed = True
+            logger.info(f"Retired model {loaded.model_id} version {loaded.version}")
+
+    def set_pinned(self, source: str, keys: set):
+        """
+        Replace the (model_id, version) pairs a source (e.g. the shadow scorer) keeps from being evicted.
+        """
+        with self.lock:
+            self.pinned[source] = set(keys)
+            self._evict()
+
+    def is_pinned(self, key: tuple) -> bool:
+        return any(key in keys for keys in self.pinned.values())
+
+    def _held(self) -> list:
+        return [*self.active.values(), *self.versions.values(), *self.retiring]
+
+    def memory_bytes(self, excluding: LoadedModel = None) -> int:
+        """
+        Estimated memory of every model held (but excluding), counting an artifact shared by several versions once.
+        Caller holds the lock.
+        """
+        models = {id(loaded.model): loaded.memory_bytes for loaded in self._held() if loaded is not excluding}
+        return sum(models.values())
+
+    def _touch(self, loaded: LoadedModel):
+        """
+        Reset a cached version's GreedyDual-Size priority on use: reload cost per MB, on top of the inflation value.
+        """
+        loaded.priority = self.inflation + loaded.load_seconds / max(loaded.memory_bytes / 1024 ** 2, 1e-3)
+
+    def _evictable(self) -> list:
+        return [(loaded.priority, key) for key, loaded in self.versions.items()
+                if not self.is_pinned(key) and loaded.in_flight == 0]
+
+    def _evict_one(self) -> bool:
+        """
+        Evict the cached, unpinned, unused version with the lowest priority; False if there is none. Caller holds the lock.
+        """
+        evictable = self._evictable()
+        if not evictable:
+            return False
+        priority, key = min(evictable)
+        evicted = self.versions.pop(key)
+        self.inflation = priority
+        self.evictions += 1
+        self._memory_changed = True
+        logger.info(f"Evicted model {evicted.model_id} version {evicted.version} "
+                    f"({evicted.memory_bytes / 1024 ** 2:.1f} MB)")
+        return True
+
+    def _make_room(self, key: tuple, size: int, model=None, replacing: LoadedModel = None) -> bool:
+        """
+        Evict cached versions until a version of size bytes (model, if already loaded) fits in the budget
+        next to the models held, not counting replacing. Returns whether it fits; pinned versions always do.
+        Caller holds the lock.
+        """
+        if self.is_pinned(key) or any(loaded.model is model for loaded in self._held() if model is not None):
+            return True
+        # Evict nothing for a version that would not fit anyway
+        freeable = sum(self.versions[key].memory_bytes for _, key in self._evictable())
+        if self.memory_bytes(excluding=replacing) - freeable + size > self.memory_budget:
+            return False
+        while self.memory_bytes(excluding=replacing) + size > self.memory_budget:
+            if not self._evict_one():
+                return False
+        return True
+
+    def _memory_error(self, model_id: str, version: str, size: int) -> ModelMemoryError:
+        logger.warning(f"Refused model {model_id} version {version} ({size / 1024 ** 2:.1f} MB): models held by "
+                       f"worker {os.getpid()} take {self.memory_bytes() / 1024 ** 2:.0f} MB of the "
+                       f"{self.memory_budget / 1024 ** 2:.0f} MB budget and none can be evicted now")
+        return ModelMemoryError(f"Model {model_id} version {version} does not fit in the worker's memory budget; "
+                                f"retry once requests using other versions have finished")
+
+    def _check_known_size(self, model_id: str, version: str, replacing: LoadedModel = None):
+        """
+        Refuse a version that cannot fit before loading it: by its measured footprint when it was
+        loaded before, otherwise by the size of its stored pickle.
+        """
+        key = (model_id, version)
+        with self.lock:
+            size = self.model_sizes.get(key)
+        if size is None:
+            size = self.stored_size(model_id, version)
+            if not size:
+                return
+        with self.lock:
+            if not self._make_room(key, size, replacing=replacing):
+                raise self._memory_error(model_id, version, size)
+
+    def _evict(self):
+        """
+        Evict cached extra versions, lowest priority first, while over the version count or the
+        memory budget. Pinned versions and versions serving a request stay. Caller holds the lock.
+        """
+        self._memory_changed = True
+        while True:
+            unpinned = [key for key in self.versions if not self.is_pinned(key)]
+            over_budget = self.memory_bytes() > self.memory_budget
+            if len(unpinned) <= MAX_EXTRA_VERSIONS and not over_budget:
+                break
+            if not self._evict_one():
+                break
+
+        if over_budget and not self.over_budget:
+            logger.warning(f"Models held by worker {os.getpid()} take {self.memory_bytes() / 1024 ** 2:.0f} MB, "
+                           f"over the {self.memory_budget / 1024 ** 2:.0f} MB budget, and none can be evicted now")
+        self.over_budget = over_budget
+
+    def _ensure_loaded(self, model_id: str) -> LoadedModel:
+        """
+        Cold path for a model this worker is not serving yet: load it inline, once, and check it out.
+        """
+        with self.load_locks[model_id]:
+            loaded = self._checkout(model_id)
+            if loaded:
+                return loaded
+            latest_model = self.registry.get_latest_version(model_id)
+            if not latest_model:
+                raise ModelNotFoundError(f"No model found with ID: {model_id}")
+            self._check_known_size(model_id, latest_model["version"])
+            self._swap(self._load_once(model_id, latest_model["version"]))
+            # Served versions are only ever replaced, never evicted
+            return self._checkout(model_id)
+
+    def _ensure_version(self, model_id: str, version: str) -> LoadedModel:
+        """
+        Load a specific registered version on demand into the cache of extra versions and check it out.
+
+        The version is counted as in use in the same critical section that caches it, so no
+        eviction can drop it before the request gets it.
+        """
+        key = (model_id, version)
+        with self.load_locks[key]:
+            loaded = self._checkout(model_id, version)
+            if loaded:
+                return loaded
+            if not self.registry.get_version(model_id, version):
+                raise ModelNotFoundError(f"No model found with ID: {model_id} and version: {version}")
+            self._check_known_size(model_id, version)
+            loaded = self._load_once(model_id, version)
+            with self.lock:
+                if not self._make_room(key, loaded.memory_bytes, loaded.model):
+                    raise self._memory_error(model_id, version, loaded.memory_bytes)
+                self._touch(loaded)
+                loaded.in_flight += 1
+                self.versions[key] = loaded
+                self._evict()
+            return loaded
+
+    def _checkout(self, model_id: str, version: str = None):
+        """
+        Find the requested version in memory and count the request against it.
+        """
+        with self.lock:
+            loaded = self.active.get(model_id)
+            if version is not None and (loaded is None or loaded.version != version):
+                loaded = self.versions.get((model_id, version))
+                if loaded:
+                    self._touch(loaded)
+            if loaded:
+                loaded.in_flight += 1
+            return loaded
+
+    @contextmanager
+    def acquire(self, model_id: str, version: str = None):
+        """
+        Hold a model for the duration of a request: the served (latest) version, or a specific one.
+        """
+        loaded = self._checkout(model_id, version)
+        if loaded is None:
+            loaded = self._ensure_loaded(model_id) if version is None else self._ensure_version(model_id, version)
+        try:
+            yield loaded
+        finally:
+            with self.lock:
+                loaded.in_flight -= 1
+                if loaded in self.retiring:
+                    self._retire_idle()
+                elif loaded.in_flight == 0 and (self.over_budget or len(self.versions) > MAX_EXTRA_VERSIONS):
+                    # A cached version that could not be evicted while in use may go now
+                    self._evict()
+
+    def resident_models(self) -> dict:
+        """
+        The models this worker holds in memory, with their roles and estimated sizes.
+        """
+        with self.lock:
+            models = [dict(loaded.describe(), role="serving", pinned=True) for loaded in self.active.values()]
+            models += [dict(loaded.describe(), role="cached", pinned=self.is_pinned(key), priority=loaded.priority)
+                       for key, loaded in self.versions.items()]
+            models += [dict(loaded.describe(), role="retiring", pinned=False) for loaded in self.retiring]
+            return {
+                "pid": os.getpid(),
+                "budget_mb": self.memory_budget / 1024 ** 2,
+                "used_mb": self.memory_bytes() / 1024 ** 2,
+                "over_budget": self.over_budget,
+                "evictions": self.evictions,
+                "models": models,
+            }
+
+    def publish(self):
+        self._memory_changed = False
+        write_snapshot(self.memory_dir, self.resident_models())
+
+    def report(self) -> dict:
+        """
+        Resident models of every worker.
+        """
+        self.publish()
+        return {"max_extra_versions": MAX_EXTRA_VERSIONS,
+                "workers": [snapshot for snapshot in read_snapshots(self.memory_dir) if process_alive(snapshot["pid"])]}
+
+
+model_server = ModelServer(ModelRegistry(MODEL_REGISTRY_PATH))
@@ -0,0 +1,218 @@
+import os
+import json
+import queue
+import random
+import time
+import logging
+import threading
+import numpy as np
+from app.services.model_manager import atomic_write
+from app.services.model_server import model_server
+from app.services.worker_snapshots import read_snapshots, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+SHADOW_CONFIG_PATH = "app/model_registry/shadow_config.json"
+SHADOW_STATS_DIR = "app/model_registry/shadow_stats/"
+SHADOW_QUEUE_SIZE = int(os.environ.get("SHADOW_QUEUE_SIZE") or 256)
+SHADOW_SNAPSHOT_INTERVAL = float(os.environ.get("SHADOW_SNAPSHOT_INTERVAL") or 5.0)
+
+
+class ShadowStats:
+    """
+    Running, mergeable aggregates of candidate - serving prediction deltas.
+    """
+    FIELDS = ["sampled", "dropped", "errors", "count", "sum_delta", "sum_abs_delta", "sum_sq_delta", "sum_abs_pct_delta"]
+
+    def __init__(self, values: dict = None):
+        values = values or {}
+        for field in self.FIELDS:
+            setattr(self, field, values.get(field, 0))
+        self.max_abs_delta = values.get("max_abs_delta", 0.0)
+
+    def update(self, served, candidate):
+        delta = np.asarray(candidate, dtype=float) - np.asarray(served, dtype=float)
+        self.count += len(delta)
+        self.sum_delta += float(delta.sum())
+        self.sum_abs_delta += float(np.abs(delta).sum())
+        self.sum_sq_delta += float((delta ** 2).sum())
+        self.sum_abs_pct_delta += float((np.abs(delta) / np.maximum(np.abs(served), 1.0)).sum())
+        self.max_abs_delta = max(self.max_abs_delta, float(np.abs(delta).max()))
+
+    def merge(self, other: "ShadowStats"):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        self.max_abs_delta = max(self.max_abs_delta, other.max_abs_delta)
+
+    def to_dict(self) -> dict:
+        values = {field: getattr(self, field) for field in self.FIELDS}
+        values["max_abs_delta"] = self.max_abs_delta
+        return values
+
+    def summary(self) -> dict:
+        count = self.count or None
+        return {
+            "sampled": self.sampled,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "scored_rows": self.count,
+            "mean_delta": self.sum_delta / count if count else None,
+            "mean_abs_delta": self.sum_abs_delta / count if count else None,
+            "rmse_delta": (self.sum_sq_delta / count) ** 0.5 if count else None,
+            "mean_abs_pct_delta": self.sum_abs_pct_delta / count if count else None,
+            "max_abs_delta": self.max_abs_delta if count else None,
+        }
+
+
+class ShadowScorer:
+    """
+    Scores sampled production inputs with a candidate version off the request path.
+
+    The request thread only samples and does a non-blocking put on a bounded queue
+    (dropping on overflow). A background thread scores the candidate and aggregates
+    its deltas against the served prediction. The candidate configuration is a JSON
+    file shared by all workers; per-worker stats are published as snapshots and merged
+    when queried.
+    """
+    def __init__(self, config_path: str = SHADOW_CONFIG_PATH, stats_dir: str = SHADOW_STATS_DIR,
+                 queue_size: int = SHADOW_QUEUE_SIZE, snapshot_interval: float = SHADOW_SNAPSHOT_INTERVAL):
+        self.config_path = config_path
+        self.stats_dir = stats_dir
+        self.snapshot_interval = snapshot_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.config = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+        self._config_mtime = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._load_config()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="shadow-scorer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        self.publish()
+
+    def _load_config(self):
+        try:
+            mtime = os.stat(self.config_path).st_mtime_ns
+        except FileNotFoundError:
+            if self.config:
+                model_server.set_pinned("shadow", set())
+            self.config, self._config_mtime = {}, None
+            return
+        if mtime != self._config_mtime:
+            with open(self.config_path, "r") as f:
+                self.config = json.load(f)
+            self._config_mtime = mtime
+            # Candidates are scored continuously, so they stay loaded
+            model_server.set_pinned("shadow", {(model_id, candidate["version"]) for model_id, candidate in self.config.items()})
+            logger.info(f"Shadow candidates: {self.config}")
+
+    def _stats_for(self, model_id: str, candidate_version: str) -> ShadowStats:
+        # Caller holds the lock
+        key = f"{model_id}/{candidate_version}"
+        if key not in self.stats:
+            self.stats[key] = ShadowStats()
+        return self.stats[key]
+
+    def submit(self, model_id: str, serving_version: str, input_with_demographics, prediction):
+        """
+        Called on the request path: sample the request for shadow scoring without ever blocking.
+        """
+        candidate = self.config.get(model_id)
+        if not candidate or random.random() >= candidate["sample_rate"]:
+            return
+        try:
+            self.queue.put_nowait((model_id, candidate["version"], serving_version, input_with_demographics, prediction))
+            dropped = False
+        except queue.Full:
+            dropped = True
+        with self.lock:
+            stats = self._stats_for(model_id, candidate["version"])
+            stats.sampled += 1
+            stats.dropped += dropped
+
+    def _run(self):
+        # Let the OS scheduler favour request threads over shadow scoring (Linux sets niceness per thread)
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except (AttributeError, OSError):
+            pass
+
+        last_publish = 0.0
+        while not self._stop.is_set():
+            try:
+                self._load_config()
+                item = self.queue.get(timeout=1.0)
+                self._score(*item)
+            except queue.Empty:
+                pass
+            except Exception:
+                logger.exception("Error in shadow scorer")
+            if time.monotonic() - last_publish >= self.snapshot_interval:
+                self.publish()
+                last_publish = time.monotonic()
+
+    def _score(self, model_id: str, candidate_version: str, serving_version: str, input_with_demographics, served):
+        try:
+            with model_server.acquire(model_id, candidate_version) as loaded:
+                candidate = loaded.model.predict(input_with_demographics[loaded.features])
+        except Exception as e:
+            logger.warning(f"Shadow scoring of {model_id} version {candidate_version} failed: {e}")
+            with self.lock:
+                self._stats_for(model_id, candidate_version).errors += 1
+            return
+        with self.lock:
+            self._stats_for(model_id, candidate_version).update(served, candidate)
+
+    def publish(self):
+        with self.lock:
+            payload = {key: stats.to_dict() for key, stats in self.stats.items()}
+        if payload:
+            write_snapshot(self.stats_dir, payload)
+
+    def set_candidate(self, model_id: str, version: str, sample_rate: float):
+        self._update_config(lambda config: config.update({model_id: {"version": version, "sample_rate": sample_rate}}))
+
+    def remove_candidate(self, model_id: str):
+        self._update_config(lambda config: config.pop(model_id, None))
+
+    def _update_config(self, change):
+        try:
+            with open(self.config_path, "r") as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            config = {}
+        change(config)
+        with atomic_write(self.config_path) as f:
+            json.dump(config, f)
+        self._load_config()
+
+    def report(self, model_id: str) -> dict:
+        """
+        Candidate configuration and delta statistics merged across all workers.
+        """
+        self.publish()
+        merged = {}
+        for snapshot in read_snapshots(self.stats_dir):
+            for key, values in snapshot.items():
+                snapshot_model_id, candidate_version = key.rsplit("/", 1)
+                if snapshot_model_id != model_id:
+                    continue
+                merged.setdefault(candidate_version, ShadowStats()).merge(ShadowStats(values))
+        return {
+            "model_id": model_id,
+            "candidate": self.config.get(model_id),
+            "queue_size": self.queue.qsize(),
+            "versions": {version: stats.summary() for version, stats in merged.items()},
+        }
+
+
+shadow_scorer = ShadowScorer()
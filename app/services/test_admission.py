@@ -0,0 +1,28 @@
+"""Only configured API keys get a rate-limit bucket of their own.
+
+Run from the repository root with `python -m pytest app/services`.
+"""
+from app.services.admission import AdmissionController
+
+
+def request_scope(ip: str, api_key: str = None) -> dict:
+    headers = [(b"x-api-key", api_key.encode())] if api_key else []
+    return {"type": "http", "path": "/predictions", "headers": headers, "client": (ip, 50000)}
+
+
+def make_controller(tmp_path, api_keys=frozenset()) -> AdmissionController:
+    return AdmissionController(rate=1, burst=2, max_in_flight=100, stats_dir=str(tmp_path), api_keys=api_keys)
+
+
+def test_configured_key_has_its_own_bucket(tmp_path):
+    controller = make_controller(tmp_path, api_keys=frozenset({"team-a"}))
+    assert controller.client_key(request_scope("10.0.0.1", "team-a")) == "key:team-a"
+    assert controller.client_key(request_scope("10.0.0.1")) == "ip:10.0.0.1"
+
+
+def test_rotating_unknown_keys_does_not_reset_the_limit(tmp_path):
+    controller = make_controller(tmp_path, api_keys=frozenset({"team-a"}))
+    results = [controller.admit(controller.client_key(request_scope("10.0.0.1", f"forged-{n}"))) for n in range(4)]
+    assert results[:2] == [None, None]
+    assert all(result[0] == 429 for result in results[2:])
+    assert list(controller.buckets) == ["ip:10.0.0.1"]
@@ -0,0 +1,136 @@
+"""S3 artifact backend and parallel ranged fetches, against an in-memory stand-in for an S3 client.
+
+Run from the repository root with `python -m pytest app/services`.
+"""
+import hashlib
+import os
+import pickle
+import threading
+
+import pytest
+
+from app.services.artifact_store import ArtifactIntegrityError, ArtifactStore, DiskCache, S3Backend
+
+
+class FakeClientError(Exception):
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class FakeS3Client:
+    """
+    The subset of the boto3 S3 client the backend uses, keeping objects in a dict.
+    """
+    class exceptions:
+        ClientError = FakeClientError
+
+    def __init__(self):
+        self.objects = {}
+        self.ranges = []
+        self.lock = threading.Lock()
+
+    def _object(self, bucket: str, key: str) -> bytes:
+        if (bucket, key) not in self.objects:
+            raise FakeClientError("404")
+        return self.objects[bucket, key]
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        return {"ContentLength": len(self._object(Bucket, Key))}
+
+    def get_object(self, Bucket: str, Key: str, Range: str) -> dict:
+        start, end = map(int, Range[len("bytes="):].split("-"))
+        with self.lock:
+            self.ranges.append((start, end))
+        return {"Body": _Body(self._object(Bucket, Key)[start:end + 1])}
+
+    def upload_file(self, Filename: str, Bucket: str, Key: str):
+        with open(Filename, "rb") as f:
+            self.objects[Bucket, Key] = f.read()
+
+
+class _Body:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def read(self) -> bytes:
+        return self.data
+
+
+@pytest.fixture
+def client():
+    return FakeS3Client()
+
+
+@pytest.fixture
+def store(client, tmp_path):
+    backend = S3Backend(bucket="models", prefix="artifacts/", client=client)
+    return ArtifactStore(backend, cache=DiskCache(str(tmp_path / "cache"), max_bytes=10 ** 7),
+                         chunk_size=1000, fetch_threads=4)
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = tmp_path / "model.pkl"
+    path.write_bytes(pickle.dumps({"weights": list(range(2000))}))
+    return str(path)
+
+
+def test_put_and_load(store, client, artifact):
+    ref = store.put(artifact)
+    digest = hashlib.sha256(open(artifact, "rb").read()).hexdigest()
+    assert ref == "sha256:" + digest
+    assert ("models", f"artifacts/{digest[:2]}/{digest}") in client.objects
+    # The same content is stored once
+    assert store.put(artifact) == ref and len(client.objects) == 1
+    assert store.load(ref) == {"weights": list(range(2000))}
+
+
+def test_fetch_in_ranged_chunks(store, client, artifact):
+    ref = store.put(artifact)
+    size = os.path.getsize(artifact)
+    path = store.get_path(ref)
+    with open(path, "rb") as cached, open(artifact, "rb") as original:
+        assert cached.read() == original.read()
+    assert sorted(client.ranges) == [(start, min(start + 1000, size) - 1) for start in range(0, size, 1000)]
+    # Served from the local cache afterwards
+    client.ranges.clear()
+    assert store.get_path(ref) == path and client.ranges == []
+
+
+def test_reject_hash_mismatch(store, client, artifact):
+    ref = store.put(artifact)
+    key = next(iter(client.objects))
+    client.objects[key] = client.objects[key][:-1] + b"\x00"
+    with pytest.raises(ArtifactIntegrityError):
+        store.get_path(ref)
+    assert os.listdir(store.cache.directory) == []
+
+
+def test_refetch_corrupt_cached_copy(store, client, artifact):
+    ref = store.put(artifact)
+    path = store.get_path(ref)
+    with open(path, "r+b") as cached:
+        cached.write(b"\x00")
+    assert store.load(ref) == {"weights": list(range(2000))}
+
+
+def test_missing_artifact(store):
+    with pytest.raises(FileNotFoundError):
+        store.get_path("sha256:" + "0" * 64)
+    with pytest.raises(FileNotFoundError):
+        store.ingest("sha256:" + "0" * 64)
+
+
+def test_fetch_locks_are_dropped(store, artifact):
+    ref = store.put(artifact)
+    assert store.load(ref) == {"weights": list(range(2000))}
+    assert store.fetch_locks == {}
+
+
+def test_refuse_cache_others_can_write(store, artifact, tmp_path):
+    ref = store.put(artifact)
+    os.makedirs(store.cache.directory, mode=0o700)
+    os.chmod(store.cache.directory, 0o777)
+    with pytest.raises(PermissionError):
+        store.load(ref)
@@ -0,0 +1,80 @@
+"""Audit log part files left behind by a worker that died.
+
+Run from the repository root with `python -m pytest app/services`.
+"""
+import os
+import subprocess
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from app.services.audit_log import AuditLog
+
+
+@pytest.fixture
+def dead_pid():
+    process = subprocess.Popen(["true"])
+    process.wait()
+    return process.pid
+
+
+def write_part_file(directory: str, file_format: str, batches: int):
+    """
+    Write batches to a part file left open, as a crashed worker would. The AuditLog is returned
+    too: the writer must stay referenced, or collecting it would finish the file.
+    """
+    audit = AuditLog(directory=directory, file_format=file_format, stats_dir=os.path.join(directory, "stats"))
+    for i in range(batches):
+        audit.record("predict", "m", "v1", pd.DataFrame({"sqft_living": [1000 + i, 2000 + i]}), np.array([1.0, 2.0]), 3.0)
+        audit._flush()
+    return audit, audit._writer_path + ".tmp"
+
+
+def as_dead_worker(path: str, pid: int) -> str:
+    head, _pid, tail = os.path.basename(path).rsplit("-", 2)
+    dead_path = os.path.join(os.path.dirname(path), f"{head}-{pid}-{tail}")
+    os.rename(path, dead_path)
+    return dead_path
+
+
+def test_salvage_arrow_stream_up_to_last_complete_batch(tmp_path, dead_pid):
+    _writer, part_path = write_part_file(str(tmp_path), "arrow", batches=3)
+    path = as_dead_worker(part_path, dead_pid)
+    # Cut into the last batch
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 20)
+    audit = AuditLog(directory=str(tmp_path), file_format="arrow", stats_dir=str(tmp_path / "stats"))
+    audit.salvage()
+    assert not os.path.exists(path)
+    with pa.OSFile(path[:-len(".tmp")], "rb") as source:
+        table = pa.ipc.open_stream(source).read_all()
+    assert table.num_rows == 4
+    assert audit.counters["salvaged_files"] == 1 and audit.counters["salvaged_rows"] == 4
+
+
+def test_unfinished_parquet_kept_aside(tmp_path, dead_pid):
+    _writer, part_path = write_part_file(str(tmp_path), "parquet", batches=2)
+    path = as_dead_worker(part_path, dead_pid)
+    audit = AuditLog(directory=str(tmp_path), stats_dir=str(tmp_path / "stats"))
+    audit.salvage()
+    assert os.path.exists(path[:-len(".tmp")] + ".partial")
+    assert audit.counters["partial_files"] == 1
+
+
+def test_complete_parquet_renamed(tmp_path, dead_pid):
+    audit = AuditLog(directory=str(tmp_path), stats_dir=str(tmp_path / "stats"))
+    audit.record("predict", "m", "v1", pd.DataFrame({"sqft_living": [1000]}), np.array([1.0]), 3.0)
+    audit._flush()
+    audit._writer.close()
+    path = as_dead_worker(audit._writer_path + ".tmp", dead_pid)
+    AuditLog(directory=str(tmp_path), stats_dir=str(tmp_path / "stats")).salvage()
+    assert pq.read_table(path[:-len(".tmp")]).num_rows == 1
+
+
+def test_live_worker_part_file_untouched(tmp_path):
+    _writer, path = write_part_file(str(tmp_path), "arrow", batches=1)
+    AuditLog(directory=str(tmp_path), file_format="arrow", stats_dir=str(tmp_path / "stats")).salvage()
+    assert os.path.exists(path)
@@ -0,0 +1,51 @@
+"""Each registered version is compared with its own baseline profile.
+
+Run from the repository root with `python -m pytest app/services`.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.create_new_model import build_baseline_profile
+from app.services import drift, model_manager
+from app.services.drift import DriftMonitor, baseline_profile_path
+from app.services.model_manager import ModelRegistry
+
+ARTIFACT_REF = "sha256:" + "0" * 64
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    models_path = str(tmp_path / "models")
+    monkeypatch.setattr(model_manager, "MODEL_BASE_PATH", models_path)
+    monkeypatch.setattr(drift, "MODEL_BASE_PATH", models_path)
+    return ModelRegistry(str(tmp_path / "model_registry.csv"))
+
+
+def training_inputs(center: float) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({"sqft_living": rng.normal(center, 100, 1000)})
+
+
+def test_registered_version_uses_its_own_profile(registry, tmp_path):
+    registry.register("m", "M", ["sqft_living"], "author", ARTIFACT_REF, baseline_profile=build_baseline_profile(training_inputs(1000)))
+    registry.register("m", "M", ["sqft_living"], "author", ARTIFACT_REF, baseline_profile=build_baseline_profile(training_inputs(3000)))
+    path = baseline_profile_path("m", "v2")
+    assert path == os.path.join(str(tmp_path / "models"), "m", "v2", "baseline_profile.json")
+
+    # Inputs drawn like v2's training data drift from v1's profile only
+    monitor = DriftMonitor(stats_dir=str(tmp_path / "drift"))
+    served = training_inputs(3000)
+    monitor.update("m", "v1", served)
+    monitor.update("m", "v2", served)
+    versions = monitor.report("m")["versions"]
+    assert versions["v2"]["baseline_profile"] == path
+    assert versions["v1"]["drifted_features"] == ["sqft_living"]
+    assert versions["v2"]["drifted_features"] == []
+
+
+def test_version_without_profile_falls_back_to_default(registry):
+    registry.register("m", "M", ["sqft_living"], "author", ARTIFACT_REF)
+    assert baseline_profile_path("m", "v1") == drift.DEFAULT_BASELINE_PROFILE_PATH
@@ -0,0 +1,87 @@
+"""Consistency of per-feature explanations: bias + contributions must add up to the prediction.
+
+Run from the repository root with `python -m pytest app/services`.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn import pipeline, preprocessing
+from sklearn.ensemble import RandomForestRegressor
+
+from app.services.compact_forest import compact_pipeline
+from app.services.explain import ExplainerNotReady, explain_model, explainer_bytes, prepare_explainer
+
+FEATURES = ["bedrooms", "sqft_living", "grade", "lat"]
+
+
+@pytest.fixture(scope="module")
+def training_data():
+    rng = np.random.default_rng(0)
+    x = pd.DataFrame({
+        "bedrooms": rng.integers(1, 6, 400),
+        "sqft_living": rng.uniform(500, 5000, 400),
+        "grade": rng.integers(4, 12, 400),
+        "lat": rng.uniform(47.2, 47.8, 400),
+    }, columns=FEATURES)
+    y = 200 * x["sqft_living"] + 30000 * x["grade"] + 1e6 * (x["lat"] - 47.2) + rng.normal(0, 20000, 400)
+    return x, y
+
+
+@pytest.fixture(scope="module")
+def forest_pipeline(training_data):
+    x, y = training_data
+    forest = RandomForestRegressor(n_estimators=20, max_depth=8, random_state=0)
+    return pipeline.make_pipeline(preprocessing.RobustScaler(), forest).fit(x, y)
+
+
+def assert_contributions_sum_to_prediction(model, rows):
+    prediction = model.predict(rows)
+    bias, contributions = explain_model(model, rows)
+    assert contributions.shape == rows.shape
+    np.testing.assert_allclose(bias + contributions.sum(axis=1), prediction, rtol=1e-6)
+
+
+def test_random_forest(forest_pipeline, training_data):
+    prepare_explainer(forest_pipeline)
+    assert_contributions_sum_to_prediction(forest_pipeline, training_data[0].iloc[:10])
+
+
+def test_compact_forest(forest_pipeline, training_data):
+    assert_contributions_sum_to_prediction(compact_pipeline(forest_pipeline), training_data[0].iloc[:10])
+
+
+def test_xgboost(training_data):
+    xgboost = pytest.importorskip("xgboost")
+    x, y = training_data
+    model = pipeline.make_pipeline(
+        preprocessing.RobustScaler(), xgboost.XGBRegressor(n_estimators=20, max_depth=4, random_state=0)
+    ).fit(x, y)
+    # XGBoost accumulates in float32
+    prediction = model.predict(x.iloc[:10])
+    bias, contributions = explain_model(model, x.iloc[:10])
+    np.testing.assert_allclose(bias + contributions.sum(axis=1), prediction, rtol=1e-4)
+
+
+def test_forest_flattened_once(training_data):
+    x, y = training_data
+    model = pipeline.make_pipeline(RandomForestRegressor(n_estimators=5, random_state=0)).fit(x, y)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        explainers = list(executor.map(lambda _: prepare_explainer(model), range(8)))
+    assert all(explainer is explainers[0] for explainer in explainers)
+    assert prepare_explainer(compact_pipeline(model)) is None
+
+
+def test_forest_flattened_in_background_on_first_explanation(training_data):
+    x, y = training_data
+    model = pipeline.make_pipeline(RandomForestRegressor(n_estimators=5, random_state=0)).fit(x, y)
+    assert explainer_bytes(model) == 0
+    with pytest.raises(ExplainerNotReady):
+        explain_model(model, x.iloc[:5])
+    deadline = time.monotonic() + 30
+    while explainer_bytes(model) == 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert explainer_bytes(model) > 0
+    assert_contributions_sum_to_prediction(model, x.iloc[:5])
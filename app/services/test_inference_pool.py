@@ -0,0 +1,49 @@
+"""Message framing between the API workers and the inference pool.
+
+Run from the repository root with `python -m pytest app/services`.
+"""
+import json
+import socket
+
+import numpy as np
+import pytest
+
+from app.services.inference_pool import _HEADER, check_peer, recv_message, send_message
+
+
+def round_trip(message):
+    left, right = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    with left, right:
+        send_message(left, message)
+        return recv_message(right)
+
+
+def test_arrays_round_trip():
+    values = np.arange(12, dtype=np.float64).reshape(3, 4)
+    received = round_trip({"op": "predict", "columns": ["a", "b", "c", "d"], "values": values})
+    assert received["op"] == "predict" and received["columns"] == ["a", "b", "c", "d"]
+    np.testing.assert_array_equal(received["values"], values)
+    assert received["values"].dtype == np.float64
+
+
+def test_results_round_trip():
+    bias, contributions = round_trip({"ok": True, "result": (np.float64(1.5), np.ones((2, 3), dtype=np.float32))})["result"]
+    assert bias == 1.5
+    np.testing.assert_array_equal(contributions, np.ones((2, 3)))
+    mixed = round_trip(np.array([1, "98103", None], dtype=object))
+    assert mixed.dtype == object and mixed.tolist() == [1, "98103", None]
+
+
+def test_refuse_object_buffers():
+    left, right = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    with left, right:
+        header = json.dumps({"message": {"__array__": 0, "dtype": "|O", "shape": [1]}, "buffers": [8]}).encode()
+        left.sendall(_HEADER.pack(len(header)) + header + b"\0" * 8)
+        with pytest.raises(ValueError):
+            recv_message(right)
+
+
+def test_same_user_peer():
+    left, right = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    with left, right:
+        check_peer(left)
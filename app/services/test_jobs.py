@@ -0,0 +1,59 @@
+"""Recovery of jobs whose worker died.
+
+Run from the repository root with `python -m pytest app/services`.
+"""
+import os
+import sqlite3
+import time
+
+import pytest
+
+from app.services import jobs
+from app.services.jobs import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def running_job(queue: JobQueue) -> dict:
+    queue.submit("train", {})
+    return queue.claim()
+
+
+def test_live_worker_keeps_its_job(queue):
+    job = running_job(queue)
+    queue.recover()
+    assert queue.get(job["id"])["status"] == "running"
+
+
+def test_pid_of_another_user_is_not_taken_for_the_worker(queue, monkeypatch):
+    job = running_job(queue)
+
+    def kill(pid, signal):
+        raise PermissionError(1, "Operation not permitted")
+
+    monkeypatch.setattr(jobs.os, "kill", kill)
+    queue.recover()
+    assert queue.get(job["id"])["status"] == "failed"
+
+
+def test_stale_heartbeat_fails_the_job_even_if_the_pid_exists(queue):
+    job = running_job(queue)
+    assert job["worker_pid"] == os.getpid()
+    with sqlite3.connect(queue.db_path) as connection:
+        connection.execute("UPDATE jobs SET heartbeat_at = ?", (time.time() - jobs.JOB_HEARTBEAT_TIMEOUT - 1,))
+    queue.recover()
+    assert queue.get(job["id"])["status"] == "failed"
+
+
+def test_heartbeat_column_added_to_existing_database(tmp_path):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, type TEXT NOT NULL, params TEXT NOT NULL, "
+                           "status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, message TEXT, result TEXT, error TEXT, "
+                           "cancel_requested INTEGER NOT NULL DEFAULT 0, worker_pid INTEGER, created_at REAL NOT NULL, "
+                           "started_at REAL, finished_at REAL)")
+    queue = JobQueue(db_path)
+    assert running_job(queue)["heartbeat_at"] is not None
@@ -0,0 +1,59 @@
+"""Registry writes from several writers at once.
+
+Run from the repository root with `python -m pytest app/services`.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services import model_manager
+from app.services.model_manager import ModelRegistry
+
+
+@pytest.fixture
+def registry_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_manager, "MODEL_BASE_PATH", str(tmp_path / "models"))
+    return str(tmp_path / "model_registry.csv")
+
+
+def test_concurrent_registrations_get_distinct_versions(registry_path):
+    # One registry object per writer, as each worker process has its own
+    def register(i):
+        return ModelRegistry(registry_path).register("m", "M", ["a"], f"writer-{i}", f"model-{i}.pkl").version
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        versions = list(executor.map(register, range(16)))
+    assert sorted(versions, key=lambda v: int(v[1:])) == [f"v{i}" for i in range(1, 17)]
+    index = ModelRegistry(registry_path).index()
+    assert len(index.entries) == 16
+    assert {entry["pickle_path"] for entry in index.entries} == {f"model-{i}.pkl" for i in range(16)}
+
+
+def test_promote_once(registry_path):
+    registry = ModelRegistry(registry_path)
+    registry.register("m", "M", ["a"], "author", "v1.pkl")
+    registry.register("m", "M", ["a"], "author", "v2.pkl", promoted=False)
+    assert registry.get_latest_version("m")["version"] == "v1"
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: ModelRegistry(registry_path).promote("m", "v2"), range(4)))
+    assert results.count(True) == 1
+    assert registry.get_latest_version("m")["version"] == "v2"
+    assert len(registry.index().entries) == 3
+
+
+def test_etags_follow_content_not_entry_count(registry_path):
+    registry = ModelRegistry(registry_path)
+    registry.register("m", "M", ["a"], "author", "v1.pkl")
+    registry.register("other", "O", ["a"], "author", "o1.pkl")
+    before = registry.index()
+
+    # Same number of entries, different content: as after a lost write followed by another append
+    with open(registry_path) as f:
+        content = f.read()
+    with open(registry_path, "w") as f:
+        f.write(content.replace("v1.pkl", "v1-replaced.pkl"))
+    after = ModelRegistry(registry_path).index()
+    assert len(after.entries) == len(before.entries)
+    assert after.etag != before.etag
+    assert after.model_etags["m"] != before.model_etags["m"]
+    assert after.model_etags["other"] == before.model_etags["other"]
@@ -0,0 +1,192 @@
+"""Blue/green swaps, retirement of replaced versions and the memory budget, with a fake registry and loader.
+
+Run from the repository root with `python -m pytest app/services`.
+"""
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.services.model_memory import ModelMemoryError
+from app.services.model_server import ModelServer
+
+MB = 1024 ** 2
+
+
+class FakeModel:
+    def __init__(self, version: str, size_mb: float = 0):
+        self.version = version
+        self.payload = np.zeros(int(size_mb * MB), dtype=np.uint8)
+
+    def predict(self, frame):
+        return [self.version] * len(frame)
+
+
+class FakeRegistry:
+    registry_path = "/nonexistent"
+
+    def __init__(self, latest: dict):
+        self.latest = latest
+
+    def get_latest_versions(self) -> dict:
+        return dict(self.latest)
+
+    def get_latest_version(self, model_id: str):
+        return {"version": self.latest[model_id]} if model_id in self.latest else None
+
+    def get_version(self, model_id: str, version: str):
+        return {"version": version}
+
+
+class FakeLoader:
+    def __init__(self, delay: float = 0.0, sizes_mb: dict = None):
+        self.delay = delay
+        self.sizes_mb = sizes_mb or {}
+        self.calls = []
+
+    def __call__(self, model_id: str, version: str):
+        self.calls.append((model_id, version))
+        time.sleep(self.delay)
+        return FakeModel(version, self.sizes_mb.get(version, 0)), ["a"]
+
+
+@pytest.fixture
+def registry():
+    return FakeRegistry({"m": "v1"})
+
+
+def make_server(registry, loader, tmp_path, memory_budget_mb: float = 1024, stored_sizes_mb: dict = None):
+    stored_sizes_mb = stored_sizes_mb or {}
+
+    def stored_size(model_id: str, version: str):
+        return stored_sizes_mb[version] * MB if version in stored_sizes_mb else None
+
+    return ModelServer(registry, loader=loader, memory_budget_mb=memory_budget_mb, memory_dir=str(tmp_path / "memory"),
+                       stored_size=stored_size)
+
+
+def wait_for_loader(server):
+    # The loader executor has a single thread: an empty task finishes after the scheduled loads
+    server.executor.submit(lambda: None).result()
+
+
+def test_hot_swap_keeps_held_version_until_released(registry, tmp_path):
+    server = make_server(registry, FakeLoader(), tmp_path)
+    with server.acquire("m") as held:
+        assert held.version == "v1"
+        registry.latest["m"] = "v2"
+        server.refresh()
+        wait_for_loader(server)
+        with server.acquire("m") as current:
+            assert current.version == "v2"
+        # The replaced version retires, but only once its request is done
+        assert server.retiring == [held]
+    assert server.retiring == []
+    assert server.active["m"].version == "v2"
+
+
+def test_never_swaps_back_to_older_version(registry, tmp_path):
+    server = make_server(registry, FakeLoader(), tmp_path)
+    registry.latest["m"] = "v3"
+    with server.acquire("m"):
+        pass
+    server.schedule("m", "v2")
+    wait_for_loader(server)
+    assert server.active["m"].version == "v3"
+
+
+def test_request_and_background_load_share_one_load(registry, tmp_path):
+    loader = FakeLoader(delay=0.3)
+    server = make_server(registry, loader, tmp_path)
+    server.schedule("m", "v1")
+    time.sleep(0.05)
+    versions = []
+
+    def request():
+        with server.acquire("m") as loaded:
+            versions.append(loaded.version)
+
+    threads = [threading.Thread(target=request) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wait_for_loader(server)
+    assert versions == ["v1"] * 4
+    assert loader.calls == [("m", "v1")]
+
+
+def cache_versions(server, load_seconds: dict):
+    """
+    Load extra versions into the cache, as if each had taken the given seconds to load.
+    """
+    for version, seconds in load_seconds.items():
+        with server.acquire("m", version) as loaded:
+            loaded.load_seconds = seconds
+            server._touch(loaded)
+
+
+def test_evicts_cheapest_to_reload_per_byte_first(registry, tmp_path):
+    registry.latest["m"] = "v9"
+    loader = FakeLoader(sizes_mb={"v9": 1, "v1": 3, "v2": 3, "v3": 3, "v4": 4})
+    server = make_server(registry, loader, tmp_path, memory_budget_mb=12)
+    with server.acquire("m"):
+        pass
+    # Same size: v2 reloads fastest; v3 took longest per MB
+    cache_versions(server, {"v1": 1.0, "v2": 0.1, "v3": 3.0})
+    with server.acquire("m", "v4"):
+        pass
+    assert set(server.versions) == {("m", "v1"), ("m", "v3"), ("m", "v4")}
+    assert server.evictions == 1
+    # Ageing: the evicted priority is the new floor, so versions used later outrank ones never used again
+    assert server.inflation == pytest.approx(0.1 / (server.model_sizes["m", "v2"] / MB))
+
+
+def test_pinned_and_in_use_versions_are_not_evicted(registry, tmp_path):
+    registry.latest["m"] = "v9"
+    loader = FakeLoader(sizes_mb={"v9": 1, "v1": 3, "v2": 3, "v3": 4})
+    server = make_server(registry, loader, tmp_path, memory_budget_mb=10)
+    with server.acquire("m"):
+        pass
+    cache_versions(server, {"v1": 0.1})
+    server.set_pinned("test", {("m", "v1")})
+    with server.acquire("m", "v2"):
+        with pytest.raises(ModelMemoryError):
+            with server.acquire("m", "v3"):
+                pass
+        assert set(server.versions) == {("m", "v1"), ("m", "v2")}
+        # Its size is known now: refused again without loading it
+        with pytest.raises(ModelMemoryError):
+            with server.acquire("m", "v3"):
+                pass
+    assert loader.calls.count(("m", "v3")) == 1
+    # Once v2 is no longer in use it can go
+    with server.acquire("m", "v3"):
+        pass
+    assert set(server.versions) == {("m", "v1"), ("m", "v3")}
+
+
+def test_refuses_oversized_artifact_before_loading_it(registry, tmp_path):
+    loader = FakeLoader(sizes_mb={"v1": 1})
+    server = make_server(registry, loader, tmp_path, memory_budget_mb=10, stored_sizes_mb={"v2": 20})
+    with server.acquire("m"):
+        pass
+    with pytest.raises(ModelMemoryError):
+        with server.acquire("m", "v2"):
+            pass
+    assert loader.calls == [("m", "v1")]
+
+
+def test_background_swap_does_not_reload_refused_version(registry, tmp_path):
+    loader = FakeLoader(sizes_mb={"v1": 1, "v2": 20})
+    server = make_server(registry, loader, tmp_path, memory_budget_mb=10)
+    with server.acquire("m"):
+        pass
+    registry.latest["m"] = "v2"
+    for _ in range(3):
+        # Every registry change schedules the latest version again
+        server.refresh()
+        wait_for_loader(server)
+    assert server.active["m"].version == "v1"
+    assert loader.calls == [("m", "v1"), ("m", "v2")]
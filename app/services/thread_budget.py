@@ -0,0 +1,144 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Environment variables read by the native thread pools (OpenMP, OpenBLAS, MKL, ...)
+THREAD_POOL_ENV_VARS = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+]
+
+
+class ThreadBudget:
+    """
+    Splits the host CPU budget between API workers, inference workers and job workers,
+    and the threads each of them may use.
+
+    Configured from a single place (environment variables):
+        CPU_BUDGET          total cores to use (default: os.cpu_count())
+        API_WORKERS         number of gunicorn workers
+        MODEL_THREADS       threads per model-running process for predict() and BLAS/OpenMP pools
+        INFERENCE_WORKERS   size of the out-of-process inference pool (0 = predict inside API workers)
+        JOB_WORKERS         number of background job workers (default 1)
+        JOB_THREADS         threads per job worker for training and bulk scoring (default 1)
+
+    The job workers' cores are set aside first. When only one of API_WORKERS / MODEL_THREADS
+    is given the other is derived from the remaining cores, and by default every remaining
+    core gets one single-threaded worker. With an inference pool half of the remaining cores
+    go to single-threaded API workers and the rest is split between the inference workers.
+    A warning is logged when the settings given add up to more threads than the budget.
+    """
+    def __init__(self, cpu_budget: int = None, workers: int = None, threads_per_worker: int = None,
+                 inference_workers: int = 0, job_workers: int = 0, job_threads: int = None):
+        self.cpu_budget = max(1, cpu_budget or os.cpu_count() or 1)
+        self.inference_workers = inference_workers or 0
+        self.job_workers = job_workers or 0
+        self.job_threads = job_threads or 1
+        serving = max(1, self.cpu_budget - self.job_workers * self.job_threads)
+        if self.inference_workers:
+            # API workers only parse HTTP and assemble features; models run in the inference tier
+            self.workers = workers or max(1, serving // 2)
+            self.threads_per_worker = threads_per_worker or max(1, (serving - self.workers) // self.inference_workers)
+        elif workers and threads_per_worker:
+            self.workers, self.threads_per_worker = workers, threads_per_worker
+        elif threads_per_worker:
+            self.threads_per_worker = threads_per_worker
+            self.workers = max(1, serving // threads_per_worker)
+        elif workers:
+            self.workers = workers
+            self.threads_per_worker = max(1, serving // workers)
+        else:
+            self.workers, self.threads_per_worker = serving, 1
+
+        if self.total_threads > self.cpu_budget:
+            tiers = [(self.workers, "API", self.api_threads), (self.inference_workers, "inference", self.threads_per_worker),
+                     (self.job_workers, "job", self.job_threads)]
+            split = ", ".join(f"{count} {name} workers x {threads} threads" for count, name, threads in tiers if count)
+            logger.warning(
+                f"{split} ({self.total_threads} threads in total) oversubscribes the CPU budget of {self.cpu_budget} cores."
+            )
+
+    @classmethod
+    def from_env(cls):
+        def read(name):
+            value = os.environ.get(name)
+            return int(value) if value else None
+
+        job_workers = read("JOB_WORKERS")
+        return cls(cpu_budget=read("CPU_BUDGET"), workers=read("API_WORKERS"), threads_per_worker=read("MODEL_THREADS"),
+                   inference_workers=read("INFERENCE_WORKERS"), job_workers=1 if job_workers is None else job_workers,
+                   job_threads=read("JOB_THREADS"))
+
+    @property
+    def model_processes(self) -> int:
+        return self.inference_workers or self.workers
+
+    @property
+    def api_threads(self) -> int:
+        """
+        Native threads for an API worker; it runs no models when an inference pool is used.
+        """
+        return 1 if self.inference_workers else self.threads_per_worker
+
+    @property
+    def total_threads(self) -> int:
+        """
+        Threads of every API, inference and job worker together.
+        """
+        return (self.workers * self.api_threads + self.inference_workers * self.threads_per_worker
+                + self.job_workers * self.job_threads)
+
+    def env(self, threads: int = None) -> dict:
+        """
+        Environment for child processes, so native pools are sized before numpy is imported.
+        """
+        env = {name: str(threads or self.threads_per_worker) for name in THREAD_POOL_ENV_VARS}
+        env.update({
+            "CPU_BUDGET": str(self.cpu_budget),
+            "API_WORKERS": str(self.workers),
+            "MODEL_THREADS": str(self.threads_per_worker),
+            "INFERENCE_WORKERS": str(self.inference_workers),
+            "JOB_WORKERS": str(self.job_workers),
+            "JOB_THREADS": str(self.job_threads),
+        })
+        return env
+
+    def apply_to_process(self, threads: int = None):
+        """
+        Limit the BLAS/OpenMP pools already loaded in this process.
+        """
+        from threadpoolctl import threadpool_limits
+
+        threads = threads or self.threads_per_worker
+        threadpool_limits(limits=threads)
+        logger.info(f"Native thread pools limited to {threads} thread(s) in process {os.getpid()}")
+
+    def apply_to_model(self, model, threads: int = None):
+        """
+        Rewrite n_jobs / nthread on a loaded model (and pipeline steps) to the per-worker thread count.
+        """
+        threads = threads or self.threads_per_worker
+        if hasattr(model, "get_params"):
+            params = model.get_params(deep=True)
+            overrides = {key: threads for key in params if key.split("__")[-1] in ("n_jobs", "nthread")}
+            if overrides:
+                model.set_params(**overrides)
+
+        estimators = [model] + [step for _, step in getattr(model, "steps", [])]
+        for estimator in estimators:
+            # XGBoost keeps its own thread setting on the booster
+            if hasattr(estimator, "get_booster"):
+                estimator.get_booster().set_param({"nthread": threads})
+        return model
+
+    def __repr__(self):
+        return (f"ThreadBudget(cpu_budget={self.cpu_budget}, workers={self.workers}, "
+                f"threads_per_worker={self.threads_per_worker}, inference_workers={self.inference_workers}, "
+                f"job_workers={self.job_workers}, job_threads={self.job_threads})")
+
+
+thread_budget = ThreadBudget.from_env()
@@ -0,0 +1,40 @@
+import os
+import glob
+import json
+from app.services.model_manager import atomic_write
+
+# Each gunicorn worker keeps its own in-memory state; workers publish snapshots of it
+# as one JSON file per process, and readers merge the files of all workers.
+
+def write_snapshot(directory: str, payload: dict):
+    """
+    Publish this worker's snapshot, replacing its previous one.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with atomic_write(os.path.join(directory, f"{os.getpid()}.json")) as f:
+        json.dump(payload, f)
+
+def process_alive(pid: int) -> bool:
+    """
+    Whether a worker that published a snapshot is still running (memory of exited workers is gone).
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def read_snapshots(directory: str) -> list:
+    """
+    Read the latest snapshot of every worker (including workers that have since exited).
+    """
+    snapshots = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        try:
+            with open(path, "r") as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
@@ -1,60 +1,49 @@
-# Load data from a file
-import requests
-import pandas as pd
+# Register the models and score the unseen examples through the API client
+import asyncio
 import json
+from pathlib import Path
 
-# Create new model via api
-
-requests.post("http://127.0.0.1:5000/models/", json={
-    "model_id": "real_estate_model",
-    "model_name": "Real Estate Price Predictor",
-    "features": ["bedrooms", "bathrooms", "sqft_living", "sqft_lot", "floors", "sqft_above", "sqft_basement", "ppltn_qty", "urbn_ppltn_qty", "sbrbn_ppltn_qty", "farm_ppltn_qty", "non_farm_qty", "medn_hshld_incm_amt", "medn_incm_per_prsn_amt", "hous_val_amt", "edctn_less_than_9_qty", "edctn_9_12_qty", "edctn_high_schl_qty", "edctn_some_clg_qty", "edctn_assoc_dgre_qty", "edctn_bchlr_dgre_qty", "edctn_prfsnl_qty", "per_urbn", "per_sbrbn", "per_farm", "per_non_farm", "per_less_than_9", "per_9_to_12", "per_hsd", "per_some_clg", "per_assoc", "per_bchlr", "per_prfsnl"],
-    "author": "John Doe",
-    "pickle_path": "app/model/model.pkl"})
-
-data_unseen = pd.read_csv("data/future_unseen_examples.csv")
-with open("model/model_features.json", "r") as features_file:
-    model_features = json.load(features_file)
+import pandas as pd
 
-# Make predictions and print results and API status codes
-url = "http://127.0.0.1:5000/predictions/real_estate_model"
+from app.client import AsyncPredictionClient, PredictionClient
 
-sample = data_unseen
-for i, row in sample.iterrows():
-    input_data = row.to_dict()
+BASE_DIR = Path(__file__).parent
 
-    # Ensure zipcode is a string
-    input_data["zipcode"] = str(int(input_data["zipcode"]))
-    
-    response = requests.post(url, json=input_data)
-    print("Price estimated:", response.json()['prediction'])  
+data_unseen = pd.read_csv(BASE_DIR / "data" / "future_unseen_examples.csv", dtype={"zipcode": str})
 
+# Create new model via api
 
-# Create new model with all features
+with PredictionClient() as client:
+    client.register_model(
+        model_id="real_estate_model",
+        model_name="Real Estate Price Predictor",
+        features=["bedrooms", "bathrooms", "sqft_living", "sqft_lot", "floors", "sqft_above", "sqft_basement", "ppltn_qty", "urbn_ppltn_qty", "sbrbn_ppltn_qty", "farm_ppltn_qty", "non_farm_qty", "medn_hshld_incm_amt", "medn_incm_per_prsn_amt", "hous_val_amt", "edctn_less_than_9_qty", "edctn_9_12_qty", "edctn_high_schl_qty", "edctn_some_clg_qty", "edctn_assoc_dgre_qty", "edctn_bchlr_dgre_qty", "edctn_prfsnl_qty", "per_urbn", "per_sbrbn", "per_farm", "per_non_farm", "per_less_than_9", "per_9_to_12", "per_hsd", "per_some_clg", "per_assoc", "per_bchlr", "per_prfsnl"],
+        author="John Doe",
+        pickle_path="app/model/model.pkl")
 
-with open("new_model/model_features.json", "r") as features_file:
-    model_features = json.load(features_file)
+    # All rows go out as batch requests over pooled connections
+    predictions = client.predict_frame("real_estate_model", data_unseen)
+    for price in predictions["prediction"]:
+        print("Price estimated:", price)
 
-requests.post("http://127.0.0.1:5000/models/", json={
-    "model_id": "real_estate_model_all_features",
-    "model_name": "Real Estate Price Predictor with All Features",
-    "features": model_features,
-    "author": "John Doe",
-    "pickle_path": "app/new_model/new_model.pkl"})
 
-data_unseen = pd.read_csv("data/future_unseen_examples.csv")
+# Create new model with all features, this time with the asyncio client
 
-with open("new_model/model_features.json", "r") as features_file:
+with open(BASE_DIR / "new_model" / "model_features.json", "r") as features_file:
     model_features = json.load(features_file)
 
-# Make predictions and print results and API status codes
-url = "http://127.0.0.1:5000/predictions/all_features/real_estate_model_all_features"
 
-for i, row in data_unseen.iterrows():
-    input_data = row.to_dict()
+async def score_all_features():
+    async with AsyncPredictionClient() as client:
+        await client.register_model(
+            model_id="real_estate_model_all_features",
+            model_name="Real Estate Price Predictor with All Features",
+            features=model_features,
+            author="John Doe",
+            pickle_path="app/new_model/new_model.pkl")
+        return await client.predict_frame("real_estate_model_all_features", data_unseen, all_features=True)
+
 
-    # Ensure zipcode is a string
-    input_data["zipcode"] = str(int(input_data["zipcode"]))
-    
-    response = requests.post(url, json=input_data)
-    print("Price estimated with all features:", response.json()['prediction'])
\ No newline at end of file
+predictions = asyncio.run(score_all_features())
+for price in predictions["prediction"]:
+    print("Price estimated with all features:", price)
@@ -1,13 +1,88 @@
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 
 DEMOGRAPHICS_PATH = "app/data/zipcode_demographics.csv"
 
+@lru_cache(maxsize=1)
+def load_demographics() -> pd.DataFrame:
+    """
+    Load the zipcode demographics table once per process, indexed by zipcode.
+    """
+    return pd.read_csv(DEMOGRAPHICS_PATH, dtype={"zipcode": str}).set_index("zipcode")
+
 def get_demographic_data(zipcode: str):
     """
     Retrieve demographic data for a given zipcode.
     """
-    demographics_df = pd.read_csv(DEMOGRAPHICS_PATH, dtype={"zipcode": str})
-    data = demographics_df[demographics_df["zipcode"] == zipcode]
-    if data.empty:
+    demographics_df = load_demographics()
+    if zipcode not in demographics_df.index:
         return None
-    return data.drop(columns=["zipcode"]).iloc[0].to_dict()
\ No newline at end of file
+    return demographics_df.loc[zipcode].to_dict()
+
+def join_demographics(input_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Join demographic data on zipcode. Raises ValueError if a zipcode has no demographic data.
+    """
+    demographics_df = load_demographics()
+    unknown_zipcodes = sorted(set(input_df["zipcode"]) - set(demographics_df.index))
+    if unknown_zipcodes:
+        raise ValueError(f"No demographic data found for zipcode: {', '.join(unknown_zipcodes)}")
+
+    return input_df.join(demographics_df, on="zipcode")
+
+def select_features(input_with_demographics: pd.DataFrame, model_features: list) -> pd.DataFrame:
+    """
+    Return the model features in training order. Raises ValueError if a feature is missing.
+    """
+    missing_features = [feature for feature in model_features if feature not in input_with_demographics.columns]
+    if missing_features:
+        raise ValueError(f"Missing required features: {missing_features}")
+
+    return input_with_demographics[model_features]
+
+def assemble_features(input_df: pd.DataFrame, model_features: list) -> pd.DataFrame:
+    """
+    Join demographic data on zipcode and return the model features in training order.
+
+    Raises ValueError if a zipcode has no demographic data or a model feature is missing.
+    """
+    return select_features(join_demographics(input_df), model_features)
+
+def build_sweep_grid(base: dict, axes: list, max_points: int):
+    """
+    Build one row per point of the grid spanned by the sweep axes, all other features taken from base.
+
+    Returns the grid DataFrame and the list of values of each axis (grid rows are in
+    row-major order over the axes). Raises ValueError for an invalid sweep.
+    """
+    if not 1 <= len(axes) <= 2:
+        raise ValueError("A sweep needs one or two axes")
+    if len({axis.feature for axis in axes}) != len(axes):
+        raise ValueError("Sweep axes must use different features")
+
+    axis_values = []
+    for axis in axes:
+        if axis.feature not in base or axis.feature == "zipcode":
+            raise ValueError(f"Cannot sweep feature: {axis.feature}")
+        # Every axis is checked against the limit before its values are materialized
+        if axis.values is not None:
+            if not 1 <= len(axis.values) <= max_points:
+                raise ValueError(f"Axis {axis.feature} needs between 1 and {max_points} values")
+            values = np.asarray(axis.values, dtype=float)
+        elif axis.start is not None and axis.stop is not None:
+            if not 1 <= axis.num <= max_points:
+                raise ValueError(f"Axis {axis.feature} needs num between 1 and {max_points}")
+            values = np.linspace(axis.start, axis.stop, axis.num)
+        else:
+            raise ValueError(f"Axis {axis.feature} needs either values or start, stop and num")
+        axis_values.append(values)
+
+    n_points = int(np.prod([len(values) for values in axis_values]))
+    if n_points > max_points:
+        raise ValueError(f"Sweep has {n_points} points, the maximum is {max_points}")
+
+    grid = pd.DataFrame({feature: np.repeat([value], n_points) for feature, value in base.items()})
+    for axis, mesh in zip(axes, np.meshgrid(*axis_values, indexing="ij")):
+        grid[axis.feature] = mesh.ravel()
+    return grid, axis_values
@@ -0,0 +1,28 @@
+import os
+import stat
+import tempfile
+
+
+def default_private_dir(name: str) -> str:
+    """
+    Default location of a per-user directory: under XDG_RUNTIME_DIR when set, else in the temp directory with the uid.
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, name)
+    return os.path.join(tempfile.gettempdir(), f"{name}-{os.getuid()}")
+
+
+def ensure_private_dir(path: str, create: bool = True) -> str:
+    """
+    Create path as a 0700 directory (or find it), and check that it is a real directory owned by
+    this user that no other user can write to. Sockets and pickled artifacts in a directory
+    someone else controls could be swapped for theirs. Raises PermissionError otherwise.
+    """
+    if create:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o022:
+        raise PermissionError(f"{path} must be a directory owned by uid {os.getuid()} and writable only by it "
+                              f"(found uid {info.st_uid}, mode {stat.filemode(info.st_mode)})")
+    return path
@@ -0,0 +1,23 @@
+import os
+import streamlit as st
+from app.client import PredictionClient
+
+# Only static resources are cached here. Predictions always go to the API, so they come from the
+# version being served and reach the audit log, shadow scoring and drift monitoring.
+
+@st.cache_resource
+def get_client() -> PredictionClient:
+    """
+    One API client, and so one pool of keep-alive connections, shared by every page and session.
+    """
+    return PredictionClient()
+
+def file_version(path) -> tuple:
+    """
+    Cache key of a file's content: passing it to a cached function reloads the file whenever it changes.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
@@ -2,29 +2,54 @@ import subprocess
 import time
 import os
 
+from app.services.thread_budget import ThreadBudget
+
 # Run FastAPI with Gunicorn (ASGI) for better performance and scalability
-# Using workers for demonstration; adjust based on your CPU cores and load
+# Workers x model threads is split from a single CPU budget so predict() calls
+# never fan out to every core in every worker (see ThreadBudget for the settings)
+
+budget = ThreadBudget.from_env()
+print(f"Starting API with {budget}")
 
-# You can also get the numbers of CPU cores programmatically if needed
+# Optional inference tier: API workers forward assembled features to these processes,
+# so HTTP workers (API_WORKERS) and model workers (INFERENCE_WORKERS) scale independently
+inference = None
+if budget.inference_workers:
+    inference = subprocess.Popen([
+        "python", "-m", "app.services.inference_pool",
+        "--workers", str(budget.inference_workers)
+    ], env={**os.environ, **budget.env()})
 
-num_workers = os.cpu_count()
+# Background job workers for training and bulk scoring (JOB_WORKERS=0 disables them),
+# each limited to JOB_THREADS threads out of the same budget
+jobs = None
+if budget.job_workers:
+    jobs = subprocess.Popen([
+        "python", "-m", "app.services.jobs",
+        "--workers", str(budget.job_workers)
+    ], env={**os.environ, **budget.env(threads=budget.job_threads)})
 
 api = subprocess.Popen([
     "gunicorn",
     "app.app:app",
     "-k", "uvicorn.workers.UvicornWorker",
     "--bind", "0.0.0.0:8000",
-    "--workers", str(num_workers)
-])
+    "--workers", str(budget.workers)
+], env={**os.environ, **budget.env(threads=budget.api_threads)})
 
 time.sleep(3)
 
+# The pages import the API client from the app package, so the repository root goes on the path
 streamlit = subprocess.Popen([
     "streamlit", "run", "app/main.py",
     "--server.port", "8501",
     "--server.address", "0.0.0.0"
-])
+], env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")]))})
 
-# Keep both alive
+# Keep all services alive
 api.wait()
 streamlit.wait()
+if inference:
+    inference.wait()
+if jobs:
+    jobs.wait()